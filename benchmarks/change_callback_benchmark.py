@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Microbenchmark for flag change callbacks.
+
+Measures assigning a flag as a FlagValues attribute and through the
+Flag.value setter, without change callbacks, with a callback watching
+another flag and with a callback watching the assigned flag, and counts the
+callback calls made for an update() of 100 flags.
+
+Usage:
+  PYTHONPATH=. python benchmarks/change_callback_benchmark.py
+"""
+
+import timeit
+
+import gflags
+
+_NUMBER = 100000
+_SETUP = 'from __main__ import flag_values, count_flag'
+
+
+def _DefineFlags():
+  result = gflags.FlagValues()
+  for i in range(100):
+    gflags.DEFINE_integer('flag_%d' % i, 0, 'An integer flag.',
+                          flag_values=result)
+  gflags.DEFINE_integer('count', 0, 'An integer flag.', flag_values=result)
+  result(['prog'])
+  return result
+
+
+def _Measure(statement):
+  elapsed = min(timeit.repeat(statement, number=_NUMBER, repeat=5,
+                              setup=_SETUP))
+  return elapsed * 1e9 / _NUMBER
+
+
+def _MeasureAssignments(label):
+  print('%26s %16.0f %16.0f' % (
+      label, _Measure('flag_values.count = 1; flag_values.count = 2'),
+      _Measure('count_flag.value = 1; count_flag.value = 2')))
+
+
+def _NoOp(unused_changes):
+  pass
+
+
+def main():
+  print('%26s %16s %16s' % ('callbacks', 'setattr x2 (ns)', 'setter x2 (ns)'))
+  _MeasureAssignments('none')
+  flag_values.on_change('flag_0', _NoOp)
+  _MeasureAssignments('on another flag')
+  flag_values.on_change('count', _NoOp)
+  _MeasureAssignments('on the assigned flag')
+  flag_values.remove_change_callback(_NoOp)
+
+  calls = []
+  flag_values.on_any_change(calls.append)
+  flag_values.update(**dict(('flag_%d' % i, 1) for i in range(100)))
+  print('update() of 100 flags: %d callback call(s)' % len(calls))
+
+
+# Read by the timed statements.
+flag_values = _DefineFlags()
+count_flag = flag_values['count']
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for loading a compiled flagfile at process start.
+
+A flagfile includes 10 flagfiles, which set 2000 integer, float, list, enum
+and boolean flags, each after a comment.  Each form is parsed by new Python
+processes, so that nothing is cached: the text flagfiles, and the single
+file written by FlagValues.compile_flagfile().  Only the parsing of the
+command line is timed, defining the flags is left out; the median over the
+processes is reported.
+
+Usage:
+  PYTHONPATH=. python benchmarks/compiled_flagfile_benchmark.py
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import gflags
+
+_NUM_FILES = 10
+_FLAGS_PER_FILE = 200
+_PROCESSES = 20
+_ENUM_VALUES = ['value_%d' % i for i in range(20)]
+
+
+def _DefineFlags():
+  flag_values = gflags.FlagValues()
+  for i in range(_NUM_FILES * _FLAGS_PER_FILE):
+    kind = i % 5
+    if kind == 0:
+      gflags.DEFINE_integer('flag_%d' % i, 0, 'An integer flag.',
+                            lower_bound=0, flag_values=flag_values)
+    elif kind == 1:
+      gflags.DEFINE_float('flag_%d' % i, 0.0, 'A float flag.',
+                          flag_values=flag_values)
+    elif kind == 2:
+      gflags.DEFINE_list('flag_%d' % i, [], 'A list flag.',
+                         flag_values=flag_values)
+    elif kind == 3:
+      gflags.DEFINE_enum('flag_%d' % i, 'value_0', _ENUM_VALUES,
+                         'An enum flag.', flag_values=flag_values)
+    else:
+      gflags.DEFINE_boolean('flag_%d' % i, False, 'A boolean flag.',
+                            flag_values=flag_values)
+  return flag_values
+
+
+def _FlagLine(i):
+  kind = i % 5
+  if kind == 0:
+    return '--flag_%d=%d' % (i, i)
+  elif kind == 1:
+    return '--flag_%d=%d.5' % (i, i)
+  elif kind == 2:
+    return '--flag_%d=%s' % (i, ','.join('item_%d' % j for j in range(8)))
+  elif kind == 3:
+    return '--flag_%d=value_%d' % (i, i % 20)
+  return '--flag_%d' % i
+
+
+def _WriteFlagFiles(directory):
+  """Writes the flagfiles, returns the name of the top level one."""
+  main_filename = os.path.join(directory, 'main.flags')
+  with open(main_filename, 'w') as main_file:
+    for n in range(_NUM_FILES):
+      filename = os.path.join(directory, 'part_%d.flags' % n)
+      main_file.write('--flagfile=%s\n' % filename)
+      with open(filename, 'w') as f:
+        f.write('# Flags %d to %d.\n' % (
+            n * _FLAGS_PER_FILE, (n + 1) * _FLAGS_PER_FILE - 1))
+        for i in range(n * _FLAGS_PER_FILE, (n + 1) * _FLAGS_PER_FILE):
+          f.write('\n# Set by the deployment of service %d.\n' % i)
+          f.write(_FlagLine(i) + '\n')
+  return main_filename
+
+
+def _Child(filename):
+  """Parses a flagfile, prints the time taken in seconds."""
+  flag_values = _DefineFlags()
+  gflags.enable_compiled_flagfiles()
+  start = time.time()
+  flag_values(['prog', '--flagfile=' + filename])
+  print(time.time() - start)
+
+
+def _Measure(filename):
+  """Returns the median parse time in ms over new processes."""
+  env = dict(os.environ)
+  env['PYTHONPATH'] = os.pathsep.join(sys.path)
+  times = sorted(
+      float(subprocess.check_output(
+          [sys.executable, __file__, filename], env=env))
+      for _ in range(_PROCESSES))
+  return times[len(times) // 2] * 1e3
+
+
+def main():
+  directory = tempfile.mkdtemp()
+  try:
+    filename = _WriteFlagFiles(directory)
+    start = time.time()
+    compiled_filename = _DefineFlags().compile_flagfile(filename)
+    compile_time = time.time() - start
+    text_size = sum(os.path.getsize(os.path.join(directory, name))
+                    for name in os.listdir(directory)
+                    if name.endswith('.flags'))
+    print('%d flags in %d flagfiles, compiled in %.1f ms' % (
+        _NUM_FILES * _FLAGS_PER_FILE, _NUM_FILES + 1, compile_time * 1e3))
+    print('%10s %8s %18s' % ('form', 'bytes', 'parse (ms)'))
+    print('%10s %8d %18.2f' % ('text', text_size, _Measure(filename)))
+    print('%10s %8d %18.2f' % ('compiled', os.path.getsize(compiled_filename),
+                               _Measure(compiled_filename)))
+  finally:
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+  if len(sys.argv) == 2:
+    _Child(sys.argv[1])
+  else:
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for importing modules that define many flags.
+
+Generates packages of modules shaped like gflags.flags_modules_for_testing,
+scaled up to many flags per module, and measures the time to import them:
+with the previous calling module detection (sys._getframe(depth) for every
+depth), with the current one (f_back walk and cache of the modules of the
+frames), and with the definitions grouped in a gflags.defining_module()
+block.  The flags are defined through nested helpers of a module that
+disclaims key flags, as frameworks defining flags for plugins do, so the
+detection walks up that many frames.
+
+Usage:
+  PYTHONPATH=. python benchmarks/define_import_benchmark.py \
+      [num_modules] [flags_per_module]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from gflags import _helpers
+
+_HELPERS_MODULE = '''
+import gflags
+
+gflags.DISCLAIM_key_flags()
+
+
+def DefineNested(depth, define, *args, **kwargs):
+  if depth:
+    return DefineNested(depth - 1, define, *args, **kwargs)
+  return define(*args, **kwargs)
+'''
+
+_MODULE_TEMPLATE = '''
+import gflags
+from %(package)s import define_helpers
+
+FLAGS = gflags.FlagValues()
+
+
+def DefineFlags(flag_values=FLAGS):
+  for i in range(%(num_flags)d):
+    define_helpers.DefineNested(
+        %(depth)d, gflags.DEFINE_boolean, '%(name)s_bool_%%d' %% i, True,
+        'Boolean flag.', flag_values=flag_values)
+    define_helpers.DefineNested(
+        %(depth)d, gflags.DEFINE_string, '%(name)s_str_%%d' %% i, 'default',
+        'String flag.', flag_values=flag_values)
+    define_helpers.DefineNested(
+        %(depth)d, gflags.DEFINE_integer, '%(name)s_int_%%d' %% i, 3,
+        'Sample int flag.', flag_values=flag_values)
+
+%(define)s
+'''
+
+
+def _LegacyGetCallingModuleObjectAndName():
+  """The calling module detection used before the f_back walk."""
+  for depth in range(1, sys.getrecursionlimit()):
+    globals_for_frame = sys._getframe(depth).f_globals  # pylint: disable=protected-access
+    module, module_name = _helpers.GetModuleObjectAndName(globals_for_frame)
+    if (id(module) not in _helpers.disclaim_module_ids and
+        module_name is not None):
+      return _helpers._ModuleObjectAndName(module, module_name)  # pylint: disable=protected-access
+  raise AssertionError('No module was found')
+
+
+def _WritePackage(tmpdir, package, num_modules, flags_per_module, depth,
+                  define):
+  path = os.path.join(tmpdir, package)
+  os.mkdir(path)
+  open(os.path.join(path, '__init__.py'), 'w').close()
+  with open(os.path.join(path, 'define_helpers.py'), 'w') as f:
+    f.write(_HELPERS_MODULE)
+  for i in range(num_modules):
+    name = 'module_%d' % i
+    with open(os.path.join(path, name + '.py'), 'w') as f:
+      f.write(_MODULE_TEMPLATE % {
+          'package': package, 'name': name, 'depth': depth,
+          'num_flags': flags_per_module // 3, 'define': define})
+
+
+def _Import(package, num_modules):
+  __import__(package + '.define_helpers')
+  start = time.time()
+  for i in range(num_modules):
+    __import__('%s.module_%d' % (package, i))
+  return time.time() - start
+
+
+def main(argv):
+  num_modules = int(argv[1]) if len(argv) > 1 else 20
+  flags_per_module = int(argv[2]) if len(argv) > 2 else 600
+  tmpdir = tempfile.mkdtemp()
+  sys.path.insert(0, tmpdir)
+  get_calling_module = _helpers.GetCallingModuleObjectAndName
+  try:
+    print('modules: %d, flags per module: %d' % (num_modules,
+                                                  flags_per_module))
+    print('%8s %16s %12s' % ('depth', 'method', 'import (ms)'))
+    for depth in (0, 16, 64):
+      for method, define in (
+          ('legacy', 'DefineFlags()'),
+          ('implicit', 'DefineFlags()'),
+          ('defining_module',
+           'with gflags.defining_module(__name__):\n  DefineFlags()')):
+        package = '%s_%d' % (method, depth)
+        _WritePackage(tmpdir, package, num_modules, flags_per_module, depth,
+                      define)
+        if method == 'legacy':
+          _helpers.GetCallingModuleObjectAndName = (
+              _LegacyGetCallingModuleObjectAndName)
+        try:
+          elapsed = _Import(package, num_modules)
+        finally:
+          _helpers.GetCallingModuleObjectAndName = get_calling_module
+        print('%8d %16s %12.1f' % (depth, method, elapsed * 1000))
+  finally:
+    sys.path.remove(tmpdir)
+    shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for the memory used by large flag registries.
+
+Measures with tracemalloc the memory allocated by 50k flags, comparing the
+slotted Flag objects with the previous representation: one instance
+dictionary per flag, holding every attribute, and an empty list of
+validators per flag.
+
+Usage:
+  PYTHONPATH=. python benchmarks/flag_memory_benchmark.py
+"""
+
+import tracemalloc
+
+import gflags
+
+_NUM_FLAGS = 50000
+
+
+class _LegacyFlag(object):
+  """The attributes of a Flag, stored the way they used to be."""
+
+  def __init__(self, parser, serializer, name, default, help_string):
+    self.name = name
+    self.help = help_string
+    self.short_name = None
+    self.boolean = False
+    self.present = 0
+    self.parser = parser
+    self.serializer = serializer
+    self.allow_override = False
+    self.allow_cpp_override = False
+    self.allow_hide_cpp = False
+    self.allow_overwrite = True
+    self.using_default_value = True
+    self.validators = []
+    self._help_cache = None
+    self.default = default
+    self._value = parser.parse(default)
+    self.default_as_str = repr(serializer.serialize(self._value))
+
+
+def _Measure(flag_class):
+  parser = gflags.ArgumentParser()
+  serializer = gflags.ArgumentSerializer()
+  # Names and help strings are shared by both representations.
+  names = ['flag_%d' % i for i in range(_NUM_FLAGS)]
+  tracemalloc.start()
+  before = tracemalloc.take_snapshot()
+  flags = [flag_class(parser, serializer, name, 'default', 'A flag.')
+           for name in names]
+  after = tracemalloc.take_snapshot()
+  tracemalloc.stop()
+  size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+  del flags
+  return size
+
+
+def main():
+  print('%10s %14s %16s' % ('method', 'total (MiB)', 'per flag (bytes)'))
+  for method, flag_class in (('legacy', _LegacyFlag), ('slots', gflags.Flag)):
+    size = _Measure(flag_class)
+    print('%10s %14.1f %16.0f' % (method, size / 1024.0 / 1024.0,
+                                  float(size) / _NUM_FLAGS))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Microbenchmark for reading flag values as FlagValues attributes.
+
+Compares FlagValues.__getattr__ with its previous implementation, for a
+plain flag, a flag read by its short name and an alias.
+
+Usage:
+  PYTHONPATH=. python benchmarks/flag_read_benchmark.py
+"""
+
+import timeit
+
+import gflags
+from gflags import exceptions
+from gflags import flagvalues
+
+_NUMBER = 1000000
+
+
+def _LegacyGetAttr(self, name):
+  fl = self.FlagDict()
+  if name not in fl:
+    raise AttributeError(name)
+  if name in self.__dict__['__hiddenflags']:
+    raise AttributeError(name)
+
+  if self.__dict__['__flags_parsed'] or fl[name].present:
+    return fl[name].value
+  else:
+    raise exceptions.UnparsedFlagAccessError(name)
+
+
+def _DefineFlags():
+  flag_values = gflags.FlagValues()
+  for i in range(1000):
+    gflags.DEFINE_integer('flag_%d' % i, i, 'An integer flag.',
+                          flag_values=flag_values)
+  gflags.DEFINE_integer('count', 1, 'An integer flag.', short_name='c',
+                        flag_values=flag_values)
+  gflags.DEFINE_alias('number', 'count', flag_values=flag_values)
+  flag_values(['prog'])
+  return flag_values
+
+
+def main():
+  print('%10s %8s %16s' % ('method', 'name', 'read (ns)'))
+  get_attr = flagvalues.FlagValues.__getattr__
+  for method in ('legacy', 'fast'):
+    if method == 'legacy':
+      flagvalues.FlagValues.__getattr__ = _LegacyGetAttr
+    try:
+      for name in ('count', 'c', 'number'):
+        elapsed = min(timeit.repeat('flag_values.' + name, number=_NUMBER,
+                                    repeat=5,
+                                    setup='from __main__ import flag_values'))
+        print('%10s %8s %16.1f' % (method, name, elapsed * 1e9 / _NUMBER))
+    finally:
+      flagvalues.FlagValues.__getattr__ = get_attr
+
+
+# Read by the timed statements.
+flag_values = _DefineFlags()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for registering many flags from many modules.
+
+Defines flags from generated plugin modules, then imports every plugin a
+second time, which checks every flag name with FindModuleDefiningFlag and
+FindModuleIdDefiningFlag.  Compares the module-ownership index with the
+previous scan of all the flags of all the modules.
+
+Usage:
+  PYTHONPATH=. python benchmarks/flag_registration_benchmark.py
+"""
+
+import sys
+import time
+import types
+
+import gflags
+from gflags import flagvalues
+
+_FLAGS_PER_PLUGIN = 50
+
+_PLUGIN_CODE = '''
+import gflags
+for i in range(%d):
+  gflags.DEFINE_string('%%s_%%d' %% (__name__, i), '', 'A plugin flag.',
+                       flag_values=flag_values)
+''' % _FLAGS_PER_PLUGIN
+
+
+def _LegacyFindModuleDefiningFlag(self, flagname, default=None):
+  registered_flag = self.FlagDict().get(flagname)
+  if registered_flag is None:
+    return default
+  for module, flags in self.FlagsByModuleDict().items():
+    for flag in flags:
+      if (flag.name == registered_flag.name and
+          flag.short_name == registered_flag.short_name):
+        return module
+  return default
+
+
+def _LegacyFindModuleIdDefiningFlag(self, flagname, default=None):
+  registered_flag = self.FlagDict().get(flagname)
+  if registered_flag is None:
+    return default
+  for module_id, flags in self.FlagsByModuleIdDict().items():
+    for flag in flags:
+      if (flag.name == registered_flag.name and
+          flag.short_name == registered_flag.short_name):
+        return module_id
+  return default
+
+
+def _ImportPlugins(flag_values, num_plugins):
+  for i in range(num_plugins):
+    name = 'plugin_%d' % i
+    module = types.ModuleType(name)
+    module.flag_values = flag_values
+    sys.modules[name] = module
+    exec(_PLUGIN_CODE, module.__dict__)  # pylint: disable=exec-used
+
+
+def _Measure(num_plugins):
+  flag_values = gflags.FlagValues()
+  start = time.time()
+  _ImportPlugins(flag_values, num_plugins)
+  define = time.time() - start
+  start = time.time()
+  _ImportPlugins(flag_values, num_plugins)
+  reimport = time.time() - start
+  for i in range(num_plugins):
+    del sys.modules['plugin_%d' % i]
+  return define, reimport
+
+
+def main():
+  print('%8s %10s %16s %16s' % ('flags', 'method', 'define (ms)',
+                                 'reimport (ms)'))
+  find_module = flagvalues.FlagValues.FindModuleDefiningFlag
+  find_module_id = flagvalues.FlagValues.FindModuleIdDefiningFlag
+  for num_plugins in (20, 80, 320):
+    num_flags = num_plugins * _FLAGS_PER_PLUGIN
+    for method in ('legacy', 'index'):
+      if method == 'legacy':
+        flagvalues.FlagValues.FindModuleDefiningFlag = (
+            _LegacyFindModuleDefiningFlag)
+        flagvalues.FlagValues.FindModuleIdDefiningFlag = (
+            _LegacyFindModuleIdDefiningFlag)
+      try:
+        define, reimport = _Measure(num_plugins)
+      finally:
+        flagvalues.FlagValues.FindModuleDefiningFlag = find_module
+        flagvalues.FlagValues.FindModuleIdDefiningFlag = find_module_id
+      print('%8d %10s %16.1f %16.1f' % (num_flags, method, define * 1000,
+                                        reimport * 1000))
+
+
+if __name__ == '__main__':
+  main()
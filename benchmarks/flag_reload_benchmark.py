@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for deleting and registering again the flags of plugins.
+
+Simulates the hot reload of plugins: every flag of every plugin is deleted
+from the FlagValues and defined again, and declared key for the main module.
+Compares the _FlagList based module flag lists with the previous plain
+lists, whose membership tests and removals scan the whole list.
+
+Usage:
+  PYTHONPATH=. python benchmarks/flag_reload_benchmark.py
+"""
+
+import time
+
+import gflags
+from gflags import flagvalues
+
+_FLAGS_PER_PLUGIN = 50
+
+
+def _LegacyGetFlagList(flags_by_module, module):
+  return flags_by_module.setdefault(module, [])
+
+
+def _LegacyCleanupUnregisteredFlagFromModuleDicts(self, flag_obj):
+  if self._FlagIsRegistered(flag_obj):
+    return
+  for flags_by_module_dict in (self.FlagsByModuleDict(),
+                               self.FlagsByModuleIdDict(),
+                               self.KeyFlagsByModuleDict()):
+    for flags_in_module in flags_by_module_dict.values():
+      while flag_obj in flags_in_module:
+        flags_in_module.remove(flag_obj)
+
+
+def _DefinePlugins(flag_values, num_plugins):
+  for i in range(num_plugins):
+    module_name = 'plugin_%d' % i
+    for j in range(_FLAGS_PER_PLUGIN):
+      flag = gflags.Flag(gflags.ArgumentParser(), gflags.ArgumentSerializer(),
+                         '%s_%d' % (module_name, j), '', 'A plugin flag.')
+      gflags.DEFINE_flag(flag, flag_values, module_name=module_name)
+      gflags.DECLARE_key_flag(flag.name, flag_values=flag_values)
+
+
+def _Measure(num_plugins):
+  flag_values = gflags.FlagValues()
+  _DefinePlugins(flag_values, num_plugins)
+  start = time.time()
+  for name in list(flag_values.FlagDict()):
+    delattr(flag_values, name)
+  _DefinePlugins(flag_values, num_plugins)
+  return time.time() - start
+
+
+def main():
+  print('%8s %10s %14s' % ('flags', 'method', 'reload (ms)'))
+  get_flag_list = flagvalues._GetFlagList
+  cleanup = flagvalues.FlagValues._CleanupUnregisteredFlagFromModuleDicts
+  for num_plugins in (10, 40, 160):
+    num_flags = num_plugins * _FLAGS_PER_PLUGIN
+    for method in ('legacy', 'flaglist'):
+      if method == 'legacy':
+        flagvalues._GetFlagList = _LegacyGetFlagList
+        flagvalues.FlagValues._CleanupUnregisteredFlagFromModuleDicts = (
+            _LegacyCleanupUnregisteredFlagFromModuleDicts)
+      try:
+        elapsed = _Measure(num_plugins)
+      finally:
+        flagvalues._GetFlagList = get_flag_list
+        flagvalues.FlagValues._CleanupUnregisteredFlagFromModuleDicts = cleanup
+      print('%8d %10s %14.1f' % (num_flags, method, elapsed * 1000))
+
+
+if __name__ == '__main__':
+  main()
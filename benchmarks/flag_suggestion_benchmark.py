@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for the suggestions made for unknown flags.
+
+Compares the previous recursive, memoized Damerau-Levenshtein scan with the
+bounded scan of GetFlagSuggestions and with the q-gram FlagSuggestionIndex
+used by FlagValues, on a set of generated flag names and misspellings.
+
+Usage:
+  PYTHONPATH=. python benchmarks/flag_suggestion_benchmark.py [num_flags]
+"""
+
+import random
+import sys
+import time
+
+from gflags import _helpers
+
+_WORDS = ('batch', 'buffer', 'cache', 'client', 'config', 'connection',
+          'deadline', 'enable', 'file', 'log', 'max', 'min', 'num', 'path',
+          'port', 'queue', 'rate', 'retry', 'server', 'size', 'timeout',
+          'threads', 'use', 'verbose')
+
+
+def _LegacyDamerauLevenshtein(a, b):
+  """The recursive implementation used before the bounded one."""
+  memo = {}
+
+  def Distance(x, y):
+    if (x, y) in memo:
+      return memo[x, y]
+    if not x:
+      d = len(y)
+    elif not y:
+      d = len(x)
+    else:
+      d = min(
+          Distance(x[1:], y) + 1,
+          Distance(x, y[1:]) + 1,
+          Distance(x[1:], y[1:]) + (x[0] != y[0]))
+      if len(x) >= 2 and len(y) >= 2 and x[0] == y[1] and x[1] == y[0]:
+        t = Distance(x[2:], y[2:]) + 1
+        if d > t:
+          d = t
+    memo[x, y] = d
+    return d
+  return Distance(a, b)
+
+
+def _LegacyGetFlagSuggestions(attempt, longopt_list):
+  """The GetFlagSuggestions implementation used before the bounded one."""
+  if len(attempt) <= 2 or not longopt_list:
+    return []
+  option_names = [v.split('=')[0] for v in longopt_list]
+  distances = [
+      (_LegacyDamerauLevenshtein(attempt, option[0:len(attempt)]), option)
+      for option in option_names]
+  distances.sort(key=lambda t: t[0])
+  least_errors, _ = distances[0]
+  if least_errors >= _helpers._SUGGESTION_ERROR_RATE_THRESHOLD * len(attempt):
+    return []
+  return [name for errors, name in distances if errors == least_errors]
+
+
+def _Misspell(rand, name):
+  i = rand.randrange(len(name) - 1)
+  return name[:i] + name[i + 1] + name[i] + name[i + 2:]
+
+
+def main(argv):
+  num_flags = int(argv[1]) if len(argv) > 1 else 8000
+  rand = random.Random(0)
+  names = set()
+  while len(names) < num_flags:
+    names.add('_'.join(rand.sample(_WORDS, 3)) + str(rand.randrange(10)))
+  names = sorted(names)
+  attempts = [_Misspell(rand, rand.choice(names)) for _ in range(10)]
+  attempts += ['no_such_flag_at_all', 'stale_flag']
+
+  index = _helpers.FlagSuggestionIndex(names)
+  start = time.time()
+  for attempt in attempts:
+    index.GetSuggestions(attempt)
+  first_queries = time.time() - start
+
+  print('flags: %d, unknown flags: %d' % (num_flags, len(attempts)))
+  print('%10s %16s' % ('method', 'ms per flag'))
+  expected = None
+  for method, suggest in (
+      ('legacy', lambda a: _LegacyGetFlagSuggestions(a, names)),
+      ('bounded', lambda a: _helpers.GetFlagSuggestions(a, names)),
+      ('index', index.GetSuggestions)):
+    start = time.time()
+    result = [suggest(attempt) for attempt in attempts]
+    elapsed = time.time() - start
+    if expected is None:
+      expected = result
+    assert result == expected, method
+    print('%10s %16.2f' % (method, elapsed * 1000 / len(attempts)))
+  print('index first queries, including building the index: %.1f ms' %
+        (first_queries * 1000))
+
+
+if __name__ == '__main__':
+  main(sys.argv)
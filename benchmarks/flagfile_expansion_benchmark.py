@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for the --flagfile expansion done by FlagValues.
+
+Shows how the cost of ReadFlagsFromFiles scales with the number of
+arguments, next to the previous implementation that took a new slice of
+argv for every argument it consumed.  A linear implementation keeps the
+per-argument cost flat as argv grows.
+
+Usage:
+  PYTHONPATH=. python benchmarks/flagfile_expansion_benchmark.py
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+import gflags
+
+_ARGV_SIZES = (1000, 5000, 20000, 50000)
+_NUM_FLAGS = 500
+
+
+def _LegacyReadFlagsFromFiles(flag_values, argv, force_gnu=True):
+  """The slicing based expansion, without flagfile support."""
+  rest_of_args = argv
+  new_argv = []
+  while rest_of_args:
+    current_arg = rest_of_args[0]
+    rest_of_args = rest_of_args[1:]
+    new_argv.append(current_arg)
+    if current_arg == '--':
+      break
+    if not current_arg.startswith('-'):
+      if not force_gnu and not flag_values.IsGnuGetOpt():
+        break
+    else:
+      if ('=' not in current_arg and
+          rest_of_args and not rest_of_args[0].startswith('-')):
+        fl = flag_values.FlagDict()
+        name = current_arg.lstrip('-')
+        if name in fl and not fl[name].boolean:
+          current_arg = rest_of_args[0]
+          rest_of_args = rest_of_args[1:]
+          new_argv.append(current_arg)
+  if rest_of_args:
+    new_argv.extend(rest_of_args)
+  return new_argv
+
+
+def _MakeArgv(size, flagfile):
+  argv = []
+  i = 0
+  while len(argv) < size:
+    if i % 100 == 0:
+      argv.append('--flagfile=' + flagfile)
+    elif i % 2:
+      argv.extend(['--str_%d' % (i % _NUM_FLAGS), 'value'])
+    else:
+      argv.append('--str_%d=value' % (i % _NUM_FLAGS))
+    i += 1
+  return argv
+
+
+def _Time(function, repeat=3):
+  best = None
+  for _ in range(repeat):
+    start = time.time()
+    function()
+    elapsed = time.time() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+
+def main():
+  flag_values = gflags.FlagValues()
+  for i in range(_NUM_FLAGS):
+    gflags.DEFINE_string('str_%d' % i, '', 'String flag.',
+                         flag_values=flag_values)
+
+  tmpdir = tempfile.mkdtemp()
+  try:
+    flagfile = os.path.join(tmpdir, 'flags.cfg')
+    with open(flagfile, 'w') as f:
+      f.write('--str_0=from_file\n')
+
+    print('%8s %16s %16s' % ('argv', 'legacy (us/arg)', 'linear (us/arg)'))
+    for size in _ARGV_SIZES:
+      argv = _MakeArgv(size, flagfile)
+      # The legacy expansion is timed on the same argv without --flagfile
+      # directives, which only makes it look better.
+      plain_argv = [a for a in argv if not a.startswith('--flagfile')]
+      legacy = _Time(lambda: _LegacyReadFlagsFromFiles(flag_values,
+                                                       plain_argv))
+      linear = _Time(lambda: flag_values.ReadFlagsFromFiles(argv))
+      print('%8d %16.3f %16.3f' % (
+          size, legacy * 1e6 / size, linear * 1e6 / size))
+  finally:
+    shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+  main()
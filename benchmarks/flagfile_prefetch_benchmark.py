@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for the concurrent prefetch of nested flagfiles.
+
+Simulates a slow (e.g. network mounted) file system by adding an artificial
+latency to every flagfile read, then expands a flagfile that includes many
+sibling flagfiles, each including a few more, with and without the prefetch
+stage.
+
+Usage:
+  PYTHONPATH=. python benchmarks/flagfile_prefetch_benchmark.py \
+      [latency_ms] [max_workers]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import gflags
+from gflags import _flagfile
+
+
+def _WriteFlagFiles(tmpdir, num_children, num_grandchildren):
+  main_lines = []
+  for i in range(num_children):
+    child_lines = ['--child_%d=1' % i]
+    for j in range(num_grandchildren):
+      leaf = os.path.join(tmpdir, 'leaf_%d_%d.cfg' % (i, j))
+      with open(leaf, 'w') as f:
+        f.write('--leaf_%d_%d=1\n' % (i, j))
+      child_lines.append('--flagfile=' + leaf)
+    child = os.path.join(tmpdir, 'child_%d.cfg' % i)
+    with open(child, 'w') as f:
+      f.write('\n'.join(child_lines) + '\n')
+    main_lines.append('--flagfile=' + child)
+  path = os.path.join(tmpdir, 'main.cfg')
+  with open(path, 'w') as f:
+    f.write('\n'.join(main_lines) + '\n')
+  return path
+
+
+def main(argv):
+  latency = (float(argv[1]) if len(argv) > 1 else 5.0) / 1000
+  max_workers = int(argv[2]) if len(argv) > 2 else 16
+  read_flag_lines = _flagfile.read_flag_lines
+
+  def SlowReadFlagLines(filename):
+    time.sleep(latency)
+    return read_flag_lines(filename)
+
+  tmpdir = tempfile.mkdtemp()
+  _flagfile.read_flag_lines = SlowReadFlagLines
+  try:
+    num_children, num_grandchildren = 20, 4
+    path = _WriteFlagFiles(tmpdir, num_children, num_grandchildren)
+    argv = ['--flagfile=' + path]
+    flag_values = gflags.FlagValues()
+    print('latency per file: %.1f ms, files: %d' % (
+        latency * 1000, 1 + num_children * (1 + num_grandchildren)))
+    print('%12s %12s' % ('workers', 'time (ms)'))
+    expected = None
+    for workers in (0, max_workers):
+      flag_values.set_flagfile_prefetch(workers)
+      start = time.time()
+      result = flag_values.ReadFlagsFromFiles(argv)
+      elapsed = time.time() - start
+      if expected is None:
+        expected = result
+      assert result == expected
+      print('%12d %12.1f' % (workers, elapsed * 1000))
+  finally:
+    _flagfile.read_flag_lines = read_flag_lines
+    shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for reading large flagfiles.
+
+Compares the regular expression based flagfile reader with the previous
+readlines() based reader on a generated flagfile made mostly of comment
+lines and embedded table data, as produced by config generators.  Reports the
+throughput and the peak memory allocated while reading (tracemalloc).
+
+Usage:
+  PYTHONPATH=. python benchmarks/flagfile_reader_benchmark.py [megabytes]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from gflags import _flagfile
+
+
+def _LegacyReadFlagLines(filename):
+  """The readlines() based reader used before read_flag_lines()."""
+  with open(filename, 'r') as file_obj:
+    line_list = file_obj.readlines()
+  return [line for line in line_list
+          if not line.isspace() and
+          not line.startswith('#') and not line.startswith('//')]
+
+
+def _WriteFlagFile(path, megabytes):
+  row = '# ' + ' | '.join('%8d' % i for i in range(12)) + '\n'
+  with open(path, 'w') as f:
+    i = 0
+    while f.tell() < megabytes * 1024 * 1024:
+      if i % 50 == 0:
+        f.write('--flag_%d=value_%d\n' % (i, i))
+      elif i % 50 == 1:
+        f.write('\n')
+      elif i % 50 == 2:
+        f.write('// generated section %d\n' % i)
+      else:
+        f.write(row)
+      i += 1
+
+
+def _Measure(reader, path):
+  tracemalloc.start()
+  start = time.time()
+  lines = reader(path)
+  elapsed = time.time() - start
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  # Timed again without tracemalloc, which slows down allocations.
+  start = time.time()
+  reader(path)
+  elapsed = min(elapsed, time.time() - start)
+  return len(lines), elapsed, peak
+
+
+def main(argv):
+  megabytes = int(argv[1]) if len(argv) > 1 else 64
+  tmpdir = tempfile.mkdtemp()
+  try:
+    path = os.path.join(tmpdir, 'large.cfg')
+    _WriteFlagFile(path, megabytes)
+    size = os.path.getsize(path)
+    print('flagfile: %.1f MB' % (size / 1024.0 / 1024.0))
+    print('%10s %8s %12s %14s' % ('reader', 'lines', 'MB/s', 'peak (MB)'))
+    for name, reader in (('readlines', _LegacyReadFlagLines),
+                         ('scan', _flagfile.read_flag_lines)):
+      num_lines, elapsed, peak = _Measure(reader, path)
+      print('%10s %8d %12.1f %14.2f' % (
+          name, num_lines, size / elapsed / 1024 / 1024,
+          peak / 1024.0 / 1024.0))
+  finally:
+    shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Measures the memory shared between forked workers reading flags.
+
+Defines 20000 flags, parses them, optionally calls FlagValues.freeze(), then
+forks workers that read every flag a few times and run a garbage collection,
+as a worker process would.  Each worker reports how much of its memory
+became private (USS growth, i.e. pages copied on write since the fork) and
+its proportional set size (PSS), from /proc/self/smaps_rollup.  Each setup
+runs in its own process, so that gc.freeze() does not leak between them.
+
+Linux only.
+
+Usage:
+  PYTHONPATH=. python benchmarks/fork_sharing_benchmark.py
+"""
+
+import gc
+import os
+import sys
+
+import gflags
+
+_FLAGS = 20000
+_WORKERS = 4
+_SMAPS = '/proc/self/smaps_rollup'
+
+
+def _ReadMemory():
+  """Returns (USS, PSS) of this process in kB."""
+  fields = {}
+  with open(_SMAPS) as f:
+    for line in f:
+      parts = line.split()
+      if len(parts) == 3 and parts[2] == 'kB':
+        fields[parts[0].rstrip(':')] = int(parts[1])
+  return (fields['Private_Clean'] + fields['Private_Dirty'], fields['Pss'])
+
+
+def _DefineFlags():
+  result = gflags.FlagValues()
+  for i in range(_FLAGS):
+    gflags.DEFINE_string('flag_%d' % i, 'value %d' % i, 'A string flag.',
+                         flag_values=result)
+  result(['prog'])
+  return result
+
+
+def _Work(flag_values, names):
+  uss_before, _ = _ReadMemory()
+  for _ in range(3):
+    for name in names:
+      getattr(flag_values, name)
+  gc.collect()
+  uss_after, pss = _ReadMemory()
+  return uss_after - uss_before, pss
+
+
+def _Fork(function, *args):
+  """Runs function(*args) in a child process, returns its result."""
+  read_fd, write_fd = os.pipe()
+  pid = os.fork()
+  if not pid:
+    os.close(read_fd)
+    try:
+      os.write(write_fd, repr(function(*args)).encode('ascii'))
+    finally:
+      os._exit(0)
+  os.close(write_fd)
+  data = b''
+  while True:
+    chunk = os.read(read_fd, 4096)
+    if not chunk:
+      break
+    data += chunk
+  os.close(read_fd)
+  os.waitpid(pid, 0)
+  return eval(data.decode('ascii'))  # pylint: disable=eval-used
+
+
+def _RunSetup(freeze):
+  """Returns the (USS growth, PSS) of each worker."""
+  flag_values = _DefineFlags()
+  names = ['flag_%d' % i for i in range(_FLAGS)]
+  if freeze:
+    flag_values.freeze()
+  else:
+    gc.collect()
+  workers = []
+  for _ in range(_WORKERS):
+    workers.append(_Fork(_Work, flag_values, names))
+  return workers
+
+
+def main():
+  if not os.path.exists(_SMAPS) or not hasattr(os, 'fork'):
+    print('Skipped: %s is not available.' % _SMAPS)
+    return
+  sys.stdout.flush()
+  print('%d flags, %d workers' % (_FLAGS, _WORKERS))
+  print('%10s %24s %20s' % ('setup', 'USS growth/worker (kB)',
+                            'PSS/worker (kB)'))
+  for label, freeze in (('parsed', False), ('frozen', True)):
+    workers = _Fork(_RunSetup, freeze)
+    print('%10s %24.0f %20.0f' % (
+        label, sum(uss for uss, _ in workers) / float(len(workers)),
+        sum(pss for _, pss in workers) / float(len(workers))))
+  if not hasattr(gc, 'freeze'):
+    print('gc.freeze() is not available, only the flags were frozen.')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for generating the --help message.
+
+Compares the previous help generation, which wrapped the help of every flag
+on every call, with GetHelp(), which reuses the help block cached by every
+flag, on a FlagValues with many flags.
+
+Usage:
+  PYTHONPATH=. python benchmarks/help_benchmark.py [num_flags]
+"""
+
+import sys
+import time
+
+import gflags
+from gflags import _helpers
+
+
+def _LegacyGetHelp(flag_values):
+  """The help generation used before the flag help blocks were cached."""
+  helplist = []
+  flags_by_module = flag_values.FlagsByModuleDict()
+  for module in sorted(flags_by_module):
+    helplist.append('\n%s:' % module)
+    prefix = '  '
+    for _, flag in sorted((flag.name, flag)
+                          for flag in flags_by_module[module]):
+      flaghelp = ''
+      if flag.short_name: flaghelp += '-%s,' % flag.short_name
+      if flag.boolean:
+        flaghelp += '--[no]%s:' % flag.name
+      else:
+        flaghelp += '--%s:' % flag.name
+      flaghelp += ' '
+      if flag.help:
+        flaghelp += flag.help
+      flaghelp = _helpers.TextWrap(
+          flaghelp, indent=prefix+'  ', firstline_indent=prefix)
+      if flag.default_as_str:
+        flaghelp += '\n'
+        flaghelp += _helpers.TextWrap(
+            '(default: %s)' % flag.default_as_str, indent=prefix+'  ')
+      if flag.parser.syntactic_help:
+        flaghelp += '\n'
+        flaghelp += _helpers.TextWrap(
+            '(%s)' % flag.parser.syntactic_help, indent=prefix+'  ')
+      helplist.append(flaghelp)
+  return '\n'.join(helplist)
+
+
+def _Time(function):
+  start = time.time()
+  function()
+  return (time.time() - start) * 1000
+
+
+def main(argv):
+  num_flags = int(argv[1]) if len(argv) > 1 else 5000
+  flag_values = gflags.FlagValues()
+  for i in range(num_flags):
+    gflags.DEFINE_integer(
+        'flag_%d' % i, i, 'Help for flag number %d, which is long enough to '
+        'be wrapped over a couple of lines of the help message.' % i,
+        lower_bound=0, flag_values=flag_values)
+
+  print('flags: %d' % num_flags)
+  print('%24s %12s' % ('method', 'time (ms)'))
+  print('%24s %12.1f' % ('legacy', _Time(lambda: _LegacyGetHelp(flag_values))))
+  print('%24s %12.1f' % ('GetHelp, first call',
+                         _Time(flag_values.GetHelp)))
+  print('%24s %12.1f' % ('GetHelp, next calls', _Time(flag_values.GetHelp)))
+
+
+if __name__ == '__main__':
+  main(sys.argv)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for importing a module defining 10k flags.
+
+Runs the body of a module defining 10k flags of various types, as an import
+does, with eager and with lazy default parsing, then parses an empty command
+line, which parses the deferred defaults.  The module is compiled once
+beforehand, as its bytecode would be cached.
+
+Usage:
+  PYTHONPATH=. python benchmarks/lazy_default_benchmark.py
+"""
+
+import sys
+import time
+import types
+
+import gflags
+
+_NUM_FLAGS = 10000
+_MODULE_NAME = 'many_flags'
+
+_DEFINITIONS = [
+    "gflags.DEFINE_string('string_%d', 'value', 'A string flag.')",
+    "gflags.DEFINE_integer('integer_%d', 42, 'An integer flag.', lower_bound=0)",
+    "gflags.DEFINE_float('float_%d', 0.5, 'A float flag.')",
+    "gflags.DEFINE_boolean('boolean_%d', False, 'A boolean flag.')",
+    "gflags.DEFINE_list('list_%d', 'a,b,c', 'A list flag.')",
+    "gflags.DEFINE_enum('enum_%d', 'a', ['a', 'b'], 'An enum flag.')",
+]
+
+
+def _CompileModule():
+  lines = ['import gflags']
+  for i in range(_NUM_FLAGS):
+    lines.append(_DEFINITIONS[i % len(_DEFINITIONS)] % i)
+  return compile('\n'.join(lines) + '\n', _MODULE_NAME + '.py', 'exec')
+
+
+def _Measure(code, lazy):
+  gflags.FLAGS.__init__()
+  gflags.set_lazy_default_parsing(lazy)
+  module = types.ModuleType(_MODULE_NAME)
+  sys.modules[_MODULE_NAME] = module
+  try:
+    start = time.time()
+    exec(code, module.__dict__)  # pylint: disable=exec-used
+    imported = time.time()
+    gflags.FLAGS(['prog'])
+    parsed = time.time()
+  finally:
+    gflags.set_lazy_default_parsing(False)
+    del sys.modules[_MODULE_NAME]
+  return imported - start, parsed - imported
+
+
+def main():
+  code = _CompileModule()
+  print('%8s %14s %14s' % ('method', 'import (ms)', 'parse (ms)'))
+  for method in ('eager', 'lazy'):
+    imported, parsed = _Measure(code, method == 'lazy')
+    print('%8s %14.1f %14.1f' % (method, imported * 1000, parsed * 1000))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Microbenchmark for flag overrides.
+
+Measures the cost of FlagValues.override() blocks, compared with assigning
+and restoring the flag, which was the previous way of changing a flag for a
+code path, and the cost of reading flags with and without active overrides.
+
+Usage:
+  PYTHONPATH=. python benchmarks/override_benchmark.py
+"""
+
+import timeit
+
+import gflags
+
+_NUMBER = 100000
+_SETUP = 'from __main__ import _AssignAndRestore, _Override, flag_values'
+
+
+def _AssignAndRestore():
+  old_value = flag_values.count
+  flag_values.count = 2
+  flag_values.count = old_value
+
+
+def _Override():
+  with flag_values.override(count=2):
+    pass
+
+
+def _Measure(statement):
+  elapsed = min(timeit.repeat(statement, number=_NUMBER, repeat=5,
+                              setup=_SETUP))
+  return elapsed * 1e9 / _NUMBER
+
+
+def main():
+  print('%36s %10s' % ('operation', 'ns'))
+  print('%36s %10.0f' % ('assign and restore',
+                         _Measure('_AssignAndRestore()')))
+  print('%36s %10.0f' % ('override block', _Measure('_Override()')))
+  print('%36s %10.0f' % ('read, no override', _Measure('flag_values.count')))
+  with flag_values.override(count=2):
+    print('%36s %10.0f' % ('read overridden flag',
+                           _Measure('flag_values.count')))
+    print('%36s %10.0f' % ('read other flag while overriding',
+                           _Measure('flag_values.other')))
+
+
+def _DefineFlags():
+  result = gflags.FlagValues()
+  gflags.DEFINE_integer('count', 1, 'An integer flag.', flag_values=result)
+  gflags.DEFINE_integer('other', 1, 'An integer flag.', flag_values=result)
+  gflags.register_validator('count', lambda value: value > 0,
+                            flag_values=result)
+  result(['prog'])
+  return result
+
+
+# Read by the timed statements.
+flag_values = _DefineFlags()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for checking expensive validators in parallel.
+
+Registers validators that block for a few milliseconds, like validators that
+stat paths on a network file system, and compares the time the first parse
+spends checking them serially and on thread pools of several sizes.
+
+Usage:
+  PYTHONPATH=. python benchmarks/parallel_validation_benchmark.py
+"""
+
+import time
+
+import gflags
+
+_NUM_VALIDATORS = 64
+_VALIDATOR_LATENCY = 0.005
+
+
+def _Checker(value):
+  time.sleep(_VALIDATOR_LATENCY)
+  return value >= 0
+
+
+def _Measure(max_workers):
+  flag_values = gflags.FlagValues()
+  for i in range(_NUM_VALIDATORS):
+    gflags.DEFINE_integer('flag_%d' % i, i, 'An integer flag.',
+                          flag_values=flag_values)
+    gflags.register_validator('flag_%d' % i, _Checker,
+                              flag_values=flag_values)
+  if max_workers:
+    flag_values.set_parallel_validation(max_workers=max_workers)
+  start = time.time()
+  flag_values(['prog'])
+  return time.time() - start
+
+
+def main():
+  print('%10s %12s' % ('workers', 'parse (ms)'))
+  for max_workers in (0, 4, 16, 64):
+    print('%10s %12.1f' % (max_workers or 'serial',
+                           _Measure(max_workers) * 1000))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for FlagValues._ParseArgs.
+
+Compares the parse plan based scanner with the previous implementation,
+which re-tokenized every argument and created a closure per argument.
+
+Usage:
+  PYTHONPATH=. python benchmarks/parse_args_benchmark.py
+"""
+
+import time
+
+import gflags
+from gflags import exceptions
+
+_NUM_FLAGS = 1000
+_ARGV_SIZES = (10, 100, 1000, 10000, 100000)
+
+
+def _LegacyParseArgs(flag_values, args, known_only):
+  """The argument scanner as it was before the parse plan was introduced."""
+  unknown_flags, unparsed_args, undefok = [], [], set()
+
+  flag_dict = flag_values.FlagDict()
+  args = iter(args)
+  for arg in args:
+    value = None
+
+    def GetValue():
+      # pylint: disable=cell-var-from-loop
+      try:
+        return next(args) if value is None else value
+      except StopIteration:
+        raise exceptions.Error('Missing value for flag ' + arg)
+
+    if not arg.startswith('-'):
+      unparsed_args.append(arg)
+      if flag_values.IsGnuGetOpt():
+        continue
+      else:
+        break
+
+    if arg == '--':
+      if known_only:
+        unparsed_args.append(arg)
+      break
+
+    if '=' in arg:
+      name, value = arg.lstrip('-').split('=', 1)
+    else:
+      name, value = arg.lstrip('-'), None
+
+    if not name:
+      unparsed_args.append(arg)
+      if flag_values.IsGnuGetOpt():
+        continue
+      else:
+        break
+
+    if name == 'undefok':
+      if known_only:
+        unparsed_args.append(arg)
+      value = GetValue()
+      undefok.update(v.strip() for v in value.split(','))
+      undefok.update('no' + v.strip() for v in value.split(','))
+      continue
+
+    flag = flag_dict.get(name)
+    if flag:
+      value = (flag.boolean and value is None) or GetValue()
+    elif name.startswith('no') and len(name) > 2:
+      noflag = flag_dict.get(name[2:])
+      if noflag and noflag.boolean:
+        if value is not None:
+          raise ValueError(arg + ' does not take an argument')
+        flag = noflag
+        value = False
+
+    if flag:
+      flag.parse(value)
+      flag.using_default_value = False
+    elif known_only:
+      unparsed_args.append(arg)
+    else:
+      unknown_flags.append((name, arg))
+
+  unparsed_args.extend(args)
+  return unknown_flags, unparsed_args, undefok
+
+
+def _DefineFlags():
+  flag_values = gflags.FlagValues()
+  for i in range(_NUM_FLAGS):
+    if i % 3 == 0:
+      gflags.DEFINE_boolean('bool_%d' % i, False, 'Boolean flag.',
+                            flag_values=flag_values)
+    elif i % 3 == 1:
+      gflags.DEFINE_string('str_%d' % i, '', 'String flag.',
+                           flag_values=flag_values)
+    else:
+      gflags.DEFINE_integer('int_%d' % i, 0, 'Integer flag.',
+                            flag_values=flag_values)
+  return flag_values
+
+
+def _MakeArgv(size):
+  """Returns a mix of the argument spellings seen in generated flagfiles."""
+  argv = []
+  i = 0
+  while len(argv) < size:
+    n = i % _NUM_FLAGS
+    if n % 3 == 0:
+      argv.append(('--bool_%d' if i % 2 else '--nobool_%d') % n)
+    elif n % 3 == 1:
+      argv.append('--str_%d=value' % n)
+    else:
+      argv.extend(['--int_%d' % n, '42'])
+    i += 1
+  return argv[:size]
+
+
+def _Time(function, repeat):
+  best = None
+  for _ in range(repeat):
+    start = time.time()
+    function()
+    elapsed = time.time() - start
+    if best is None or elapsed < best:
+      best = elapsed
+  return best
+
+
+def main():
+  flag_values = _DefineFlags()
+  print('%10s %12s %12s %8s' % ('argv', 'legacy (ms)', 'plan (ms)', 'speedup'))
+  for size in _ARGV_SIZES:
+    argv = _MakeArgv(size)
+    repeat = max(3, 20000 // size)
+    legacy = _Time(
+        lambda: _LegacyParseArgs(flag_values, argv, False), repeat)
+    # pylint: disable=protected-access
+    plan = _Time(lambda: flag_values._ParseArgs(argv, False), repeat)
+    print('%10d %12.3f %12.3f %7.2fx' % (
+        size, legacy * 1000, plan * 1000, legacy / plan))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for the cost of profiling flag parsing.
+
+Parses the same command line with and without a gflags.Profiler installed,
+and prints the table the profiler recorded.
+
+Usage:
+  PYTHONPATH=. python benchmarks/profiling_benchmark.py
+"""
+
+import time
+
+import gflags
+
+_NUM_FLAGS = 2000
+_REPEAT = 20
+
+
+def _DefineFlags():
+  flag_values = gflags.FlagValues()
+  flag_values.set_incremental_validation(False)
+  for i in range(_NUM_FLAGS):
+    gflags.DEFINE_integer('flag_%d' % i, i, 'An integer flag.',
+                          flag_values=flag_values)
+    gflags.register_validator('flag_%d' % (i - i % 4), lambda v: v >= 0,
+                              flag_values=flag_values)
+  return flag_values
+
+
+def _Measure(flag_values, profiler):
+  argv = ['prog'] + ['--flag_%d=%d' % (i, i) for i in range(_NUM_FLAGS)]
+  flag_values.set_profiler(profiler)
+  start = time.time()
+  for _ in range(_REPEAT):
+    flag_values(argv)
+  return (time.time() - start) / _REPEAT
+
+
+def main():
+  flag_values = _DefineFlags()
+  profiler = gflags.Profiler()
+  print('%10s %12s' % ('profiler', 'parse (ms)'))
+  for method in ('disabled', 'enabled', 'disabled'):
+    elapsed = _Measure(flag_values, profiler if method == 'enabled' else None)
+    print('%10s %12.3f' % (method, elapsed * 1000))
+  print('')
+  print('\n'.join(profiler.format_table().splitlines()[:6]))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Read throughput benchmark for consistent multi-flag reads.
+
+Several reader threads read two related flags while a writer thread parses
+all the flags again every 10 ms.  Compares reading them under a lock shared
+with the writer, which is what a consistent read required before, with
+FlagValues.current_snapshot() and FlagValues.snapshot().  Also checks that
+assigning a flag costs the same whatever the number of flags, as changes
+only drop the snapshot.
+
+Usage:
+  PYTHONPATH=. python benchmarks/snapshot_benchmark.py
+"""
+
+import threading
+import time
+
+import gflags
+
+_READERS = 4
+_SECONDS = 1.0
+_WRITE_INTERVAL = 0.01
+_ASSIGNMENTS = 500
+
+
+def _DefineFlags():
+  flag_values = gflags.FlagValues()
+  for i in range(1000):
+    gflags.DEFINE_integer('flag_%d' % i, i, 'An integer flag.',
+                          flag_values=flag_values)
+  gflags.DEFINE_integer('low', 0, 'Lower bound.', flag_values=flag_values)
+  gflags.DEFINE_integer('high', 1, 'Upper bound.', flag_values=flag_values)
+  flag_values(['prog'])
+  return flag_values
+
+
+def _LockedRead(flag_values, lock):
+  with lock:
+    return flag_values.low, flag_values.high
+
+
+def _CurrentSnapshotRead(flag_values, unused_lock):
+  snapshot = flag_values.current_snapshot()
+  return snapshot['low'], snapshot['high']
+
+
+def _SnapshotRead(flag_values, unused_lock):
+  snapshot = flag_values.snapshot()
+  return snapshot['low'], snapshot['high']
+
+
+def _Measure(read):
+  """Returns the number of reads per second of all the reader threads."""
+  flag_values = _DefineFlags()
+  lock = threading.Lock()
+  stop = threading.Event()
+  counts = [0] * _READERS
+
+  def Write():
+    i = 0
+    while not stop.is_set():
+      i += 1
+      # Like reloading a flagfile: every flag is parsed again.
+      argv = ['prog', '--low=%d' % i, '--high=%d' % (i + 1)]
+      argv.extend('--flag_%d=%d' % (j, i) for j in range(1000))
+      with lock:
+        flag_values(argv)
+      time.sleep(_WRITE_INTERVAL)
+
+  def Read(index):
+    count = 0
+    while not stop.is_set():
+      low, high = read(flag_values, lock)
+      assert high == low + 1
+      count += 1
+    counts[index] = count
+
+  threads = [threading.Thread(target=Write)]
+  threads.extend(threading.Thread(target=Read, args=(i,))
+                 for i in range(_READERS))
+  for thread in threads:
+    thread.start()
+  time.sleep(_SECONDS)
+  stop.set()
+  for thread in threads:
+    thread.join()
+  return sum(counts) / _SECONDS
+
+
+def _MeasureAssignments(num_flags):
+  """Returns the time in ms of _ASSIGNMENTS flag assignments."""
+  flag_values = gflags.FlagValues()
+  for i in range(num_flags):
+    gflags.DEFINE_integer('flag_%d' % i, i, 'An integer flag.',
+                          flag_values=flag_values)
+  flag_values(['prog'])
+  flag_values.current_snapshot()
+  start = time.time()
+  for i in range(_ASSIGNMENTS):
+    flag_values.flag_0 = i
+  return (time.time() - start) * 1e3
+
+
+def main():
+  print('%18s %16s' % ('method', 'reads/s'))
+  for method, read in (('locked', _LockedRead),
+                       ('current_snapshot', _CurrentSnapshotRead),
+                       ('snapshot', _SnapshotRead)):
+    print('%18s %16.0f' % (method, _Measure(read)))
+  print('%18s %16s' % ('flags', '%d sets (ms)' % _ASSIGNMENTS))
+  for num_flags in (1000, 10000, 20000):
+    print('%18d %16.2f' % (num_flags, _MeasureAssignments(num_flags)))
+
+
+if __name__ == '__main__':
+  main()
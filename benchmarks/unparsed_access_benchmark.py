@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Microbenchmark for reading flags before flags are parsed.
+
+Compares the unparsed flag access policy and reporting with their previous
+implementation, which resolved the policy and logged a stack trace on every
+read.
+
+Usage:
+  PYTHONPATH=. python benchmarks/unparsed_access_benchmark.py
+"""
+
+import hashlib
+import logging
+import os
+import struct
+import sys
+import timeit
+import warnings
+
+import six
+
+import gflags
+from gflags import exceptions
+from gflags import flagvalues
+
+_NUMBER = 20000
+
+
+def _LegacyIsRunningTest():
+  return bool({'unittest', 'unittest2', 'pytest'} & set(sys.modules))
+
+
+def _LegacyIsUnparsedFlagAccessAllowed(self, name):
+  if flagvalues._UNPARSED_FLAG_ACCESS_ENV_NAME in os.environ:
+    return os.getenv(flagvalues._UNPARSED_FLAG_ACCESS_ENV_NAME) == '1'
+  elif self.__dict__['__reset_called']:
+    return False
+  elif _LegacyIsRunningTest():
+    name_bytes = name.encode('utf8')
+    flag_percentile = (
+        struct.unpack('<I', hashlib.md5(name_bytes).digest()[:4])[0] % 100)
+    return flagvalues._UNPARSED_ACCESS_DISABLED_PERCENT <= flag_percentile
+  return True
+
+
+def _LegacyGetUnparsedFlagValue(self, name, flag):
+  error_message = 'Trying to access flag %s before flags were parsed.' % name
+  if self._IsUnparsedFlagAccessAllowed(name):
+    warnings.warn(
+        error_message + ' This will raise an exception in the future.',
+        RuntimeWarning,
+        stacklevel=3)
+    try:
+      raise exceptions.UnparsedFlagAccessError(error_message)
+    except exceptions.UnparsedFlagAccessError:
+      logging.exception(error_message)
+    return flag.value
+  raise exceptions.UnparsedFlagAccessError(error_message)
+
+
+def main():
+  # Realistic reporting cost: the log records, with their stack traces, are
+  # formatted into memory.
+  logging.basicConfig(stream=six.StringIO())
+  warnings.simplefilter('ignore')
+
+  print('%10s %16s' % ('method', 'read (us)'))
+  saved = (flagvalues.FlagValues._IsUnparsedFlagAccessAllowed,
+           flagvalues.FlagValues._FlagValues__GetUnparsedFlagValue)
+  for method in ('legacy', 'cached'):
+    if method == 'legacy':
+      flagvalues.FlagValues._IsUnparsedFlagAccessAllowed = (
+          _LegacyIsUnparsedFlagAccessAllowed)
+      flagvalues.FlagValues._FlagValues__GetUnparsedFlagValue = (
+          _LegacyGetUnparsedFlagValue)
+    try:
+      elapsed = min(timeit.repeat('flag_values.count', number=_NUMBER,
+                                  repeat=5,
+                                  setup='from __main__ import flag_values'))
+      print('%10s %16.2f' % (method, elapsed * 1e6 / _NUMBER))
+    finally:
+      (flagvalues.FlagValues._IsUnparsedFlagAccessAllowed,
+       flagvalues.FlagValues._FlagValues__GetUnparsedFlagValue) = saved
+
+
+# Read by the timed statements; never parsed.
+flag_values = gflags.FlagValues()
+gflags.DEFINE_integer('count', 1, 'An integer flag.', flag_values=flag_values)
+
+
+if __name__ == '__main__':
+  main()
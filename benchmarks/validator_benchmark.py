@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for validating flags after re-parsing override snippets.
+
+Registers 10k flags and 5k validators, parses once, then repeatedly parses
+short override snippets.  Compares checking every validator after each parse
+with checking only the validators affected by the snippet.
+
+Usage:
+  PYTHONPATH=. python benchmarks/validator_benchmark.py
+"""
+
+import time
+
+import gflags
+
+_NUM_FLAGS = 10000
+_NUM_VALIDATORS = 5000
+_NUM_SNIPPETS = 200
+
+
+def _DefineFlags():
+  flag_values = gflags.FlagValues()
+  for i in range(_NUM_FLAGS):
+    gflags.DEFINE_integer('flag_%d' % i, i, 'An integer flag.',
+                          flag_values=flag_values)
+  for i in range(_NUM_VALIDATORS):
+    if i % 2:
+      gflags.register_validator('flag_%d' % i, lambda value: value >= 0,
+                                flag_values=flag_values)
+    else:
+      gflags.register_multi_flags_validator(
+          ['flag_%d' % i, 'flag_%d' % (i + 1)],
+          lambda values: None not in values.values(),
+          flag_values=flag_values)
+  return flag_values
+
+
+def _Snippet(i):
+  return ['prog'] + ['--flag_%d=%d' % ((i * 37 + j * 101) % _NUM_FLAGS, j)
+                     for j in range(5)]
+
+
+def _Measure(flag_values, incremental):
+  flag_values.set_incremental_validation(incremental)
+  flag_values(['prog'])
+  start = time.time()
+  for i in range(_NUM_SNIPPETS):
+    flag_values(_Snippet(i))
+  return time.time() - start
+
+
+def main():
+  flag_values = _DefineFlags()
+  print('%12s %18s' % ('method', 'per re-parse (ms)'))
+  for method in ('full', 'incremental'):
+    elapsed = _Measure(flag_values, method == 'incremental')
+    print('%12s %18.3f' % (method, elapsed * 1000 / _NUM_SNIPPETS))
+
+
+if __name__ == '__main__':
+  main()
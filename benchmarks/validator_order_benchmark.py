@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark for checking validators in creation order.
+
+Simulates a configuration push: hundreds of flags with validators are
+assigned in a loop, either one attribute at a time or with a single
+FlagValues.update() call, and the whole registry is validated again.
+Compares validators kept in creation order with the previous approach of
+sorting them on every check.
+
+Usage:
+  PYTHONPATH=. python benchmarks/validator_order_benchmark.py
+"""
+
+import time
+
+import gflags
+from gflags import exceptions
+from gflags import flagvalues
+
+_NUM_FLAGS = 2000
+_NUM_ASSIGNED = 500
+_REPEAT = 20
+
+
+def _LegacyAssertValidators(self, validators):
+  for validator in sorted(
+      validators, key=lambda validator: validator.insertion_index):
+    try:
+      validator.verify(self)
+    except exceptions.ValidationError as e:
+      message = validator.print_flags_with_values(self)
+      raise exceptions.IllegalFlagValueError('%s: %s' % (message, str(e)))
+
+
+def _LegacyAssertAllValidators(self):
+  all_validators = set()
+  for flag in self.FlagDict().values():
+    for validator in flag.validators:
+      all_validators.add(validator)
+  self._AssertValidators(all_validators)
+
+
+def _DefineFlags():
+  flag_values = gflags.FlagValues()
+  for i in range(_NUM_FLAGS):
+    gflags.DEFINE_integer('flag_%d' % i, i, 'An integer flag.',
+                          flag_values=flag_values)
+    gflags.register_validator('flag_%d' % i, lambda value: value >= 0,
+                              flag_values=flag_values)
+    if i % 2:
+      gflags.register_multi_flags_validator(
+          ['flag_%d' % (i - 1), 'flag_%d' % i],
+          lambda values: None not in values.values(),
+          flag_values=flag_values)
+  return flag_values
+
+
+def _Measure(flag_values, method):
+  values = dict(('flag_%d' % i, i + 1) for i in range(_NUM_ASSIGNED))
+  start = time.time()
+  for _ in range(_REPEAT):
+    if method == 'update':
+      flag_values.update(**values)
+    else:
+      for name, value in values.items():
+        setattr(flag_values, name, value)
+  assign = time.time() - start
+  start = time.time()
+  for _ in range(_REPEAT):
+    flag_values._AssertAllValidators()
+  return assign, time.time() - start
+
+
+def main():
+  flag_values = _DefineFlags()
+  print('%10s %18s %18s' % ('method', 'assign 500 (ms)', 'validate all (ms)'))
+  assert_validators = flagvalues.FlagValues._AssertValidators
+  assert_all_validators = flagvalues.FlagValues._AssertAllValidators
+  for method in ('legacy', 'setattr', 'update'):
+    if method == 'legacy':
+      flagvalues.FlagValues._AssertValidators = _LegacyAssertValidators
+      flagvalues.FlagValues._AssertAllValidators = _LegacyAssertAllValidators
+    try:
+      assign, validate = _Measure(flag_values, method)
+    finally:
+      flagvalues.FlagValues._AssertValidators = assert_validators
+      flagvalues.FlagValues._AssertAllValidators = assert_all_validators
+    print('%10s %18.3f %18.3f' % (
+        method, assign * 1000 / _REPEAT, validate * 1000 / _REPEAT))
+
+
+if __name__ == '__main__':
+  main()
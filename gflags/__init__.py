@@ -57,7 +57,10 @@ import warnings
 
 import six
 
+from gflags import _flagfile
 from gflags import _helpers
+from gflags import _profiling
+from gflags import _reloader
 from gflags import argument_parser
 from gflags import exceptions
 # _flag alias is to avoid 'redefined outer name' warnings.
@@ -92,6 +95,14 @@ GetHelpWidth = _helpers.GetHelpWidth
 TextWrap = _helpers.TextWrap
 FlagDictToArgs = _helpers.FlagDictToArgs
 DocToHelp = _helpers.DocToHelp
+enable_flagfile_cache = _flagfile.enable_cache
+disable_flagfile_cache = _flagfile.disable_cache
+enable_compiled_flagfiles = _flagfile.enable_compiled
+disable_compiled_flagfiles = _flagfile.disable_compiled
+enable_definition_tracing = _profiling.enable_definition_tracing
+disable_definition_tracing = _profiling.disable_definition_tracing
+get_definition_tracer = _profiling.get_definition_tracer
+set_lazy_default_parsing = _flag.set_lazy_default_parsing
 
 # Public classes:
 Flag = _flag.Flag
@@ -100,6 +111,9 @@ EnumFlag = _flag.EnumFlag
 MultiFlag = _flag.MultiFlag
 
 FlagValues = flagvalues.FlagValues
+FlagSnapshot = flagvalues.FlagSnapshot
+Profiler = _profiling.Profiler
+FlagFileReloader = _reloader.FlagFileReloader
 ArgumentParser = argument_parser.ArgumentParser
 BooleanParser = argument_parser.BooleanParser
 EnumParser = argument_parser.EnumParser
@@ -339,8 +353,7 @@ def _add_validator(fv, validator_instance):
   Raises:
     KeyError: if validators work with a non-existing flag.
   """
-  for flag_name in validator_instance.get_flags_names():
-    fv[flag_name].validators.append(validator_instance)
+  fv._AddValidator(validator_instance)  # pylint: disable=protected-access
 
 
 def _register_bounds_validator_if_needed(parser, name, flag_values):
@@ -388,8 +401,8 @@ def DEFINE(parser, name, default, help, flag_values=FLAGS, serializer=None,  # p
     **args: Dictionary with extra keyword args that are passed to the
         Flag __init__.
   """
-  DEFINE_flag(Flag(parser, serializer, name, default, help, **args),
-              flag_values, module_name)
+  _define_new_flag(flag_values, module_name, Flag,
+                   parser, serializer, name, default, help, **args)
 
 
 def DEFINE_flag(flag, flag_values=FLAGS, module_name=None):  # pylint: disable=g-bad-name
@@ -408,10 +421,69 @@ def DEFINE_flag(flag, flag_values=FLAGS, module_name=None):  # pylint: disable=g
     module_name: A string, the name of the Python module declaring this flag.
         If not provided, it will be computed using the stack trace of this call.
   """
+  tracer = _profiling.get_definition_tracer()
+  if tracer is not None:
+    _define_traced_flag(tracer, flag, flag_values, module_name, None)
+    return
   # copying the reference to flag_values prevents pychecker warnings
   fv = flag_values
   fv[flag.name] = flag
   # Tell flag_values who's defining the flag.
+  _register_flag_module(flag, flag_values, module_name)
+
+
+def _define_new_flag(flag_values, module_name, flag_class, *args, **kwargs):
+  """Constructs a Flag object and registers it with DEFINE_flag.
+
+  Args:
+    flag_values: FlagValues object, see DEFINE_flag.
+    module_name: A string or None, see DEFINE_flag.
+    flag_class: The Flag class to construct.
+    *args: Positional arguments of the flag_class constructor.
+    **kwargs: Keyword arguments of the flag_class constructor.
+  """
+  tracer = _profiling.get_definition_tracer()
+  if tracer is None:
+    DEFINE_flag(flag_class(*args, **kwargs), flag_values, module_name)
+    return
+  start = tracer.now()
+  flag = flag_class(*args, **kwargs)
+  _define_traced_flag(tracer, flag, flag_values, module_name,
+                      (start, tracer.now()))
+
+
+def _define_traced_flag(tracer, flag, flag_values, module_name, construct):
+  """Same as DEFINE_flag, but records the definition with a tracer.
+
+  Args:
+    tracer: _profiling.DefinitionTracer
+    flag: A Flag object, see DEFINE_flag.
+    flag_values: FlagValues object, see DEFINE_flag.
+    module_name: A string or None, see DEFINE_flag.
+    construct: None or (start, end) clock readings of the construction of
+        the flag.
+  """
+  start = tracer.now()
+  flag_values[flag.name] = flag
+  register = (start, tracer.now())
+  module_name = _register_flag_module(flag, flag_values, module_name)
+  tracer.record(module_name, flag.name, construct, register,
+                (register[1], tracer.now()))
+
+
+def _register_flag_module(flag, flag_values, module_name):
+  """Tells flag_values which module defines a flag registered with it.
+
+  Args:
+    flag: A Flag object.
+    flag_values: FlagValues object with which the flag is registered.
+    module_name: A string, the name of the Python module declaring this flag.
+        If not provided, it will be computed using the stack trace of this call.
+
+  Returns:
+    The name of the module defining the flag, or None if flag_values is not a
+    FlagValues object.
+  """
   if isinstance(flag_values, FlagValues):
     # Regarding the above isinstance test: some users pass funny
     # values of flag_values (e.g., {}) in order to avoid the flag
@@ -428,6 +500,39 @@ def DEFINE_flag(flag, flag_values=FLAGS, module_name=None):  # pylint: disable=g
     flag_values._RegisterFlagByModule(module_name, flag)
     flag_values._RegisterFlagByModuleId(id(module), flag)
     # pylint: enable=protected-access
+    return module_name
+  return None
+
+
+def defining_module(module_name=None):
+  """Returns a context manager attributing the flags defined in it to a module.
+
+  By default, every DEFINE_* call walks up the call stack to find the module
+  defining the flag.  A module defining many flags can instead resolve its
+  identity once for a whole batch of definitions:
+
+    with gflags.defining_module(__name__):
+      gflags.DEFINE_string('name', 'default', 'A string flag.')
+      gflags.DEFINE_integer('count', 1, 'An integer flag.')
+
+  Inside the with statement, the flags defined, or declared key, without an
+  explicit module_name are attributed to the module, even if they are
+  defined by another module, e.g. one imported inside the with statement:
+  import such modules before.  The context is specific to the current thread.
+
+  Args:
+    module_name: A string, the name of the Python module declaring the flags.
+        If not provided, it is computed once using the stack trace of this
+        call.
+
+  Returns:
+    A context manager; its value is the name of the module.
+  """
+  if module_name:
+    module = sys.modules.get(module_name)
+  else:
+    module, module_name = _helpers.GetCallingModuleObjectAndNameFromStack()
+  return _helpers.DefiningModuleContext(module, module_name)
 
 
 def _internal_declare_key_flags(flag_names,
@@ -582,8 +687,8 @@ def DEFINE_boolean(  # pylint: disable=g-bad-name,redefined-builtin
     **args: Dictionary with extra keyword args that are passed to the
         Flag __init__.
   """
-  DEFINE_flag(BooleanFlag(name, default, help, **args),
-              flag_values, module_name)
+  _define_new_flag(flag_values, module_name, BooleanFlag,
+                   name, default, help, **args)
 
 
 # Match C++ API to unconfuse C++ people.
@@ -652,8 +757,8 @@ def DEFINE_enum(  # pylint: disable=g-bad-name,redefined-builtin
     **args: Dictionary with extra keyword args that are passed to the
         Flag __init__.
   """
-  DEFINE_flag(EnumFlag(name, default, help, enum_values, ** args),
-              flag_values, module_name)
+  _define_new_flag(flag_values, module_name, EnumFlag,
+                   name, default, help, enum_values, **args)
 
 
 def DEFINE_list(  # pylint: disable=g-bad-name,redefined-builtin
@@ -720,8 +825,8 @@ def DEFINE_multi(  # pylint: disable=g-bad-name,redefined-builtin
     **args: Dictionary with extra keyword args that are passed to the
         Flag __init__.
   """
-  DEFINE_flag(MultiFlag(parser, serializer, name, default, help, **args),
-              flag_values, module_name)
+  _define_new_flag(flag_values, module_name, MultiFlag,
+                   parser, serializer, name, default, help, **args)
 
 
 def DEFINE_multistring(  # pylint: disable=g-bad-name,redefined-builtin
@@ -850,6 +955,9 @@ def DEFINE_alias(name, original_name, flag_values=FLAGS, module_name=None):  # p
   class _FlagAlias(Flag):
     """Overrides Flag class so alias value is copy of original flag value."""
 
+    # Read by FlagFileReloader, which must not parse into the original flag.
+    _original_flag = flag
+
     @property
     def value(self):
       return flag.value
@@ -0,0 +1,529 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Helpers for reading flagfiles.
+
+Instead of importing this module directly, it's preferable to import the
+flags package and use the aliases defined at the package level.
+"""
+
+import collections
+import hashlib
+import locale
+import marshal
+import os
+import re
+import sys
+import tempfile
+import threading
+
+import six
+
+try:
+  from concurrent import futures  # pylint: disable=g-import-not-at-top
+except ImportError:
+  # Python 2 without the futures backport.
+  futures = None
+
+# Default number of expanded flagfiles kept by the flagfile cache.
+_DEFAULT_CACHE_MAX_ENTRIES = 128
+
+# The process-wide FlagFileCache, or None if caching is disabled.
+_cache = None
+
+# Whether the payload of compiled flagfiles is loaded, see enable_compiled().
+_compiled_enabled = False
+
+# Matches the first character of the lines of a flagfile that may carry
+# flags, i.e. the lines that do not start with '#' or '//' and are not empty.
+# It is preceded by the line feed that ends the previous line; the first line
+# of a file is checked with _FLAG_LINE_FIRST_CHAR_RE.  Lines made only of
+# whitespace still match and are left to the caller.
+_FLAG_LINE_START_RE = re.compile(br'\n(?:[^#/\n]|/(?!/))')
+_FLAG_LINE_FIRST_CHAR_RE = re.compile(br'[^#/\n]|/(?!/)')
+
+# First bytes of the files written by write_compiled().  The leading NUL byte
+# cannot start a text flagfile that carries flags.
+_COMPILED_MAGIC = b'\x00gflags compiled flagfile 1\n'
+
+# Identifies the interpreters that can read the payload of a compiled
+# flagfile: the marshal format is only stable within a Python version.
+if hasattr(sys, 'implementation'):
+  _PYTHON_NAME = sys.implementation.name
+elif '__pypy__' in sys.builtin_module_names:
+  _PYTHON_NAME = 'pypy'
+else:
+  _PYTHON_NAME = 'cpython'
+_COMPILED_PYTHON_TAG = ('%s-%d.%d-%d' % (
+    _PYTHON_NAME, sys.version_info[0], sys.version_info[1],
+    marshal.version)).encode('ascii')
+
+# Files opened in text mode also treat a lone carriage return as a line
+# break.  Files that have one are scanned with _FLAG_LINE_RE, which matches
+# whole candidate lines including their terminator, but is slower.
+_LONE_CARRIAGE_RETURN_RE = re.compile(br'\r(?!\n)')
+_FLAG_LINE_RE = re.compile(
+    br'(?:^|(?<=[\r\n]))(?!#|//)[^\r\n]*[^\s][^\r\n]*(?:\r\n|\r|\n)?',
+    re.MULTILINE)
+
+
+class FileSignature(
+    collections.namedtuple('FileSignature',
+                           'realpath mtime_ns inode size')):
+  """Identifies the contents of a file without reading it.
+
+  Fields:
+  - realpath: str, the canonical path of the file.
+  - mtime_ns: int, modification time in nanoseconds.
+  - inode: int, inode number.
+  - size: int, size in bytes.
+  """
+
+
+class CacheStats(collections.namedtuple('CacheStats', 'hits misses')):
+  """Hit and miss counters of the flagfile cache.
+
+  Fields:
+  - hits: int, number of flagfiles served from the cache.
+  - misses: int, number of flagfiles that had to be read.
+  """
+
+
+def get_file_signature(filename):
+  """Returns the FileSignature of a file, or None if it cannot be stat-ed."""
+  try:
+    realpath = os.path.realpath(filename)
+    stat = os.stat(realpath)
+  except (IOError, OSError):
+    return None
+  mtime_ns = getattr(stat, 'st_mtime_ns', None)
+  if mtime_ns is None:
+    # Python 2 has no st_mtime_ns.
+    mtime_ns = int(stat.st_mtime * 1e9)
+  return FileSignature(realpath, mtime_ns, stat.st_ino, stat.st_size)
+
+
+def read_flag_lines(filename):
+  """Returns the lines of a flagfile that may carry flags.
+
+  The file is read at once and scanned with regular expressions, so empty
+  lines and comment lines (starting with '#' or '//') are skipped without
+  creating a string object for each of them.  Only the remaining lines are
+  decoded, using the same encoding as open() in text mode.  Lines made only
+  of whitespace may still be returned.
+
+  Args:
+    filename: str, the name of the flagfile.
+
+  Files written by write_compiled() are recognized by their first bytes, and
+  loaded instead.
+
+  Returns:
+    A list of str, the candidate lines including their line terminators, or
+    a CompiledFlagFile.
+
+  Raises:
+    IOError: if the file cannot be opened or read.
+  """
+  # A single buffered read: unlike a memory map, it cannot crash the process
+  # with SIGBUS when the file is truncated, e.g. by a config push, while it
+  # is being read.
+  with open(filename, 'rb') as file_obj:
+    data = file_obj.read()
+  if data.startswith(_COMPILED_MAGIC):
+    return CompiledFlagFile.loads(data)
+  return _DecodeFlagLines(data)
+
+
+def _DecodeFlagLines(buf):
+  """Returns the decoded candidate lines of a flagfile buffer."""
+  if _LONE_CARRIAGE_RETURN_RE.search(buf):
+    lines = [m.group() for m in _FLAG_LINE_RE.finditer(buf)]
+  else:
+    starts = [m.start() + 1 for m in _FLAG_LINE_START_RE.finditer(buf)]
+    if _FLAG_LINE_FIRST_CHAR_RE.match(buf):
+      starts.insert(0, 0)
+    lines = []
+    find = buf.find
+    for start in starts:
+      end = find(b'\n', start) + 1
+      lines.append(buf[start:end] if end else buf[start:])
+  if six.PY2:
+    return lines
+  encoding = locale.getpreferredencoding(False)
+  return [line.decode(encoding) for line in lines]
+
+
+def _ReadFlagLinesOrError(filename):
+  try:
+    return read_flag_lines(filename)
+  except IOError as e:
+    return e
+
+
+def prefetch_flag_lines(filenames, get_included_filenames, max_workers):
+  """Reads a tree of flagfiles concurrently.
+
+  The files named in filenames are read on a thread pool; as soon as a file
+  has been read, the flagfiles it includes are read as well.  Each file is
+  read once, even if it is included several times or circularly.
+
+  Args:
+    filenames: list of str, the top level flagfiles.
+    get_included_filenames: callable taking the lines returned by
+      read_flag_lines() and returning the names of the flagfiles they include.
+    max_workers: int, the maximum number of files read at the same time.
+
+  Returns:
+    A dictionary: flagfile name (str) -> the list of lines returned by
+    read_flag_lines(), or the IOError it raised.  Empty if the
+    concurrent.futures module is not available.
+  """
+  if futures is None:
+    return {}
+  results = {}
+  pending = {}
+  submitted = set()
+  with futures.ThreadPoolExecutor(max_workers) as executor:
+
+    def Submit(filename):
+      if filename not in submitted:
+        submitted.add(filename)
+        pending[executor.submit(_ReadFlagLinesOrError, filename)] = filename
+
+    for filename in filenames:
+      Submit(filename)
+    while pending:
+      done, _ = futures.wait(list(pending),
+                             return_when=futures.FIRST_COMPLETED)
+      for future in done:
+        filename = pending.pop(future)
+        lines = future.result()
+        results[filename] = lines
+        if not isinstance(lines, IOError):
+          for included_filename in get_included_filenames(lines):
+            Submit(included_filename)
+  return results
+
+
+class ExpansionRecord(object):
+  """What happened while a flagfile was expanded.
+
+  Attributes:
+    files: list of (filename, FileSignature) tuples, one per nested flagfile
+      that was read.
+    circular_files: list of the names of the flagfiles ignored because of a
+      circular dependency, in the order the warnings were emitted.
+  """
+
+  def __init__(self):
+    self.files = []
+    self.circular_files = []
+
+
+def get_file_digest(filename):
+  """Returns the SHA-256 hex digest of the contents of a file.
+
+  Raises:
+    IOError: if the file cannot be opened or read.
+  """
+  with open(filename, 'rb') as file_obj:
+    return hashlib.sha256(file_obj.read()).hexdigest()
+
+
+class ConvertedArgument(str):
+  """An argument of a compiled flagfile, with the flag value it stands for.
+
+  It is the argument itself for any code handling it as a string, while
+  FlagValues may use the conversion instead of parsing it.
+
+  Attributes:
+    conversion: tuple, what FlagValues.compile_flagfile() stored for the
+      argument, including the converted value.
+  """
+
+  conversion = None
+
+
+class CompiledFlagFile(object):
+  """A flagfile expanded and converted ahead of time.
+
+  See FlagValues.compile_flagfile().
+
+  Attributes:
+    source: str, the absolute name of the flagfile compiled.
+    dependencies: tuple of (filename, FileSignature, str) tuples: the
+      flagfiles read, starting with source, with their signature and the
+      SHA-256 hex digest of their contents.
+    circular_files: tuple of str, see ExpansionRecord.circular_files.
+    entries: tuple, the arguments in order; each is either a str or an
+      (argument, conversion) tuple, see ConvertedArgument.  None if the file
+      was not loaded: compiled flagfiles are disabled, or it was written by
+      another Python version, or it is corrupted.
+  """
+
+  def __init__(self, source, dependencies=(), circular_files=(),
+               entries=None):
+    self.source = source
+    self.dependencies = tuple(dependencies)
+    self.circular_files = tuple(circular_files)
+    self.entries = entries
+
+  def dumps(self):
+    """Returns the contents of the compiled file, as bytes."""
+    payload = (
+        tuple((filename, tuple(signature), digest)
+              for filename, signature, digest in self.dependencies),
+        self.circular_files, tuple(self.entries))
+    return b''.join((_COMPILED_MAGIC, _COMPILED_PYTHON_TAG, b'\n',
+                     _EncodeFilename(self.source), b'\n',
+                     marshal.dumps(payload)))
+
+  @classmethod
+  def loads(cls, data):
+    """Returns the CompiledFlagFile stored in bytes returned by dumps().
+
+    The payload is only unmarshalled if compiled flagfiles are enabled, see
+    enable_compiled(), and the interpreter tag in the header matches this
+    interpreter: marshal is not safe on untrusted data, and its format
+    changes between Python versions.  Otherwise only the source is loaded.
+    """
+    tag, _, rest = data[len(_COMPILED_MAGIC):].partition(b'\n')
+    source, _, payload = rest.partition(b'\n')
+    source = _DecodeFilename(source)
+    if not _compiled_enabled or tag != _COMPILED_PYTHON_TAG:
+      return cls(source)
+    try:
+      dependencies, circular_files, entries = marshal.loads(payload)
+      dependencies = [(filename, FileSignature(*signature), digest)
+                      for filename, signature, digest in dependencies]
+    except (EOFError, ValueError, TypeError):
+      return cls(source)
+    return cls(source, dependencies, circular_files, entries)
+
+  def check_dependencies(self):
+    """Checks whether the flagfiles compiled are unchanged.
+
+    A flagfile whose signature changed, e.g. because it was touched or
+    checked out again, still counts as unchanged if its contents did not.
+
+    Returns:
+      None if the entries cannot be used: a flagfile changed, or the file
+      was written by another Python version.  Otherwise the list of
+      (filename, FileSignature) tuples of the flagfiles, for
+      ExpansionRecord.files.
+    """
+    if self.entries is None:
+      return None
+    files = []
+    for filename, signature, digest in self.dependencies:
+      current = get_file_signature(filename)
+      if current != signature:
+        if (current is None or current.realpath != signature.realpath or
+            current.size != signature.size):
+          return None
+        try:
+          if get_file_digest(filename) != digest:
+            return None
+        except IOError:
+          return None
+      files.append((filename, current))
+    return files
+
+  def get_arguments(self):
+    """Returns the arguments, as a list of str and ConvertedArgument."""
+    arguments = []
+    for entry in self.entries:
+      if not isinstance(entry, str):
+        argument = ConvertedArgument(entry[0])
+        argument.conversion = entry[1]
+        entry = argument
+      arguments.append(entry)
+    return arguments
+
+
+def _EncodeFilename(filename):
+  if six.PY2:
+    if isinstance(filename, six.text_type):
+      return filename.encode(sys.getfilesystemencoding() or 'utf-8')
+    return filename
+  return os.fsencode(filename)
+
+
+def _DecodeFilename(filename):
+  if six.PY2:
+    return filename
+  return os.fsdecode(filename)
+
+
+def write_compiled(filename, compiled):
+  """Writes a CompiledFlagFile.
+
+  The file is replaced atomically, so that processes loading it concurrently
+  see either the old or the new contents.
+
+  Args:
+    filename: str, the name of the file to write.
+    compiled: CompiledFlagFile, the contents.
+
+  Raises:
+    IOError, OSError: if the file cannot be written.
+  """
+  data = compiled.dumps()
+  dirname, basename = os.path.split(os.path.abspath(filename))
+  fd, temp_filename = tempfile.mkstemp(prefix='.' + basename, dir=dirname)
+  try:
+    with os.fdopen(fd, 'wb') as file_obj:
+      file_obj.write(data)
+    os.chmod(temp_filename, 0o644)
+    getattr(os, 'replace', os.rename)(temp_filename, filename)
+  finally:
+    if os.path.exists(temp_filename):
+      os.remove(temp_filename)
+
+
+class _CacheEntry(
+    collections.namedtuple('_CacheEntry',
+                           'lines cwd dependencies circular_files')):
+  """An expanded flagfile.
+
+  Fields:
+  - lines: tuple of str, the expanded lines.
+  - cwd: str, the working directory nested flagfiles were resolved against.
+  - dependencies: tuple of (filename, FileSignature), the nested flagfiles.
+  - circular_files: tuple of str, see ExpansionRecord.circular_files.
+  """
+
+
+class FlagFileCache(object):
+  """A bounded LRU cache of expanded flagfiles.
+
+  Entries are keyed on the FileSignature of the top level flagfile.  The
+  signatures of all the nested flagfiles are kept with each entry, so that
+  touching any file of the include graph invalidates the entry.
+  """
+
+  def __init__(self, max_entries=_DEFAULT_CACHE_MAX_ENTRIES):
+    if max_entries < 1:
+      raise ValueError('max_entries must be positive, got %r' % max_entries)
+    self.max_entries = max_entries
+    self._entries = collections.OrderedDict()
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self._entries)
+
+  def lookup(self, filename):
+    """Returns the up-to-date cache entry for a flagfile, or None."""
+    signature = get_file_signature(filename)
+    if signature is None:
+      return None
+    with self._lock:
+      entry = self._entries.pop(signature, None)
+    if entry is None:
+      return None
+    if entry.cwd != os.getcwd():
+      return None
+    for dependency, dependency_signature in entry.dependencies:
+      if get_file_signature(dependency) != dependency_signature:
+        return None
+    with self._lock:
+      # Re-inserting the entry makes it the most recently used one.
+      self._entries[signature] = entry
+    return entry
+
+  def store(self, signature, lines, record):
+    """Adds an expanded flagfile to the cache.
+
+    Args:
+      signature: FileSignature of the flagfile, taken before it was read.
+      lines: list of str, the expanded lines.
+      record: ExpansionRecord of the expansion.
+    """
+    if signature is None:
+      return
+    entry = _CacheEntry(tuple(lines), os.getcwd(), tuple(record.files),
+                        tuple(record.circular_files))
+    with self._lock:
+      self._entries.pop(signature, None)
+      self._entries[signature] = entry
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+
+def enable_cache(max_entries=_DEFAULT_CACHE_MAX_ENTRIES):
+  """Enables the process-wide cache of expanded flagfiles.
+
+  Once enabled, FlagValues objects serve repeated reads of the same flagfile,
+  nested flagfiles included, from memory for as long as none of the files
+  changes.  Calling this again replaces the cache with an empty one.
+
+  Args:
+    max_entries: int, the maximum number of top level flagfiles to keep.
+
+  Returns:
+    The FlagFileCache instance.
+  """
+  global _cache
+  _cache = FlagFileCache(max_entries)
+  return _cache
+
+
+def disable_cache():
+  """Disables and drops the process-wide cache of expanded flagfiles."""
+  global _cache
+  _cache = None
+
+
+def get_cache():
+  """Returns the process-wide FlagFileCache, or None if it is disabled."""
+  return _cache
+
+
+def enable_compiled():
+  """Enables loading the compiled flagfiles passed to --flagfile.
+
+  Compiled flagfiles, written by FlagValues.compile_flagfile(), store their
+  arguments with marshal, which must not be used on untrusted data.  Until
+  this is called, the source flagfile of a compiled flagfile is read
+  instead, as when the compiled flagfile is out of date.  Only enable them
+  if every flagfile passed to the program is trusted.
+  """
+  global _compiled_enabled
+  _compiled_enabled = True
+
+
+def disable_compiled():
+  """Disables loading compiled flagfiles, see enable_compiled()."""
+  global _compiled_enabled
+  _compiled_enabled = False
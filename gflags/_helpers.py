@@ -31,11 +31,18 @@
 """Helper functions for //gflags."""
 
 import collections
+import math
 import os
 import re
 import struct
 import sys
 import textwrap
+import threading
+try:
+  import contextvars  # pylint: disable=g-import-not-at-top
+except ImportError:
+  # Python < 3.7.
+  contextvars = None
 try:
   import fcntl  # pylint: disable=g-import-not-at-top
 except ImportError:
@@ -66,6 +73,9 @@ _MIN_HELP_WIDTH = 40  # Minimal "sane" width of help output. We assume that any
 # "least_erros >= 0.5".
 _SUGGESTION_ERROR_RATE_THRESHOLD = 0.50
 
+# Length of the substrings indexed by FlagSuggestionIndex.
+_SUGGESTION_QGRAM_LENGTH = 2
+
 # Characters that cannot appear or are highly discouraged in an XML 1.0
 # document. (See http://www.w3.org/TR/REC-xml/#charsets or
 # https://en.wikipedia.org/wiki/Valid_characters_in_XML#XML_1.0)
@@ -79,6 +89,17 @@ disclaim_module_ids = set([id(sys.modules[__name__])])
 
 
 
+# Dictionary: id of the globals of a module -> (globals, module, __name__),
+# for the frames seen by GetCallingModuleObjectAndName().  The globals are kept
+# in the entry, so that their id is not reused while it is cached.
+_module_by_globals = {}
+# Maximum number of entries of _module_by_globals, which is cleared when full.
+_MODULE_BY_GLOBALS_MAX_ENTRIES = 4096
+
+# Thread local, with a 'stack' attribute: list of _ModuleObjectAndName set by
+# the active DefiningModuleContext objects of the thread.
+_defining_modules = threading.local()
+
 # Define special flags here so that help may be generated for them.
 # NOTE: Please do NOT use SPECIAL_FLAGS from outside flags module.
 # Initialized inside flagvalues.py.
@@ -120,19 +141,40 @@ def GetCallingModuleObjectAndName():
   DEFINE_foo... function.
 
   Returns:
-    The module object that called into this one.
+    The module object that called into this one, or the one set by the
+    innermost active DefiningModuleContext of this thread.
 
   Raises:
     AssertionError: if no calling module could be identified.
   """
-  range_func = range if sys.version_info[0] >= 3 else xrange
-  for depth in range_func(1, sys.getrecursionlimit()):
-    # sys._getframe is the right thing to use here, as it's the best
-    # way to walk up the call stack.
-    globals_for_frame = sys._getframe(depth).f_globals  # pylint: disable=protected-access
-    module, module_name = GetModuleObjectAndName(globals_for_frame)
-    if id(module) not in disclaim_module_ids and module_name is not None:
-      return _ModuleObjectAndName(module, module_name)
+  defining_modules = getattr(_defining_modules, 'stack', None)
+  if defining_modules:
+    return defining_modules[-1]
+  return GetCallingModuleObjectAndNameFromStack()
+
+
+def GetCallingModuleObjectAndNameFromStack():
+  """Same as GetCallingModuleObjectAndName, ignoring DefiningModuleContext."""
+  # sys._getframe is the right thing to use here, as it's the best
+  # way to walk up the call stack.
+  frame = sys._getframe(1)  # pylint: disable=protected-access
+  while frame is not None:
+    globals_for_frame = frame.f_globals
+    cached = _module_by_globals.get(id(globals_for_frame))
+    if cached is None or cached[0] is not globals_for_frame:
+      name = globals_for_frame.get('__name__', None)
+      module = sys.modules.get(name, None)
+      cached = (globals_for_frame, module, name)
+      if module is not None:
+        if len(_module_by_globals) >= _MODULE_BY_GLOBALS_MAX_ENTRIES:
+          _module_by_globals.clear()
+        _module_by_globals[id(globals_for_frame)] = cached
+    _, module, name = cached
+    if id(module) not in disclaim_module_ids and name is not None:
+      # Pick a more informative name for the main module.
+      return _ModuleObjectAndName(
+          module, sys.argv[0] if name == '__main__' else name)
+    frame = frame.f_back
   raise AssertionError('No module was found')
 
 
@@ -141,6 +183,61 @@ def GetCallingModule():
   return GetCallingModuleObjectAndName().module_name
 
 
+class DefiningModuleContext(object):
+  """Context manager attributing the flags defined in it to a module.
+
+  See gflags.defining_module().
+  """
+
+  def __init__(self, module, module_name):
+    self._module_and_name = _ModuleObjectAndName(module, module_name)
+
+  def __enter__(self):
+    if getattr(_defining_modules, 'stack', None) is None:
+      _defining_modules.stack = []
+    _defining_modules.stack.append(self._module_and_name)
+    return self._module_and_name.module_name
+
+  def __exit__(self, exc_type, exc_value, unused_traceback):
+    _defining_modules.stack.pop()
+
+
+class ContextLocal(object):
+  """A value local to the current context, None until set.
+
+  Backed by a contextvars.ContextVar, so that each thread and each asyncio
+  task sees its own value.  Falls back to a threading.local if the
+  contextvars module is not available.
+  """
+
+  def __init__(self, name):
+    if contextvars is not None:
+      self._var = contextvars.ContextVar(name, default=None)
+    else:
+      self._var = None
+      self._local = threading.local()
+
+  def get(self):
+    if self._var is not None:
+      return self._var.get()
+    return getattr(self._local, 'value', None)
+
+  def set(self, value):
+    """Sets the value, and returns a token to pass to reset()."""
+    if self._var is not None:
+      return self._var.set(value)
+    token = getattr(self._local, 'value', None)
+    self._local.value = value
+    return token
+
+  def reset(self, token):
+    """Restores the value replaced by the set() call that returned token."""
+    if self._var is not None:
+      self._var.reset(token)
+    else:
+      self._local.value = token
+
+
 def StrOrUnicode(value):
   """Converts a value to a python string.
 
@@ -213,6 +310,12 @@ def GetHelpWidth():
     return _DEFAULT_HELP_WIDTH
 
 
+def _SuggestionMaxErrors(attempt):
+  """Returns the maximum number of errors allowed in a suggestion."""
+  # Suggestions need least_errors < threshold * len(attempt).
+  return int(math.ceil(_SUGGESTION_ERROR_RATE_THRESHOLD * len(attempt))) - 1
+
+
 def GetFlagSuggestions(attempt, longopt_list):
   """Get helpful similar matches for an invalid flag."""
   # Don't suggest on very short strings, or if no longopts are specified.
@@ -223,50 +326,170 @@ def GetFlagSuggestions(attempt, longopt_list):
 
   # Find close approximations in flag prefixes.
   # This also handles the case where the flag is spelled right but ambiguous.
-  distances = [(_DamerauLevenshtein(attempt, option[0:len(attempt)]), option)
-               for option in option_names]
-  distances.sort(key=lambda t: t[0])
-
-  least_errors, _ = distances[0]
-  # Don't suggest excessively bad matches.
-  if least_errors >= _SUGGESTION_ERROR_RATE_THRESHOLD * len(attempt):
-    return []
-
+  # Don't suggest excessively bad matches: the distance is bounded by the
+  # best match found so far, so most comparisons stop after a few characters.
+  least_errors = _SuggestionMaxErrors(attempt)
   suggestions = []
-  for errors, name in distances:
-    if errors == least_errors:
-      suggestions.append(name)
-    else:
-      break
+  for option in option_names:
+    errors = _DamerauLevenshtein(attempt, option[0:len(attempt)],
+                                 max_distance=least_errors)
+    if errors < least_errors:
+      least_errors = errors
+      suggestions = [option]
+    elif errors == least_errors:
+      suggestions.append(option)
   return suggestions
 
 
-def _DamerauLevenshtein(a, b):
-  """Damerau-Levenshtein edit distance from a to b."""
-  memo = {}
+class FlagSuggestionIndex(object):
+  """Answers GetFlagSuggestions queries against a fixed list of options.
+
+  For every length of attempted flag name, an index from q-grams (substrings
+  of _SUGGESTION_QGRAM_LENGTH characters) to the option prefixes of that
+  length containing them is built on first use.  A prefix within k errors of
+  the attempt shares at least len(attempt) - q + 1 - k * (q + 1) q-grams with
+  it, since an error changes at most q + 1 of them.  Prefixes are compared in
+  decreasing number of shared q-grams, and the comparisons stop as soon as
+  this bound rules out all remaining prefixes.
 
-  def Distance(x, y):
-    """Recursively defined string distance with memoization."""
-    if (x, y) in memo:
-      return memo[x, y]
-    if not x:
-      d = len(y)
-    elif not y:
-      d = len(x)
+  The suggestions are the same, and in the same order, as the ones returned
+  by GetFlagSuggestions.
+  """
+
+  def __init__(self, longopt_list):
+    self._option_names = [v.split('=')[0] for v in longopt_list]
+    # Int: prefix length -> _QGramIndex of the option prefixes of that length.
+    self._indexes = {}
+
+  def GetSuggestions(self, attempt):
+    """Same as GetFlagSuggestions(attempt, longopt_list)."""
+    if len(attempt) <= 2 or not self._option_names:
+      return []
+    length = len(attempt)
+    index = self._indexes.get(length)
+    if index is None:
+      index = self._indexes[length] = _QGramIndex(
+          [option[0:length] for option in self._option_names])
+
+    q = _SUGGESTION_QGRAM_LENGTH
+    least_errors = _SuggestionMaxErrors(attempt)
+    matches = []
+
+    def Compare(prefix_id):
+      """Compares a prefix with attempt, and returns the least errors."""
+      errors = _DamerauLevenshtein(attempt, index.prefixes[prefix_id],
+                                   max_distance=least_errors)
+      if errors < least_errors:
+        del matches[:]
+      if errors <= least_errors:
+        matches.append(prefix_id)
+        return errors
+      return least_errors
+
+    shared = index.CountSharedQGrams(attempt)
+    for prefix_id in sorted(shared, key=shared.get, reverse=True):
+      if shared[prefix_id] < length - q + 1 - least_errors * (q + 1):
+        break
+      least_errors = Compare(prefix_id)
     else:
-      d = min(
-          Distance(x[1:], y) + 1,  # correct an insertion error
-          Distance(x, y[1:]) + 1,  # correct a deletion error
-          Distance(x[1:], y[1:]) + (x[0] != y[0]))  # correct a wrong character
-      if len(x) >= 2 and len(y) >= 2 and x[0] == y[1] and x[1] == y[0]:
-        # Correct a transposition.
-        t = Distance(x[2:], y[2:]) + 1
-        if d > t:
-          d = t
+      if length - q + 1 - least_errors * (q + 1) <= 0:
+        # Prefixes sharing no q-gram can still be close enough.
+        for prefix_id in range(len(index.prefixes)):
+          if prefix_id not in shared:
+            least_errors = Compare(prefix_id)
+
+    found = sorted(i for prefix_id in matches
+                   for i in index.positions[prefix_id])
+    return [self._option_names[i] for i in found]
+
+
+class _QGramIndex(object):
+  """Inverted index from q-grams to the distinct strings containing them."""
+
+  def __init__(self, strings):
+    # Int: prefix id -> distinct string.
+    self.prefixes = []
+    # Int: prefix id -> positions of the string in strings.
+    self.positions = []
+    # Dictionary: q-gram -> list of (prefix id, number of occurrences).
+    self.postings = {}
+    ids = {}
+    for i, string in enumerate(strings):
+      prefix_id = ids.get(string)
+      if prefix_id is None:
+        prefix_id = ids[string] = len(self.prefixes)
+        self.prefixes.append(string)
+        self.positions.append([])
+        for qgram, count in six.iteritems(_CountQGrams(string)):
+          self.postings.setdefault(qgram, []).append((prefix_id, count))
+      self.positions[prefix_id].append(i)
+
+  def CountSharedQGrams(self, string):
+    """Returns {prefix id: number of q-grams shared with string} (if > 0)."""
+    shared = collections.defaultdict(int)
+    for qgram, count in six.iteritems(_CountQGrams(string)):
+      for prefix_id, prefix_count in self.postings.get(qgram, ()):
+        shared[prefix_id] += min(count, prefix_count)
+    return shared
+
+
+def _CountQGrams(string):
+  """Returns {q-gram: number of occurrences} for a string."""
+  counts = collections.defaultdict(int)
+  q = _SUGGESTION_QGRAM_LENGTH
+  for i in range(len(string) - q + 1):
+    counts[string[i:i + q]] += 1
+  return counts
+
+
+def _DamerauLevenshtein(a, b, max_distance=None):
+  """Damerau-Levenshtein edit distance from a to b.
+
+  This is the restricted distance (optimal string alignment): a transposed
+  pair of characters is not edited further.  It is computed row by row,
+  within a band of max_distance cells around the diagonal.
+
+  Args:
+    a: str, the first string.
+    b: str, the second string.
+    max_distance: None or int, if given the computation stops as soon as the
+      distance is known to exceed it.
 
-    memo[x, y] = d
-    return d
-  return Distance(a, b)
+  Returns:
+    The distance, or max_distance + 1 if it is larger than max_distance.
+  """
+  len_a = len(a)
+  len_b = len(b)
+  if max_distance is None:
+    max_distance = max(len_a, len_b)
+  too_far = max_distance + 1
+  if abs(len_a - len_b) > max_distance:
+    return too_far
+  # Distances larger than max_distance are all stored as too_far. A cell more
+  # than max_distance away from the diagonal is always too far.
+  previous_row = None
+  row = [min(j, too_far) for j in range(len_b + 1)]
+  for i in range(1, len_a + 1):
+    new_row = [too_far] * (len_b + 1)
+    new_row[0] = row_min = min(i, too_far)
+    char_a = a[i - 1]
+    for j in range(max(1, i - max_distance), min(len_b, i + max_distance) + 1):
+      char_b = b[j - 1]
+      d = min(row[j] + 1,  # correct an insertion error
+              new_row[j - 1] + 1,  # correct a deletion error
+              row[j - 1] + (char_a != char_b))  # correct a wrong character
+      if (i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b):
+        d = min(d, previous_row[j - 2] + 1)  # correct a transposition
+      if d > too_far:
+        d = too_far
+      new_row[j] = d
+      if d < row_min:
+        row_min = d
+    if row_min > max_distance:
+      # Row minimums never decrease.
+      return too_far
+    previous_row, row = row, new_row
+  return row[len_b]
 
 
 def TextWrap(text, length=None, indent='', firstline_indent=None):
@@ -390,15 +613,16 @@ def DocToHelp(doc):
   return doc
 
 
+# Names of the modules whose import indicates a test, see IsRunningTest().
+_TEST_MODULE_NAMES = ('unittest', 'unittest2', 'pytest')
+
+
 def IsRunningTest():
   """Tries to detect whether we are inside of the test."""
-  modules = set(sys.modules)
-  test_modules = {
-      'unittest',
-      'unittest2',
-      'pytest',
-  }
-  return bool(test_modules & modules)
+  for module_name in _TEST_MODULE_NAMES:
+    if module_name in sys.modules:
+      return True
+  return False
 
 
 # TODO(b/31830082): Migrate all users to PEP8-style methods and remove this.
@@ -30,9 +30,12 @@
 """Unittest for helpers module."""
 
 import sys
+import threading
+import types
 
 import unittest
 
+import gflags
 from gflags import _helpers
 from gflags.flags_modules_for_testing import module_bar
 from gflags.flags_modules_for_testing import module_foo
@@ -69,6 +72,19 @@ class FlagSuggestionTest(unittest.TestCase):
   def testDamerauLevenshteinTransposition(self):
     self.assertEqual(1, _helpers._DamerauLevenshtein('kitten', 'ktiten'))
 
+  def testDamerauLevenshteinMaxDistance(self):
+    self.assertEqual(2, _helpers._DamerauLevenshtein('kitten', 'kites', 2))
+    self.assertEqual(2, _helpers._DamerauLevenshtein('kitten', 'kites', 1))
+    self.assertEqual(1, _helpers._DamerauLevenshtein('kitten', 'sitting', 0))
+    self.assertEqual(3, _helpers._DamerauLevenshtein('', 'kites', 2))
+
+  def testSuggestionIndexMatchesGetFlagSuggestions(self):
+    index = _helpers.FlagSuggestionIndex(self.longopts)
+    for attempt in ('fstack_protector_all', 'fstack', 'stack', 'ftree-cc',
+                    'ftre', 'fstrict', 'asdfasdgasdfa', 'ft', ''):
+      self.assertEqual(_helpers.GetFlagSuggestions(attempt, self.longopts),
+                       index.GetSuggestions(attempt))
+
   def testMispelledSuggestions(self):
     suggestions = _helpers.GetFlagSuggestions('fstack_protector_all',
                                               self.longopts)
@@ -163,11 +179,99 @@ class GetCallingModuleTest(unittest.TestCase):
       sys.modules = orig_sys_modules
 
 
+  def testGetCallingModuleSameCodeDifferentModules(self):
+    code = compile('from gflags import _helpers\n'
+                   'module_name = _helpers.GetCallingModule()',
+                   '<string>', 'exec')
+    for name in ('fake_module_a', 'fake_module_b', 'fake_module_a'):
+      module = types.ModuleType(name)
+      sys.modules[name] = module
+      self.addCleanup(sys.modules.pop, name, None)
+      exec(code, module.__dict__)  # pylint: disable=exec-used
+      self.assertEqual(name, module.module_name)
+
+
+class DefiningModuleContextTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+
+  def testFlagsAttributedToModule(self):
+    this_module_name = _helpers.GetCallingModule()
+    with gflags.defining_module(module_bar.__name__) as module_name:
+      self.assertEqual(module_bar.__name__, module_name)
+      gflags.DEFINE_string('bar_flag', '', 'A flag.',
+                           flag_values=self.flag_values)
+      with gflags.defining_module() as inner_module_name:
+        self.assertEqual(this_module_name, inner_module_name)
+        gflags.DEFINE_string('own_flag', '', 'A flag.',
+                             flag_values=self.flag_values)
+      gflags.DEFINE_string('other_bar_flag', '', 'A flag.',
+                           flag_values=self.flag_values)
+    gflags.DEFINE_string('outside_flag', '', 'A flag.',
+                         flag_values=self.flag_values)
+    self.assertEqual(
+        ['bar_flag', 'other_bar_flag'],
+        [f.name for f in self.flag_values.FlagsByModuleDict()[
+            module_bar.__name__]])
+    self.assertEqual(id(module_bar),
+                     self.flag_values.FindModuleIdDefiningFlag('bar_flag'))
+    self.assertEqual(
+        ['own_flag', 'outside_flag'],
+        [f.name for f in self.flag_values.FlagsByModuleDict()[
+            this_module_name]])
+
+  def testContextIsPerThread(self):
+    module_names = []
+
+    def DefineFlag():
+      module_names.append(_helpers.GetCallingModule())
+
+    with gflags.defining_module(module_bar.__name__):
+      thread = threading.Thread(target=DefineFlag)
+      thread.start()
+      thread.join()
+    self.assertEqual([_helpers.GetCallingModule()], module_names)
+
+
 class IsRunningTestTest(unittest.TestCase):
 
   def testUnderTest(self):
     self.assertTrue(_helpers.IsRunningTest())
 
+  def testWithoutTestModules(self):
+    saved = {}
+    for module_name in _helpers._TEST_MODULE_NAMES:
+      if module_name in sys.modules:
+        saved[module_name] = sys.modules.pop(module_name)
+    try:
+      self.assertFalse(_helpers.IsRunningTest())
+    finally:
+      sys.modules.update(saved)
+
+
+class ContextLocalTest(unittest.TestCase):
+
+  def testSetAndReset(self):
+    local = _helpers.ContextLocal('test_local')
+    self.assertIsNone(local.get())
+    token = local.set(1)
+    inner_token = local.set(2)
+    self.assertEqual(2, local.get())
+    local.reset(inner_token)
+    self.assertEqual(1, local.get())
+    local.reset(token)
+    self.assertIsNone(local.get())
+
+  def testThreadsSeeTheirOwnValue(self):
+    local = _helpers.ContextLocal('test_local')
+    local.set(1)
+    values = []
+    thread = threading.Thread(target=lambda: values.append(local.get()))
+    thread.start()
+    thread.join()
+    self.assertEqual([None], values)
+
 
 def main():
   unittest.main()
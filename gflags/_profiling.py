@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Profiling of the work done by FlagValues and of flag definitions.
+
+Instead of importing this module directly, it's preferable to import the
+flags package and use the aliases defined at the package level.
+"""
+
+import atexit
+import collections
+import json
+import os
+import sys
+import threading
+import time
+
+# Environment variable that enables the tracing of flag definitions.  Its
+# value is the name of the Chrome trace file written at exit, or '1' to only
+# trace in memory, see enable_definition_tracing().
+_TRACE_DEFINITIONS_ENV_NAME = 'GFLAGS_TRACE_DEFINITIONS'
+
+# High resolution clock for definition traces.
+_clock = getattr(time, 'perf_counter', time.time)
+
+# Kinds of the operations recorded by a Profiler.
+VALIDATOR = 'validator'
+PARSER = 'parser'
+FLAGFILE = 'flagfile'
+
+
+class _Stats(object):
+  """Call count, cumulative and worst-case time of an operation."""
+
+  __slots__ = ('count', 'total', 'worst')
+
+  def __init__(self):
+    self.count = 0
+    self.total = 0.0
+    self.worst = 0.0
+
+
+class Profiler(object):
+  """Records how often and how long FlagValues runs each operation.
+
+  Install it with FlagValues.set_profiler().  Operations are identified by
+  their kind and name:
+  - 'validator': each validator, named after its flags and the qualified
+    name of its checker function, e.g. '--port: server.CheckPort'.
+  - 'parser': the parse() method of each ArgumentParser class, e.g.
+    'IntegerParser.parse'.
+  - 'flagfile': the expansion of each --flagfile argument, nested flagfiles
+    included, named after the file.  '<prefetch>' is the concurrent read of
+    the flagfiles, see FlagValues.set_flagfile_prefetch().
+  """
+
+  def __init__(self):
+    self._stats = {}
+    self._lock = threading.Lock()
+
+  def record(self, kind, name, elapsed):
+    """Records one run of an operation.
+
+    Args:
+      kind: str, the kind of the operation, e.g. 'validator'.
+      name: str, the name of the operation.
+      elapsed: float, the number of seconds it took.
+    """
+    with self._lock:
+      stats = self._stats.get((kind, name))
+      if stats is None:
+        stats = self._stats[(kind, name)] = _Stats()
+      stats.count += 1
+      stats.total += elapsed
+      if elapsed > stats.worst:
+        stats.worst = elapsed
+
+  def reset(self):
+    """Forgets everything recorded so far."""
+    with self._lock:
+      self._stats.clear()
+
+  def stats(self):
+    """Returns the recorded operations, the most expensive first.
+
+    Returns:
+      A list of dictionaries with the keys 'kind', 'name', 'count', 'total'
+      and 'worst'; the times are in seconds.
+    """
+    with self._lock:
+      rows = [{'kind': kind, 'name': name, 'count': stats.count,
+               'total': stats.total, 'worst': stats.worst}
+              for (kind, name), stats in self._stats.items()]
+    rows.sort(key=lambda row: (-row['total'], row['kind'], row['name']))
+    return rows
+
+  def format_table(self):
+    """Returns the recorded operations as a table, the most expensive first."""
+    lines = ['%-10s %8s %12s %12s  %s' % (
+        'kind', 'count', 'total (ms)', 'worst (ms)', 'name')]
+    for row in self.stats():
+      lines.append('%-10s %8d %12.3f %12.3f  %s' % (
+          row['kind'], row['count'], row['total'] * 1000,
+          row['worst'] * 1000, row['name']))
+    return '\n'.join(lines)
+
+  def to_json(self, **kwargs):
+    """Returns the recorded operations as a JSON list, see stats().
+
+    Args:
+      **kwargs: passed to json.dumps, e.g. indent.
+    """
+    return json.dumps(self.stats(), **kwargs)
+
+
+def validator_name(validator):
+  """Returns the name a Profiler records a validator under."""
+  checker = validator.checker
+  qualname = getattr(checker, '__qualname__', None) or getattr(
+      checker, '__name__', type(checker).__name__)
+  module = getattr(checker, '__module__', None)
+  if module:
+    qualname = '%s.%s' % (module, qualname)
+  return '%s: %s' % (
+      ','.join('--' + name for name in validator.get_flags_names()), qualname)
+
+
+def parser_name(parser):
+  """Returns the name a Profiler records the parse() of a parser under."""
+  return type(parser).__name__ + '.parse'
+
+
+class _Definition(
+    collections.namedtuple(
+        '_Definition',
+        'module_name flag_name thread_id construct register attribute')):
+  """A traced DEFINE_* call.
+
+  Fields:
+  - module_name: str, the module the flag was attributed to, or None if the
+    flag was not registered with a FlagValues object.
+  - flag_name: str, the name of the flag.
+  - thread_id: int, the thread that defined the flag.
+  - construct, register, attribute: (start, end) clock readings in seconds
+    of the construction of the Flag object, default parsing included, of its
+    registration by FlagValues.__setitem__, and of its attribution to the
+    defining module.  construct is None for flags constructed by the caller
+    of DEFINE_flag.
+  """
+
+
+class DefinitionTracer(object):
+  """Records the time taken by each DEFINE_* call.
+
+  Enabled by enable_definition_tracing() or by the GFLAGS_TRACE_DEFINITIONS
+  environment variable.  The per-module totals help finding the modules that
+  are slow to import because of their flag definitions.
+  """
+
+  def __init__(self):
+    self._definitions = []
+    self._lock = threading.Lock()
+    self._origin = _clock()
+
+  def now(self):
+    """Returns the current reading of the clock used by the trace."""
+    return _clock()
+
+  def record(self, module_name, flag_name, construct, register, attribute):
+    """Records a DEFINE_* call, see _Definition for the arguments."""
+    definition = _Definition(module_name, flag_name,
+                             threading.current_thread().ident,
+                             construct, register, attribute)
+    with self._lock:
+      self._definitions.append(definition)
+
+  def definitions(self):
+    """Returns the list of recorded _Definition tuples, in definition order."""
+    with self._lock:
+      return list(self._definitions)
+
+  def summary(self):
+    """Returns the time spent defining flags per module, slowest first.
+
+    Returns:
+      A list of dictionaries with the keys 'module', 'count', 'construct',
+      'register', 'attribute' and 'total'; the times are in seconds.
+    """
+    modules = collections.OrderedDict()
+    for definition in self.definitions():
+      row = modules.get(definition.module_name)
+      if row is None:
+        row = modules[definition.module_name] = {
+            'module': definition.module_name, 'count': 0, 'construct': 0.0,
+            'register': 0.0, 'attribute': 0.0, 'total': 0.0}
+      row['count'] += 1
+      for phase in ('construct', 'register', 'attribute'):
+        span = getattr(definition, phase)
+        if span is not None:
+          row[phase] += span[1] - span[0]
+          row['total'] += span[1] - span[0]
+    return sorted(modules.values(), key=lambda row: -row['total'])
+
+  def format_summary(self):
+    """Returns the per-module summary as a table, slowest module first."""
+    lines = ['%8s %12s %12s %12s %12s  %s' % (
+        'flags', 'total (ms)', 'construct', 'register', 'attribute',
+        'module')]
+    for row in self.summary():
+      lines.append('%8d %12.3f %12.3f %12.3f %12.3f  %s' % (
+          row['count'], row['total'] * 1000, row['construct'] * 1000,
+          row['register'] * 1000, row['attribute'] * 1000, row['module']))
+    return '\n'.join(lines)
+
+  def chrome_trace(self):
+    """Returns the trace in the Chrome trace event format.
+
+    The result can be loaded in chrome://tracing or Perfetto once serialized
+    to JSON: one complete event per phase of each definition.
+
+    Returns:
+      A dictionary with a 'traceEvents' list.
+    """
+    pid = os.getpid()
+    events = []
+    for definition in self.definitions():
+      for phase in ('construct', 'register', 'attribute'):
+        span = getattr(definition, phase)
+        if span is None:
+          continue
+        events.append({
+            'name': definition.flag_name,
+            'cat': phase,
+            'ph': 'X',
+            'ts': (span[0] - self._origin) * 1e6,
+            'dur': (span[1] - span[0]) * 1e6,
+            'pid': pid,
+            'tid': definition.thread_id,
+            'args': {'module': definition.module_name},
+        })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+  def write_chrome_trace(self, filename):
+    """Writes the trace to a file in the Chrome trace event JSON format."""
+    with open(filename, 'w') as trace_file:
+      json.dump(self.chrome_trace(), trace_file)
+
+
+# The process-wide DefinitionTracer, or None if tracing is disabled.
+_definition_tracer = None
+
+
+def enable_definition_tracing(trace_file=None):
+  """Enables the tracing of the flags defined from now on.
+
+  Args:
+    trace_file: None, or the name of a file to write the Chrome trace to at
+      exit.  The per-module summary is then written to stderr as well.
+
+  Returns:
+    The DefinitionTracer instance.
+  """
+  global _definition_tracer
+  tracer = _definition_tracer = DefinitionTracer()
+  if trace_file:
+    atexit.register(_WriteDefinitionTrace, tracer, trace_file)
+  return tracer
+
+
+def disable_definition_tracing():
+  """Disables the tracing of flag definitions."""
+  global _definition_tracer
+  _definition_tracer = None
+
+
+def get_definition_tracer():
+  """Returns the process-wide DefinitionTracer, or None if it is disabled."""
+  return _definition_tracer
+
+
+def _WriteDefinitionTrace(tracer, trace_file):
+  tracer.write_chrome_trace(trace_file)
+  sys.stderr.write(tracer.format_summary() + '\n')
+
+
+if os.environ.get(_TRACE_DEFINITIONS_ENV_NAME):
+  enable_definition_tracing(
+      None if os.environ[_TRACE_DEFINITIONS_ENV_NAME] == '1'
+      else os.environ[_TRACE_DEFINITIONS_ENV_NAME])
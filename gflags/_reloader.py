@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Reloading of flagfiles in long-running processes.
+
+Instead of importing this module directly, it's preferable to import the
+flags package and use the aliases defined at the package level.
+"""
+
+import copy
+import logging
+import sys
+import threading
+
+import six
+
+from gflags import _flagfile
+from gflags import exceptions
+from gflags import flagvalues
+
+# Default number of seconds between two checks of the watched flagfiles.
+_DEFAULT_INTERVAL = 1.0
+
+
+class FlagFileReloader(object):
+  """Applies the changes made to flagfiles to the flags of a running process.
+
+  The reloader watches the flagfiles named by --flagfile in argv, and the
+  flagfiles they include, by polling their modification times:
+       reloader = gflags.FlagFileReloader(FLAGS)
+       reloader.subscribe(OnFlagsReloaded)
+       reloader.start()
+
+  When one of them changes, argv is parsed again into a staging registry,
+  which holds copies of the flags.  The staged values are checked with all
+  the validators, and only if they are all valid are the flags whose parsed
+  value changed assigned, at once, with FlagValues.update().  The flags the
+  flagfiles did not change keep their values, even if they were assigned
+  since; a flag removed from a flagfile gets its default value back.
+  Hidden flags are not reloaded.
+
+  Subscribers are called after the changes are applied, with a dictionary:
+  flag name -> (old value, new value).
+  """
+
+  def __init__(self, flag_values, argv=None, interval=_DEFAULT_INTERVAL):
+    """Constructor.
+
+    Args:
+      flag_values: FlagValues, the flags to reload, parsed from argv.
+      argv: None or a list of strings, the command line the flags were
+        parsed from, including argv[0].  Defaults to sys.argv.
+      interval: float, the number of seconds between two checks of the
+        flagfiles by the thread started by start().
+    """
+    self._flag_values = flag_values
+    self._argv = list(sys.argv if argv is None else argv)
+    self._interval = interval
+    self._subscribers = []
+    # Serializes the checks and reloads.
+    self._lock = threading.Lock()
+    # None until the first check, or dictionary: flagfile name ->
+    # _flagfile.FileSignature, the watched flagfiles.
+    self._signatures = None
+    # Dictionary: flag name -> the value the flagfiles and argv set it to at
+    # the last reload, for the flags they set.
+    self._parsed_values = {}
+    self._thread = None
+    self._stop = threading.Event()
+
+  def subscribe(self, callback):
+    """Calls callback(changes) after each reload changing flags."""
+    self._subscribers.append(callback)
+
+  def unsubscribe(self, callback):
+    self._subscribers.remove(callback)
+
+  def watched_files(self):
+    """Returns the sorted names of the watched flagfiles."""
+    with self._lock:
+      self.__Initialize()
+      return sorted(self._signatures)
+
+  def check(self):
+    """Reloads the flagfiles if any of them changed.
+
+    Returns:
+      A dictionary, flag name -> (old value, new value), the flags changed
+      by the reload; empty if no flagfile changed.
+
+    Raises:
+      Error: if the flagfiles cannot be parsed, e.g. CantOpenFlagFileError
+        or UnrecognizedFlagError.  No flag is changed in this case.
+      IllegalFlagValueError: if a validator rejects the reloaded values.  No
+        flag is changed in this case.
+    """
+    with self._lock:
+      if not self.__Initialize():
+        for filename, signature in six.iteritems(self._signatures):
+          if _flagfile.get_file_signature(filename) != signature:
+            break
+        else:
+          return {}
+      changes = self.__Reload()
+    self.__Notify(changes)
+    return changes
+
+  def reload(self):
+    """Reloads the flagfiles, even if none of them changed.
+
+    Returns:
+      See check().
+
+    Raises:
+      See check().
+    """
+    with self._lock:
+      self.__Initialize()
+      changes = self.__Reload()
+    self.__Notify(changes)
+    return changes
+
+  def start(self):
+    """Starts a daemon thread calling check() every interval seconds.
+
+    Failed reloads are logged, and retried once the flagfiles change again.
+    """
+    if self._thread is not None:
+      raise exceptions.Error('FlagFileReloader already started')
+    self.watched_files()
+    self._stop.clear()
+    self._thread = threading.Thread(target=self.__Run,
+                                    name='FlagFileReloader')
+    self._thread.daemon = True
+    self._thread.start()
+
+  def stop(self):
+    """Stops the thread started by start(), and waits for it."""
+    if self._thread is None:
+      return
+    self._stop.set()
+    self._thread.join()
+    self._thread = None
+
+  def __Run(self):
+    while not self._stop.wait(self._interval):
+      try:
+        self.check()
+      except Exception:  # pylint: disable=broad-except
+        logging.exception('Failed to reload the flagfiles.')
+
+  def __Initialize(self):
+    """Takes the state of the flagfiles as the baseline, on the first call.
+
+    Returns:
+      True if this was the first call.
+    """
+    if self._signatures is not None:
+      return False
+    self._signatures = {}
+    staging = self.__Stage()
+    self._parsed_values = staging.parsed_values
+    return True
+
+  def __Stage(self):
+    """Parses argv again into a staging registry.
+
+    The signatures of the flagfiles are recorded while they are parsed,
+    each one before the file is read, so that a flagfile changed while it
+    is parsed is reloaded again by the next check.
+
+    Returns:
+      A _Staging.
+    """
+    staging = _Staging(self._flag_values, self._parsed_values)
+    record = _flagfile.ExpansionRecord()
+    try:
+      staging.parse(self._argv, record)
+    finally:
+      # Also on failure, so that a broken flagfile is not retried until it
+      # changes again.
+      self._signatures = dict(record.files)
+    return staging
+
+  def __Reload(self):
+    """Stages, validates and applies the flagfiles; returns the changes."""
+    live = self._flag_values
+    staging = self.__Stage()
+    previous_values = self._parsed_values
+    new_values = staging.parsed_values
+    updates = {}
+    live_flags = live.FlagDict()
+    for name in set(previous_values) | set(new_values):
+      staged_flag = staging.flags.get(name)
+      if staged_flag is None or name not in live_flags:
+        # Deleted since the last reload.
+        continue
+      if (name in previous_values and name in new_values and
+          previous_values[name] == new_values[name]):
+        # Untouched by the change: keeps its current value, even if it was
+        # assigned since the last reload.
+        staged_flag.value = live[name].value
+      elif (not live._IsHidden(name) and  # pylint: disable=protected-access
+            staged_flag.value != live[name].value):
+        updates[name] = staged_flag.value
+    staging.registry._AssertAllValidators()  # pylint: disable=protected-access
+    old_values = dict((name, live[name].value) for name in updates)
+    if updates:
+      live.update(**updates)
+    self._parsed_values = new_values
+    return dict((name, (old_values[name], value))
+                for name, value in six.iteritems(updates))
+
+  def __Notify(self, changes):
+    if not changes:
+      return
+    for callback in list(self._subscribers):
+      try:
+        callback(changes)
+      except Exception:  # pylint: disable=broad-except
+        logging.exception('FlagFileReloader subscriber %r failed.', callback)
+
+
+class _Staging(object):
+  """A copy of the flags of a FlagValues, parsed without changing them.
+
+  Attributes:
+    registry: FlagValues holding the copies.
+    flags: dictionary, flag name -> the copy of the flag, for every flag
+      except the aliases, which are registered as their original flag.
+    parsed_values: dictionary, flag name -> value, the flags set by parse().
+  """
+
+  def __init__(self, live, previous_values):
+    """Constructor.
+
+    Args:
+      live: FlagValues, the flags to copy.  The copies keep their values.
+      previous_values: dictionary, flag name -> value, the flags set by the
+        previous parse, which start from their default values instead.
+    """
+    self.registry = flagvalues.FlagValues()
+    self.registry.UseGnuGetOpt(live.IsGnuGetOpt())
+    self.flags = {}
+    self.parsed_values = {}
+    copies = {}
+    aliases = []
+    for name, flag in six.iteritems(live.FlagDict()):
+      original = getattr(flag, '_original_flag', None)
+      if original is not None:
+        # Parsing an alias parses its original flag, not a copy of it.
+        aliases.append((name, original))
+      elif id(flag) not in copies:
+        flag_copy = copy.copy(flag)
+        flag_copy.present = 0
+        if flag.name in previous_values:
+          flag_copy.unparse()
+        copies[id(flag)] = flag_copy
+        self.flags[flag.name] = flag_copy
+        self.registry[flag.name] = flag_copy
+    flag_dict = self.registry.FlagDict()
+    for name, original in aliases:
+      if id(original) in copies:
+        flag_dict[name] = copies[id(original)]
+
+  def parse(self, argv, record=None):
+    """Parses argv into the copies, without checking the validators.
+
+    Args:
+      argv: list of strings, the command line, including argv[0].
+      record: None or an _flagfile.ExpansionRecord that the flagfiles read
+        are added to.
+
+    Raises:
+      Error: on any parsing error.
+    """
+    registry = self.registry
+    args = list(registry._IterFlagsFromFiles(argv[1:], False, record))  # pylint: disable=protected-access
+    unknown_flags, _, undefok = registry._ParseArgs(args, False)  # pylint: disable=protected-access
+    for name, value in unknown_flags:
+      if name not in undefok:
+        raise exceptions.UnrecognizedFlagError(name, value)
+    self.parsed_values = dict((name, flag.value)
+                              for name, flag in six.iteritems(self.flags)
+                              if flag.present)
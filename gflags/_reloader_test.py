@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Unittest for the flagfile reloader."""
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import gflags
+from gflags import _flagfile
+from gflags import exceptions
+
+
+class FlagFileReloaderTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('low', 1, 'Lower bound.',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_integer('high', 10, 'Upper bound.',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_string('name', 'x', 'A string flag.',
+                         flag_values=self.flag_values)
+    gflags.DEFINE_alias('lower', 'low', flag_values=self.flag_values)
+    gflags.register_multi_flags_validator(
+        ['low', 'high'], lambda values: values['low'] < values['high'],
+        flag_values=self.flag_values)
+    self.main_file = self._WriteFlagFile('main.cfg', '--low=2')
+    self.nested_file = self._WriteFlagFile('nested.cfg', '--name=y')
+    self.argv = ['prog', '--flagfile=' + self.main_file,
+                 '--flagfile=' + self.nested_file]
+    self.flag_values(self.argv)
+    self.reloader = gflags.FlagFileReloader(self.flag_values, self.argv)
+    self.reloader.check()
+
+  def tearDown(self):
+    self.reloader.stop()
+    shutil.rmtree(self.tmpdir)
+
+  def _WriteFlagFile(self, basename, *lines):
+    filename = os.path.join(self.tmpdir, basename)
+    existed = os.path.exists(filename)
+    with open(filename, 'w') as f:
+      f.write('\n'.join(lines) + '\n')
+    if existed:
+      # Makes the change visible even with a coarse modification time.
+      mtime = os.stat(filename).st_mtime + 10
+      os.utime(filename, (mtime, mtime))
+    return filename
+
+  def testNoChange(self):
+    self.assertEqual({}, self.reloader.check())
+    self.assertEqual(2, self.flag_values.low)
+
+  def testWatchesNestedFlagFiles(self):
+    included_file = self._WriteFlagFile('included.cfg', '--high=20')
+    self._WriteFlagFile('nested.cfg', '--name=y',
+                        '--flagfile=' + included_file)
+    self.assertEqual({'high': (10, 20)}, self.reloader.check())
+    self.assertIn(os.path.realpath(included_file),
+                  [os.path.realpath(f) for f in self.reloader.watched_files()])
+    self._WriteFlagFile('included.cfg', '--high=30')
+    self.assertEqual({'high': (20, 30)}, self.reloader.check())
+
+  def testOnlyChangedFlagsAreTouched(self):
+    self.flag_values.name = 'assigned'
+    self._WriteFlagFile('main.cfg', '--low=3')
+    self.assertEqual({'low': (2, 3)}, self.reloader.check())
+    self.assertEqual('assigned', self.flag_values.name)
+
+  def testRemovedFlagGetsItsDefault(self):
+    self._WriteFlagFile('main.cfg', '# Nothing.')
+    self.assertEqual({'low': (2, 1)}, self.reloader.check())
+
+  def testAlias(self):
+    self._WriteFlagFile('main.cfg', '--lower=4')
+    self.assertEqual({'low': (2, 4)}, self.reloader.check())
+    self.assertEqual(4, self.flag_values.lower)
+
+  def testInvalidValuesAreNotApplied(self):
+    self._WriteFlagFile('main.cfg', '--low=3', '--name=z')
+    self._WriteFlagFile('nested.cfg', '--lower=50')
+    self.assertRaises(exceptions.IllegalFlagValueError, self.reloader.check)
+    self.assertEqual((2, 'y'), (self.flag_values.low, self.flag_values.name))
+    # Not retried until the flagfiles change again.
+    self.assertEqual({}, self.reloader.check())
+    self._WriteFlagFile('nested.cfg', '--high=60')
+    self.assertEqual({'low': (2, 3), 'name': ('y', 'z'), 'high': (10, 60)},
+                     self.reloader.check())
+
+  def testUnreadableFlagFile(self):
+    os.remove(self.nested_file)
+    self.assertRaises(exceptions.CantOpenFlagFileError, self.reloader.check)
+    self.assertEqual('y', self.flag_values.name)
+
+  def testDeletedFlag(self):
+    delattr(self.flag_values, 'name')
+    self._WriteFlagFile('nested.cfg', '# Nothing.')
+    self._WriteFlagFile('main.cfg', '--low=3')
+    self.assertEqual({'low': (2, 3)}, self.reloader.check())
+
+  def testFlagFilesAreReadOnce(self):
+    read_flag_lines = _flagfile.read_flag_lines
+    read_files = []
+
+    def RecordingRead(filename):
+      read_files.append(filename)
+      return read_flag_lines(filename)
+
+    _flagfile.read_flag_lines = RecordingRead
+    self.addCleanup(setattr, _flagfile, 'read_flag_lines', read_flag_lines)
+    self._WriteFlagFile('main.cfg', '--low=3')
+    self.reloader.check()
+    self.assertEqual([self.main_file, self.nested_file], read_files)
+
+  def testReloadIsOneChangeBatch(self):
+    batches = []
+    self.flag_values.on_any_change(batches.append)
+    self._WriteFlagFile('main.cfg', '--low=3', '--high=20')
+    self.reloader.check()
+    self.assertEqual([{'low': (2, 3), 'high': (10, 20)}], batches)
+
+  def testSubscribersAndThread(self):
+    self.reloader = gflags.FlagFileReloader(self.flag_values, self.argv,
+                                            interval=0.01)
+    notified = threading.Event()
+    changes = []
+
+    def OnReload(reloaded):
+      changes.append(reloaded)
+      notified.set()
+
+    self.reloader.subscribe(OnReload)
+    self.reloader.start()
+    self._WriteFlagFile('main.cfg', '--low=5')
+    self.assertTrue(notified.wait(5))
+    self.reloader.stop()
+    self.assertEqual([{'low': (2, 5)}], changes)
+    self.assertEqual(5, self.flag_values.low)
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
@@ -33,7 +33,9 @@ Instead of importing this module directly, it's preferable to import the
 flags package and use the aliases defined at the package level.
 """
 
+import collections
 from functools import total_ordering
+import threading
 
 import six
 
@@ -42,6 +44,85 @@ from gflags import argument_parser
 from gflags import exceptions
 
 
+# Bool: True if the default values of the flags constructed from now on are
+# parsed on first use rather than by the constructor.
+_lazy_default_parsing = False
+
+
+def set_lazy_default_parsing(lazy=True):
+  """Defers the parsing of the default values of new flags to their first use.
+
+  By default, constructing a flag parses its default value and serializes it
+  for the help.  In lazy mode both happen on first access to the value, the
+  default_as_str attribute, the help or the serialization of the flag, and
+  at the latest when the FlagValues it is registered with is marked parsed.
+  An invalid default value is then only reported at that point, rather than
+  by the DEFINE_* call.  Only the flags constructed after the call are
+  affected.
+
+  Args:
+    lazy: bool, False parses the default values of new flags eagerly again.
+  """
+  global _lazy_default_parsing
+  _lazy_default_parsing = lazy
+
+
+class _FlagOptions(
+    collections.namedtuple(
+        '_FlagOptions',
+        'allow_override allow_cpp_override allow_hide_cpp allow_overwrite')):
+  """The rarely changed attributes of a Flag, see Flag for their meaning.
+
+  Flags with the same options share the same _FlagOptions instance.
+  """
+
+  __slots__ = ()
+
+
+# Dictionary: _FlagOptions -> the same _FlagOptions, the instance shared by
+# the flags with these options.
+_shared_options = {}
+
+
+def _ShareOptions(options):
+  """Returns the shared _FlagOptions instance equal to options."""
+  return _shared_options.setdefault(options, options)
+
+
+def _OptionProperty(name):
+  """Returns a property for the field of _FlagOptions called name."""
+
+  def Getter(self):
+    return getattr(self._options, name)  # pylint: disable=protected-access
+
+  def Setter(self, value):
+    self._options = _ShareOptions(self._options._replace(**{name: value}))  # pylint: disable=protected-access
+
+  return property(Getter, Setter)
+
+
+# Serializes the changes to the _value_readers of all flags.
+_value_readers_lock = threading.Lock()
+
+# Shared by the flags without validators, until one is added.
+_NO_VALIDATORS = ()
+
+# Dictionary: Flag subclass -> tuple of the names of the slots copied by
+# Flag.__getstate__() and Flag.__copy__().
+_state_slots_by_class = {}
+
+
+def _GetStateSlots(cls):
+  """Returns the names of the slots holding the state of a Flag subclass."""
+  slots = _state_slots_by_class.get(cls)
+  if slots is None:
+    slots = tuple(slot for klass in cls.__mro__
+                  for slot in klass.__dict__.get('__slots__', ())
+                  if slot != '__weakref__')
+    _state_slots_by_class[cls] = slots
+  return slots
+
+
 class _FlagMetaClass(type):
 
   def __new__(mcs, name, bases, dct):
@@ -99,8 +180,17 @@ class Flag(six.with_metaclass(_FlagMetaClass, object)):
 
   Note: The default value is also presented to the user in the help
   string, so it is important that it be a legal value for this flag.
+
+  Flags use __slots__ to keep large registries small.  The allow_*
+  attributes are stored in a _FlagOptions tuple shared by the flags with the
+  same options.  Subclasses may still add attributes of their own.
   """
 
+  __slots__ = ('name', 'help', 'short_name', 'boolean', 'present', 'parser',
+               'serializer', 'default', 'using_default_value', '_value',
+               '_default_as_str', '_default_pending', '_validators',
+               '_help_cache', '_options', '_value_readers', '__weakref__')
+
   def __init__(self, parser, serializer, name, default, help_string,
                short_name=None, boolean=False, allow_override=False,
                allow_cpp_override=False, allow_hide_cpp=False,
@@ -116,31 +206,132 @@ class Flag(six.with_metaclass(_FlagMetaClass, object)):
     self.present = 0
     self.parser = parser
     self.serializer = serializer
-    self.allow_override = allow_override
-    self.allow_cpp_override = allow_cpp_override
-    self.allow_hide_cpp = allow_hide_cpp
-    self.allow_overwrite = allow_overwrite
+    self._options = _ShareOptions(_FlagOptions(
+        allow_override, allow_cpp_override, allow_hide_cpp, allow_overwrite))
 
     self.using_default_value = True
     self._value = None
-    self.validators = []
+    self._default_as_str = None
+    # Bool: True while the default value is not parsed yet, see
+    # set_lazy_default_parsing().
+    self._default_pending = False
+    # Tuple or list: the validators of this flag, in creation order.  The
+    # shared _NO_VALIDATORS tuple until the validators property is accessed.
+    self._validators = _NO_VALIDATORS
+    # Tuple of (dict, name): the dictionaries caching the value of this flag
+    # under a name, see _cache_value().
+    self._value_readers = ()
+    # None or (key, str): the last help block built by _get_help_text().
+    self._help_cache = None
     if allow_hide_cpp and allow_cpp_override:
       raise exceptions.Error(
           "Can't have both allow_hide_cpp (means use Python flag) and "
           'allow_cpp_override (means use C++ flag after InitGoogle)')
 
     if parse_default:
-      self._set_default(default)
+      self._set_default(default, lazy=_lazy_default_parsing)
     else:
       self.default = default
 
+  allow_override = _OptionProperty('allow_override')
+  allow_cpp_override = _OptionProperty('allow_cpp_override')
+  allow_hide_cpp = _OptionProperty('allow_hide_cpp')
+  allow_overwrite = _OptionProperty('allow_overwrite')
+
+  @property
+  def validators(self):
+    """The list of the validators of this flag, in creation order."""
+    if self._validators is _NO_VALIDATORS:
+      self._validators = []
+    return self._validators
+
+  @validators.setter
+  def validators(self, validators):
+    self._validators = validators
+
   @property
   def value(self):
+    if self._default_pending:
+      self._parse_pending_default()
     return self._value
 
   @value.setter
   def value(self, value):
+    if self._default_pending:
+      self._parse_pending_default()
     self._value = value
+    # Dropped after the assignment, so that a concurrent _cache_value()
+    # either sees the new value or has its entry dropped.
+    if self._value_readers:
+      self._drop_cached_values()
+
+  def _cache_value(self, cache, name):
+    """Stores the value of this flag in a dictionary until it changes.
+
+    FlagValues uses this to serve reads of parsed flags from its instance
+    dictionary.  The entry is removed when a new value is assigned.  Flags
+    whose class overrides the value property are never cached.
+
+    Args:
+      cache: dict, the dictionary to store the value in.
+      name: str, the key to store the value under.
+    """
+    if type(self).value is not Flag.value:
+      return
+    with _value_readers_lock:
+      if not any(reader_cache is cache and reader_name == name
+                 for reader_cache, reader_name in self._value_readers):
+        self._value_readers += ((cache, name),)
+      value = self._value
+      cache[name] = value
+      if self._value is not value or self._default_pending:
+        cache.pop(name, None)
+
+  def _drop_cached_values(self):
+    """Removes the value of this flag from the dictionaries caching it."""
+    with _value_readers_lock:
+      readers, self._value_readers = self._value_readers, ()
+      for cache, name in readers:
+        cache.pop(name, None)
+
+  @property
+  def default_as_str(self):
+    if self._default_pending:
+      self._parse_pending_default()
+    return self._default_as_str
+
+  @default_as_str.setter
+  def default_as_str(self, value):
+    if self._default_pending:
+      self._parse_pending_default()
+    self._default_as_str = value
+
+  def __getstate__(self):
+    """Returns the state to copy or pickle, without the value caches."""
+    state = dict(getattr(self, '__dict__', ()))
+    for slot in _GetStateSlots(type(self)):
+      if hasattr(self, slot):
+        state[slot] = getattr(self, slot)
+    state['_value_readers'] = ()
+    return state
+
+  def __setstate__(self, state):
+    for name, value in six.iteritems(state):
+      object.__setattr__(self, name, value)
+
+  def __copy__(self):
+    """Returns a shallow copy of this flag, without the value caches."""
+    cls = type(self)
+    flag_copy = object.__new__(cls)
+    for slot in _GetStateSlots(cls):
+      try:
+        object.__setattr__(flag_copy, slot, getattr(self, slot))
+      except AttributeError:
+        pass
+    if hasattr(self, '__dict__'):
+      flag_copy.__dict__.update(self.__dict__)
+    flag_copy._value_readers = ()
+    return flag_copy
 
   def __hash__(self):
     return hash(id(self))
@@ -183,6 +374,22 @@ class Flag(six.with_metaclass(_FlagMetaClass, object)):
           'flag --%s=%s: %s' % (self.name, argument, e))
     self.present += 1
 
+  def _parse_converted(self, value):
+    """Same as parse(), for a value already converted by the parser.
+
+    Used for the values stored in compiled flagfiles, see
+    FlagValues.compile_flagfile().
+
+    Args:
+      value: the value returned by self.parser.parse().
+    """
+    if self.present and not self.allow_overwrite:
+      raise exceptions.IllegalFlagValueError(
+          'flag --%s=%s: already defined as %s' % (
+              self.name, value, self.value))
+    self.value = value
+    self.present += 1
+
   def unparse(self):
     if self.default is None:
       self.value = None
@@ -206,8 +413,14 @@ class Flag(six.with_metaclass(_FlagMetaClass, object)):
             'Serializer not present for flag %s' % self.name)
       return '--%s=%s' % (self.name, self.serializer.serialize(self.value))
 
-  def _set_default(self, value):
-    """Changes the default value (and current value too) for this Flag."""
+  def _set_default(self, value, lazy=False):
+    """Changes the default value (and current value too) for this Flag.
+
+    Args:
+      value: The new default value.
+      lazy: bool, True defers parsing the default value to its first use,
+        see set_lazy_default_parsing().
+    """
     # We can't allow a None override because it may end up not being
     # passed to C++ code when we're overriding C++ flags.  So we
     # cowardly bail out until someone fixes the semantics of trying to
@@ -217,9 +430,73 @@ class Flag(six.with_metaclass(_FlagMetaClass, object)):
       raise exceptions.DuplicateFlagCannotPropagateNoneToSwig(self.name)
 
     self.default = value
+    self._help_cache = None
+    # Subclasses overriding the value property, e.g. aliases, may forward the
+    # parsed default elsewhere, so only plain flags defer parsing it.
+    if lazy and type(self).value is Flag.value:
+      self._default_pending = True
+      self.using_default_value = True
+      self.present = 0
+      return
+    self._default_pending = False
     self.unparse()
     self.default_as_str = self._get_parsed_value_as_string(self.value)
 
+  def _parse_pending_default(self):
+    """Parses the default value deferred by lazy default parsing.
+
+    Raises:
+      IllegalFlagValueError: if the default value is invalid.  It is raised
+        again on every later attempt.
+    """
+    self._default_pending = False
+    try:
+      self.unparse()
+    except Exception:
+      self._default_pending = True
+      raise
+    self._default_as_str = self._get_parsed_value_as_string(self._value)
+
+  def _get_help_text(self, prefix, width):
+    """Returns the help block of this flag, as printed by --help.
+
+    The block is built once and reused until one of the values it is built
+    from, or the layout, changes.
+
+    Args:
+      prefix: str, per-line output prefix.
+      width: int, maximum length of a line, includes the prefix.
+
+    Returns:
+      str, the wrapped help block, without trailing newline.
+    """
+    key = (width, prefix, self.name, self.short_name, self.boolean, self.help,
+           self.default_as_str, self.parser.syntactic_help)
+    cache = self._help_cache
+    if cache is not None and cache[0] == key:
+      return cache[1]
+    flaghelp = ''
+    if self.short_name: flaghelp += '-%s,' % self.short_name
+    if self.boolean:
+      flaghelp += '--[no]%s:' % self.name
+    else:
+      flaghelp += '--%s:' % self.name
+    flaghelp += ' '
+    if self.help:
+      flaghelp += self.help
+    flaghelp = _helpers.TextWrap(
+        flaghelp, width, indent=prefix+'  ', firstline_indent=prefix)
+    if self.default_as_str:
+      flaghelp += '\n'
+      flaghelp += _helpers.TextWrap(
+          '(default: %s)' % self.default_as_str, width, indent=prefix+'  ')
+    if self.parser.syntactic_help:
+      flaghelp += '\n'
+      flaghelp += _helpers.TextWrap(
+          '(%s)' % self.parser.syntactic_help, width, indent=prefix+'  ')
+    self._help_cache = (key, flaghelp)
+    return flaghelp
+
   def flag_type(self):
     """Get type of flag.
 
@@ -311,6 +588,8 @@ class BooleanFlag(Flag):
   explicitly unset through either --noupdate or --nox.
   """
 
+  __slots__ = ()
+
   def __init__(self, name, default, help, short_name=None, **args):  # pylint: disable=redefined-builtin
     p = argument_parser.BooleanParser()
     Flag.__init__(self, p, None, name, default, help, short_name, 1, **args)
@@ -319,6 +598,8 @@ class BooleanFlag(Flag):
 class EnumFlag(Flag):
   """Basic enum flag; its value can be any string from list of enum_values."""
 
+  __slots__ = ()
+
   def __init__(self, name, default, help, enum_values=None,  # pylint: disable=redefined-builtin
                short_name=None, case_sensitive=True, **args):
     enum_values = enum_values or []
@@ -352,6 +633,8 @@ class MultiFlag(Flag):
       value
   """
 
+  __slots__ = ()
+
   def __init__(self, *args, **kwargs):
     Flag.__init__(self, *args, **kwargs)
     self.help += ';\n    repeat this option to specify a list of values'
@@ -385,6 +668,16 @@ class MultiFlag(Flag):
     # put list of option values back in the 'value' attribute
     self.value = values
 
+  def _parse_converted(self, value):
+    """Same as parse(), for a single value already converted by the parser."""
+    if self.present:
+      values = self.value
+    else:
+      values = []
+    Flag._parse_converted(self, value)
+    values.append(value)
+    self.value = values
+
   def serialize(self):
     if not self.serializer:
       raise exceptions.Error(
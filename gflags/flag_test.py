@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Unittest for flag module."""
+
+import copy
+import pickle
+import unittest
+
+import gflags
+from gflags import flag as _flag
+
+
+class FlagRepresentationTest(unittest.TestCase):
+
+  def _MakeFlag(self, name, **kwargs):
+    return gflags.Flag(gflags.ArgumentParser(), gflags.ArgumentSerializer(),
+                       name, 'default', 'A flag.', **kwargs)
+
+  def testNoInstanceDict(self):
+    for flag in (self._MakeFlag('name'),
+                 gflags.BooleanFlag('verbose', False, 'A boolean flag.'),
+                 gflags.EnumFlag('mode', 'a', 'An enum flag.', ['a', 'b']),
+                 gflags.MultiFlag(gflags.ArgumentParser(),
+                                  gflags.ArgumentSerializer(), 'names',
+                                  ['a'], 'A multi flag.')):
+      self.assertFalse(hasattr(flag, '__dict__'), type(flag).__name__)
+
+  def testSharedOptions(self):
+    first = self._MakeFlag('first')
+    second = self._MakeFlag('second')
+    self.assertIs(first._options, second._options)
+    second.allow_override = True
+    self.assertTrue(second.allow_override)
+    self.assertFalse(first.allow_override)
+    self.assertIs(second._options, self._MakeFlag(
+        'third', allow_override=True)._options)
+    self.assertTrue(second.allow_overwrite)
+
+  def testValidatorsSharedUntilNeeded(self):
+    first = self._MakeFlag('first')
+    second = self._MakeFlag('second')
+    self.assertIs(first._validators, second._validators)
+    first.validators.append('validator')
+    self.assertEqual(['validator'], first.validators)
+    self.assertEqual([], second.validators)
+    second.validators = ['other']
+    self.assertEqual(['other'], second._validators)
+
+  def testSubclassAttributes(self):
+
+    class CustomFlag(_flag.Flag):
+
+      def __init__(self, *args, **kwargs):
+        self.custom = 'custom'
+        super(CustomFlag, self).__init__(*args, **kwargs)
+
+    flag = CustomFlag(gflags.ArgumentParser(), gflags.ArgumentSerializer(),
+                      'name', 'default', 'A flag.')
+    self.assertEqual('custom', flag.custom)
+    self.assertEqual('default', flag.value)
+
+  def testCopy(self):
+    flag = self._MakeFlag('name', allow_override=True)
+    cache = {}
+    flag._cache_value(cache, 'name')
+    for flag_copy in (copy.copy(flag), copy.deepcopy(flag),
+                      pickle.loads(pickle.dumps(flag))):
+      self.assertEqual('name', flag_copy.name)
+      self.assertEqual('default', flag_copy.value)
+      self.assertTrue(flag_copy.allow_override)
+      self.assertEqual((), flag_copy._value_readers)
+      flag_copy.value = 'other'
+      self.assertEqual({'name': 'default'}, cache)
+
+
+class ValueCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag = gflags.Flag(gflags.ArgumentParser(),
+                            gflags.ArgumentSerializer(), 'name', 'default',
+                            'A flag.')
+
+  def testDroppedOnAssignment(self):
+    first, second = {}, {}
+    self.flag._cache_value(first, 'name')
+    self.flag._cache_value(first, 'name')
+    self.flag._cache_value(second, 'n')
+    self.assertEqual({'name': 'default'}, first)
+    self.assertEqual({'n': 'default'}, second)
+    self.assertEqual(2, len(self.flag._value_readers))
+    self.flag.value = 'other'
+    self.assertEqual({}, first)
+    self.assertEqual({}, second)
+    self.assertEqual((), self.flag._value_readers)
+
+  def testSubclassOverridingValueIsNotCached(self):
+
+    class ConstantFlag(_flag.Flag):
+
+      @property
+      def value(self):
+        return 'constant'
+
+      @value.setter
+      def value(self, value):
+        pass
+
+    flag = ConstantFlag(gflags.ArgumentParser(), gflags.ArgumentSerializer(),
+                        'name', 'default', 'A flag.')
+    cache = {}
+    flag._cache_value(cache, 'name')
+    self.assertEqual({}, cache)
+
+
+class HelpTextCacheTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag = gflags.Flag(gflags.ArgumentParser(),
+                            gflags.ArgumentSerializer(), 'name', 'default',
+                            'A flag.')
+
+  def testReusedUntilChanged(self):
+    help_text = self.flag._get_help_text('', 80)
+    self.assertIs(help_text, self.flag._get_help_text('', 80))
+    self.flag.help = 'Another flag.'
+    self.assertIn('Another flag.', self.flag._get_help_text('', 80))
+
+  def testSyntacticHelpAndBooleanAreNotStale(self):
+    self.flag._get_help_text('', 80)
+    self.flag.parser.syntactic_help = 'a name'
+    self.assertIn('(a name)', self.flag._get_help_text('', 80))
+    self.flag.boolean = True
+    self.assertIn('--[no]name:', self.flag._get_help_text('', 80))
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
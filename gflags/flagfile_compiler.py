@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Compiles flagfiles for fast loading, see FlagValues.compile_flagfile().
+
+The modules given to --modules are imported first, so that the values of the
+flags they define in gflags.FLAGS are stored already converted.  The other
+arguments of the flagfile are stored as text.  The compiled file is then
+passed to --flagfile like the source flagfile, by programs that call
+gflags.enable_compiled_flagfiles().
+
+Usage:
+  python -m gflags.flagfile_compiler [--modules=module,...] [--output=file]
+      flagfile
+"""
+
+import importlib
+import sys
+
+import gflags
+from gflags import exceptions
+
+_USAGE = 'Usage: %s [--modules=module,...] [--output=file] flagfile\n'
+
+
+def _DefineFlags():
+  """Returns the flags of the compiler, kept apart from gflags.FLAGS."""
+  flag_values = gflags.FlagValues()
+  gflags.DEFINE_list('modules', [],
+                     'Modules defining the flags set by the flagfile, '
+                     'imported before compiling it.',
+                     flag_values=flag_values)
+  gflags.DEFINE_string('output', None,
+                       'File to write, by default the name of the flagfile '
+                       'followed by "c".',
+                       flag_values=flag_values)
+  return flag_values
+
+
+def main(argv=None):
+  """Runs the compiler.
+
+  Args:
+    argv: list of str, the command line, sys.argv by default.
+
+  Returns:
+    int, the exit status.
+  """
+  if argv is None:
+    argv = sys.argv
+  flag_values = _DefineFlags()
+  try:
+    args = flag_values(argv)
+  except exceptions.Error as e:
+    sys.stderr.write('%s\n' % e)
+    args = []
+  if len(args) != 2:
+    sys.stderr.write(_USAGE % argv[0])
+    return 1
+  for module in flag_values.modules:
+    importlib.import_module(module)
+  try:
+    output_filename = gflags.FLAGS.compile_flagfile(args[1],
+                                                    flag_values.output)
+  except exceptions.Error as e:
+    sys.stderr.write('%s\n' % e)
+    return 1
+  sys.stdout.write('Wrote %s\n' % output_filename)
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Unittest for the flagfile compiler."""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import six
+
+import gflags
+from gflags import _flagfile
+from gflags import flagfile_compiler
+
+
+class FlagFileCompilerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmpdir)
+    self.flagfile = os.path.join(self.tmpdir, 'main.cfg')
+    with open(self.flagfile, 'w') as f:
+      f.write('--notmod_baz_x\n--unknown=1\n')
+    self.output = six.StringIO()
+    gflags.enable_compiled_flagfiles()
+    self.addCleanup(gflags.disable_compiled_flagfiles)
+    for name in ('stdout', 'stderr'):
+      self.addCleanup(setattr, sys, name, getattr(sys, name))
+      setattr(sys, name, self.output)
+
+  def testCompile(self):
+    compiled = os.path.join(self.tmpdir, 'main.bin')
+    self.assertEqual(0, flagfile_compiler.main(
+        ['compiler', '--modules=gflags.flags_modules_for_testing.module_baz',
+         '--output=' + compiled, self.flagfile]))
+    self.assertEqual('Wrote %s\n' % compiled, self.output.getvalue())
+    args = gflags.FLAGS.ReadFlagsFromFiles(['--flagfile=' + compiled])
+    self.assertEqual(['--notmod_baz_x', '--unknown=1'], args)
+    self.assertIsInstance(args[0], _flagfile.ConvertedArgument)
+    self.assertNotIsInstance(args[1], _flagfile.ConvertedArgument)
+
+  def testUsage(self):
+    self.assertEqual(1, flagfile_compiler.main(['compiler']))
+    self.assertEqual(1, flagfile_compiler.main(['compiler', '--bad', 'x']))
+    self.assertEqual(1, flagfile_compiler.main(
+        ['compiler', os.path.join(self.tmpdir, 'missing.cfg')]))
+    self.assertFalse(os.path.exists(os.path.join(self.tmpdir,
+                                                 'missing.cfgc')))
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()
@@ -33,18 +33,36 @@ Instead of importing this module directly, it's preferable to import the
 flags package and use the aliases defined at the package level.
 """
 
+import collections
+import gc
 import hashlib
 import logging
+import marshal
 import os
 import struct
 import sys
+import threading
 import traceback
 import warnings
 from xml.dom import minidom
 
 import six
 
+try:
+  from concurrent import futures  # pylint: disable=g-import-not-at-top
+except ImportError:
+  # Python 2 without the futures backport.
+  futures = None
+
+try:
+  from collections import abc as collections_abc  # pylint: disable=g-import-not-at-top
+except ImportError:
+  # Python 2.
+  collections_abc = collections
+
+from gflags import _flagfile
 from gflags import _helpers
+from gflags import _profiling
 from gflags import exceptions
 from gflags import flag as _flag
 
@@ -68,7 +86,389 @@ _UNPARSED_ACCESS_DISABLED_PERCENT = 0
 # style. Do NOT rely on it. It will be removed as part of b/32278439.
 _USE_GNU_GET_OPT_ENV_NAME = 'GFLAGS_USE_GNU_GET_OPT'
 
+# Names of the FlagValues methods added after flags of any name could be
+# read as attributes.  A flag with one of these names is hidden by the
+# method, and can only be read with FLAGS[name].value, so defining it warns.
+_RESERVED_FLAG_NAMES = frozenset([
+    'compile_flagfile', 'current_snapshot', 'flagfile_cache_stats', 'freeze',
+    'get_profiler', 'is_frozen', 'iter_help', 'on_any_change', 'on_change',
+    'override', 'remove_change_callback', 'set_flagfile_prefetch',
+    'set_incremental_validation', 'set_parallel_validation', 'set_profiler',
+    'snapshot', 'update', 'validator_timings'])
+
+# Actions stored in the parse plan built by FlagValues._GetParsePlan().
+# The flag takes a value: --name=value or --name value.
+_PARSE_ACTION_VALUE = 0
+# A boolean flag: --name, or --name=value.
+_PARSE_ACTION_BOOLEAN = 1
+# The negated form of a boolean flag: --noname.
+_PARSE_ACTION_NEGATE = 2
+# The special --undefok flag.
+_PARSE_ACTION_UNDEFOK = 3
+
+
+class _FlagList(list):
+  """A list of Flag objects with constant time membership tests.
+
+  Used for the lists of flags defined by, or key for, each module.  A plain
+  list, in the order of the help output, that also counts the occurrences of
+  each flag, so that "flag in flags" and count() do not scan it.  Every method
+  changing the list keeps the counts up to date.
+  """
+
+  def __init__(self, flags=()):
+    super(_FlagList, self).__init__()
+    # Dictionary: Flag object -> number of occurrences.
+    self._counts = {}
+    self.extend(flags)
+
+  def _Add(self, flags):
+    counts = self._counts
+    for flag in flags:
+      counts[flag] = counts.get(flag, 0) + 1
+
+  def _Subtract(self, flags):
+    counts = self._counts
+    for flag in flags:
+      count = counts[flag] - 1
+      if count:
+        counts[flag] = count
+      else:
+        del counts[flag]
+
+  def __contains__(self, flag):
+    return flag in self._counts
+
+  def count(self, flag):
+    return self._counts.get(flag, 0)
+
+  def append(self, flag):
+    super(_FlagList, self).append(flag)
+    self._Add((flag,))
+
+  def extend(self, flags):
+    flags = list(flags)
+    super(_FlagList, self).extend(flags)
+    self._Add(flags)
+
+  def __iadd__(self, flags):
+    self.extend(flags)
+    return self
+
+  def __imul__(self, n):
+    super(_FlagList, self).__imul__(n)
+    self._counts = {}
+    self._Add(self)
+    return self
+
+  def insert(self, index, flag):
+    super(_FlagList, self).insert(index, flag)
+    self._Add((flag,))
+
+  def remove(self, flag):
+    if flag not in self._counts:
+      raise ValueError('%r is not in list' % (flag,))
+    super(_FlagList, self).remove(flag)
+    self._Subtract((flag,))
+
+  def pop(self, *index):
+    flag = super(_FlagList, self).pop(*index)
+    self._Subtract((flag,))
+    return flag
+
+  def __setitem__(self, index, flags):
+    if isinstance(index, slice):
+      flags = list(flags)
+      removed = self[index]
+    else:
+      removed = [self[index]]
+    super(_FlagList, self).__setitem__(index, flags)
+    self._Subtract(removed)
+    self._Add(flags if isinstance(index, slice) else (flags,))
+
+  def __delitem__(self, index):
+    removed = self[index] if isinstance(index, slice) else [self[index]]
+    super(_FlagList, self).__delitem__(index)
+    self._Subtract(removed)
+
+  # Python 2 lists implement simple slices with these.
+  def __setslice__(self, i, j, flags):
+    self.__setitem__(slice(max(i, 0), max(j, 0)), flags)
+
+  def __delslice__(self, i, j):
+    self.__delitem__(slice(max(i, 0), max(j, 0)))
+
+  def clear(self):
+    del self[:]
+
+  def discard(self, flag):
+    """Removes all the occurrences of a flag, if any."""
+    for _ in range(self._counts.pop(flag, 0)):
+      super(_FlagList, self).remove(flag)
+
+  def __reduce__(self):
+    return _FlagList, (list(self),)
+
+
+class FlagSnapshot(collections_abc.Mapping):
+  """An immutable view of the flag values of a FlagValues at one point.
+
+  Maps the names and short names of the visible flags to their values.  The
+  values can also be read as attributes, like on the FlagValues:
+       snapshot = FLAGS.current_snapshot()
+       snapshot.longname       # flag value at the time of the snapshot
+       snapshot['longname']    # same
+
+  Snapshots are built by FlagValues.snapshot() and
+  FlagValues.current_snapshot().  List values are copied, so that parsing a
+  multi flag again does not show through the snapshot.
+  """
+
+  __slots__ = ('_values', '_version')
+
+  def __init__(self, values, version):
+    object.__setattr__(self, '_values', values)
+    object.__setattr__(self, '_version', version)
+
+  @property
+  def version(self):
+    """Int, the number of changes made to the FlagValues before this view."""
+    return self._version
+
+  def __getitem__(self, name):
+    return self._values[name]
+
+  def __iter__(self):
+    return iter(self._values)
+
+  def __len__(self):
+    return len(self._values)
+
+  def __contains__(self, name):
+    return name in self._values
+
+  def __getattr__(self, name):
+    if name in FlagSnapshot.__slots__:
+      # Not set yet, e.g. while unpickling.
+      raise AttributeError(name)
+    try:
+      return self._values[name]
+    except KeyError:
+      raise AttributeError(name)
+
+  def __setattr__(self, name, value):
+    raise AttributeError('FlagSnapshot is immutable')
+
+  def __delattr__(self, name):
+    raise AttributeError('FlagSnapshot is immutable')
+
+  def __reduce__(self):
+    return FlagSnapshot, (self._values, self._version)
+
+  def __repr__(self):
+    return 'FlagSnapshot(version=%d, %r)' % (self._version, self._values)
+
+
+class _SnapshotWriter(object):
+  """Context manager held by the methods changing a FlagValues.
+
+  Serializes them, and on exit counts the change and drops the published
+  snapshot, so that the next FlagValues.current_snapshot() builds a new one.
+  Reentrant: the methods changing a FlagValues call each other.  Once the
+  outermost one completes without error, and the lock is released, the
+  change callbacks are notified.
+  """
+
+  __slots__ = ('_fields', '_notify', '_depth', 'lock')
+
+  def __init__(self, fields, notify):
+    # The __dict__ of the FlagValues.
+    self._fields = fields
+    # Function notifying the change callbacks.
+    self._notify = notify
+    # Int: number of nested changes in progress, in the thread holding lock.
+    self._depth = 0
+    self.lock = threading.RLock()
+
+  def __enter__(self):
+    if self._fields['__frozen']:
+      raise exceptions.Error('Cannot change flags after FlagValues.freeze().')
+    self.lock.acquire()
+    self._depth += 1
+    if self._depth == 1:
+      recorder = self._fields['__change_recorder']
+      if recorder.polled:
+        recorder.start()
+
+  def __exit__(self, exc_type, unused_value, unused_traceback):
+    fields = self._fields
+    self._depth -= 1
+    outermost = not self._depth
+    try:
+      fields['__version'] += 1
+      # Only dropped: building the snapshot copies every flag, which would
+      # make each change cost as much as the whole registry.
+      fields['__snapshot'] = None
+      if outermost and fields['__change_recorder'].polled:
+        fields['__change_recorder'].poll()
+    finally:
+      self.lock.release()
+    if outermost and exc_type is None and fields['__change_recorder'].changes:
+      self._notify()
+
+
+class _ChangeRecorder(dict):
+  """The values of the flags watched for changes, keyed by flag name.
+
+  Registered with the Flag objects like the value caches of FlagValues, see
+  Flag._cache_value(): a flag whose value is assigned removes its entry,
+  which records the flag name and its previous value in changes.  This keeps
+  the Flag.value setter free of any change notification code.
+
+  Flags whose class overrides the value property cannot be registered; their
+  values are compared before and after each change made through FlagValues
+  instead.
+  """
+
+  def __init__(self):
+    super(_ChangeRecorder, self).__init__()
+    # List of (flag name, previous value), in the order of the changes.
+    self.changes = []
+    # Dictionary: flag name -> Flag, the watched flags that are polled.
+    self.polled = {}
+    # Dictionary: flag name -> value of the polled flags, taken by start().
+    self.polled_values = {}
+
+  def pop(self, name, *default):
+    if name in self:
+      value = dict.pop(self, name)
+      self.changes.append((name, _CopyValue(value)))
+      return value
+    return dict.pop(self, name, *default)
+
+  def watch(self, flag):
+    """Records the next change of flag, under its name."""
+    # Reading the value first parses a pending default, which is not a
+    # change.
+    value = flag.value
+    if type(flag).value is _flag.Flag.value:
+      flag._cache_value(self, flag.name)  # pylint: disable=protected-access
+    else:
+      self.polled[flag.name] = flag
+      self.polled_values[flag.name] = _CopyValue(value)
+
+  def unwatch(self, name):
+    dict.pop(self, name, None)
+    self.polled.pop(name, None)
+    self.polled_values.pop(name, None)
+
+  def start(self):
+    """Takes the values of the polled flags, before a change."""
+    self.polled_values = dict(
+        (name, _CopyValue(flag.value))
+        for name, flag in six.iteritems(self.polled))
+
+  def poll(self):
+    """Records the changes of the polled flags since start()."""
+    for name, old_value in six.iteritems(self.polled_values):
+      if self.polled[name].value != old_value:
+        self.changes.append((name, old_value))
+    self.polled_values = {}
+
+  def drain(self):
+    """Returns and forgets the recorded changes."""
+    changes, self.changes = self.changes, []
+    return changes
+
+
+class _AssignmentRecorder(dict):
+  """The flags whose value was not assigned since they were watched.
+
+  Registered with the Flag objects like the value caches of FlagValues, see
+  Flag._cache_value(): a flag whose value is assigned removes its entry,
+  which adds the flag to dirty_flags.  This way incremental validation also
+  sees the values assigned directly to Flag objects.  Only the keys matter:
+  the values are not kept.
+
+  Flags whose class overrides the value property cannot be registered; they
+  are kept in untracked and always validated.
+  """
+
+  def __init__(self, dirty_flags):
+    super(_AssignmentRecorder, self).__init__()
+    # Set of Flag objects: the FlagValues' flags to validate next.
+    self.dirty_flags = dirty_flags
+    # Set of Flag objects whose assignments cannot be recorded.
+    self.untracked = set()
+
+  def __setitem__(self, flag, unused_value):
+    dict.__setitem__(self, flag, None)
+
+  def pop(self, flag, *default):
+    if flag in self:
+      self.dirty_flags.add(flag)
+    return dict.pop(self, flag, *default)
+
+  def watch(self, flag):
+    """Adds flag to dirty_flags the next time its value is assigned."""
+    if type(flag).value is _flag.Flag.value:
+      flag._cache_value(self, flag)  # pylint: disable=protected-access
+    else:
+      self.untracked.add(flag)
+
+  def forget(self, flag):
+    dict.pop(self, flag, None)
+    self.untracked.discard(flag)
+
+
+def _CopyValue(value):
+  """Returns a copy of value if it is a list, which parsing may extend."""
+  if isinstance(value, list):
+    return list(value)
+  return value
+
+
+class _FlagOverride(object):
+  """Context manager returned by FlagValues.override()."""
+
+  def __init__(self, flag_values, overlay):
+    self._flag_values = flag_values
+    # Dictionary: Flag object -> value it is overridden with.
+    self._overlay = overlay
+    self._token = None
+
+  def __enter__(self):
+    self._token = self._flag_values._EnterOverride(self._overlay)  # pylint: disable=protected-access
+    return self._flag_values
 
+  def __exit__(self, unused_type, unused_value, unused_traceback):
+    self._flag_values._ExitOverride(self._overlay, self._token)  # pylint: disable=protected-access
+
+
+class _OverlaidFlagValues(object):
+  """The flags of a FlagValues as seen through overrides, for validators.
+
+  Validators read flag_values[name].value, which is the overriding value for
+  the overridden flags.
+  """
+
+  def __init__(self, flag_values, overlay):
+    self._flag_values = flag_values
+    self._overlay = overlay
+
+  def __getitem__(self, name):
+    flag = self._flag_values[name]
+    value = self._overlay.get(id(flag), _NOT_OVERRIDDEN)
+    if value is _NOT_OVERRIDDEN:
+      return flag
+    return _OverlaidFlag(value)
+
+
+# Stands for an overridden Flag object in _OverlaidFlagValues.
+_OverlaidFlag = collections.namedtuple('_OverlaidFlag', 'value')
+
+# Returned by the lookups of flags that are not overridden.
+_NOT_OVERRIDDEN = object()
 
 
 class FlagValues(object):
@@ -115,6 +515,9 @@ class FlagValues(object):
     # Holds flags that should not be directly accessible from Python.
     self.__dict__['__hiddenflags'] = set()
 
+    # The lists of flags below are _FlagList objects, lists which test
+    # membership in constant time.
+
     # Dictionary: module name (string) -> list of Flag objects that are defined
     # by that module.
     self.__dict__['__flags_by_module'] = {}
@@ -124,6 +527,12 @@ class FlagValues(object):
     # Dictionary: module name (string) -> list of Flag objects that are
     # key for that module.
     self.__dict__['__key_flags_by_module'] = {}
+    # Dictionaries: Flag object -> name (string) and id (int) of the first
+    # module that registered it.  Reverse indexes of __flags_by_module and
+    # __flags_by_module_id, used to find the module defining a flag in
+    # constant time.
+    self.__dict__['__module_name_by_flag'] = {}
+    self.__dict__['__module_id_by_flag'] = {}
 
     # Bool: True if flags were parsed.
     self.__dict__['__flags_parsed'] = False
@@ -131,9 +540,111 @@ class FlagValues(object):
     # Bool: True if Reset() was called.
     self.__dict__['__reset_called'] = False
 
+    # Dictionary: flag name (string) -> bool, whether the flag may be read
+    # before flags are parsed.  Computed by _IsUnparsedFlagAccessAllowed()
+    # and dropped by Reset() or when the environment variable controlling
+    # it changes.
+    self.__dict__['__unparsed_access_allowed'] = {}
+    # None or string: the value of that environment variable when the
+    # decisions above were computed.
+    self.__dict__['__unparsed_access_env'] = None
+    # Set: names of the flags whose unparsed access was already reported.
+    self.__dict__['__unparsed_access_reported'] = set()
+
+    # Bool: True if the next validation after parsing checks every validator,
+    # False if it only checks the validators affected since the last one.
+    # Full validation is used for the first parse, after Reset() and after a
+    # failed validation, or always if incremental validation is disabled.
+    self.__dict__['__validate_all'] = True
+    self.__dict__['__incremental_validation'] = True
+
+    # Set: Flag objects parsed, assigned or registered since the last
+    # validation.
+    self.__dict__['__dirty_flags'] = set()
+    # _AssignmentRecorder adding the flags assigned directly to Flag objects
+    # to the dirty flags.
+    self.__dict__['__assignment_recorder'] = _AssignmentRecorder(
+        self.__dict__['__dirty_flags'])
+
+    # List: validators registered since the last validation, in the order
+    # they were created.
+    self.__dict__['__pending_validators'] = []
+
+    # None or tuple (number of validators, tuple of validators): every
+    # validator of the registered flags, in the order they were created.
+    # Built lazily by _GetValidationPlan() and dropped whenever the
+    # registered flags or validators change.
+    self.__dict__['__validation_plan'] = None
+
+    # None or tuple (executor, max_workers): the concurrent.futures executor
+    # used to check validators in parallel, or None to create a thread pool
+    # of max_workers threads for each check.  None if parallel validation is
+    # disabled.
+    self.__dict__['__parallel_validation'] = None
+
+    # Dictionary: validators.Validator -> float, the number of seconds its
+    # latest check took.  Only recorded by parallel validation.
+    self.__dict__['__validator_timings'] = {}
+
+    # List: registered Flag objects whose default value may not be parsed
+    # yet, see flag.set_lazy_default_parsing().  Emptied by MarkAsParsed().
+    self.__dict__['__lazy_default_flags'] = []
+
+    # None or _profiling.Profiler recording the validators, parsers and
+    # flagfiles run by this FlagValues.
+    self.__dict__['__profiler'] = None
+
     # None or Method(name, value) to call from __setattr__ for an unknown flag.
     self.__dict__['__set_unknown'] = None
 
+    # Int: maximum number of flagfiles read concurrently by the prefetch stage
+    # of --flagfile expansion, 0 if disabled.
+    self.__dict__['__flagfile_prefetch_workers'] = 0
+
+    # Int: number of flagfiles served from and missed in the flagfile cache.
+    self.__dict__['__flagfile_cache_hits'] = 0
+    self.__dict__['__flagfile_cache_misses'] = 0
+
+    # None or dictionary: argument spelling (string) -> (Flag object, action).
+    # Built lazily by _GetParsePlan() and dropped whenever the set of
+    # registered flags changes.
+    self.__dict__['__parse_plan'] = None
+
+    # None or _helpers.FlagSuggestionIndex over the registered flag names.
+    # Built lazily by _GetSuggestionIndex() and dropped together with the
+    # parse plan.
+    self.__dict__['__suggestion_index'] = None
+
+    # _helpers.ContextLocal: None or dictionary, id of Flag object -> value,
+    # the overrides active in the current context, see override().  Flags
+    # are keyed by id, which hashes faster than Flag objects; the active
+    # _FlagOverride objects keep them alive.
+    self.__dict__['__overrides'] = _helpers.ContextLocal('gflags_overrides')
+    # Dictionary: id of Flag object -> number of contexts overriding it.
+    # Empty unless an override is active somewhere, which keeps attribute
+    # reads from looking for overrides.
+    self.__dict__['__override_counts'] = {}
+    self.__dict__['__override_lock'] = threading.Lock()
+
+    # Int: number of changes made through the methods of this FlagValues.
+    self.__dict__['__version'] = 0
+    # None or FlagSnapshot: the snapshot returned by current_snapshot(),
+    # dropped by every change.
+    self.__dict__['__snapshot'] = None
+    # _SnapshotWriter held by every method changing flags, see _writing().
+    self.__dict__['__writer'] = _SnapshotWriter(self.__dict__,
+                                                self.__NotifyChanges)
+
+    # Bool: True once freeze() was called.
+    self.__dict__['__frozen'] = False
+
+    # Dictionary: flag name -> list of the callbacks registered with
+    # on_change(); list of the callbacks registered with on_any_change().
+    self.__dict__['__change_callbacks'] = {}
+    self.__dict__['__any_change_callbacks'] = []
+    # _ChangeRecorder of the flags that have change callbacks.
+    self.__dict__['__change_recorder'] = _ChangeRecorder()
+
     if _USE_GNU_GET_OPT_ENV_NAME in os.environ:
       self.__dict__['__use_gnu_getopt'] = (
           os.environ[_USE_GNU_GET_OPT_ENV_NAME] == '1')
@@ -154,6 +665,84 @@ class FlagValues(object):
   def IsGnuGetOpt(self):
     return self.__dict__['__use_gnu_getopt']
 
+  def set_flagfile_prefetch(self, max_workers=8):
+    """Reads the flagfiles of an include tree concurrently.
+
+    When enabled, the expansion of --flagfile directives first discovers the
+    tree of included flagfiles and reads them on a thread pool, then splices
+    the lines in the same order as the sequential expansion.  This helps when
+    opening a file is slow, e.g. on network file systems.  It has no effect
+    if the concurrent.futures module is not available.
+
+    Args:
+      max_workers: int, the maximum number of flagfiles read at the same
+        time.  0 or None disables the prefetch stage.
+    """
+    self.__dict__['__flagfile_prefetch_workers'] = max_workers or 0
+
+  def set_incremental_validation(self, incremental=True):
+    """Only checks the validators affected by a parse after the first one.
+
+    The first parse checks every registered validator.  Later parses, e.g. of
+    override snippets, only check the validators of the flags they set and
+    the validators registered since the previous parse.  Values assigned to
+    Flag objects directly, bypassing this FlagValues, are not tracked; disable
+    incremental validation if validators must see such changes.
+
+    Args:
+      incremental: bool, False checks every validator after every parse.
+    """
+    self.__dict__['__incremental_validation'] = incremental
+    self.__dict__['__validate_all'] = True
+
+  def set_parallel_validation(self, parallel=True, executor=None,
+                              max_workers=None):
+    """Checks validators concurrently on a thread pool.
+
+    Useful when validators do real work, e.g. stat paths or load schemas.
+    Validators must then only read flag values.  The first failure in the
+    order the validators were created is reported, as in serial validation.
+    The time each validator takes is recorded, see validator_timings().
+    Validation stays serial if the concurrent.futures module is not
+    available.
+
+    Args:
+      parallel: bool, False checks validators serially again.
+      executor: None or concurrent.futures.Executor to run the validators on.
+        By default a thread pool is created for each check.
+      max_workers: None or int, the number of threads of the created thread
+        pools.  None uses the concurrent.futures default.
+    """
+    if parallel:
+      self.__dict__['__parallel_validation'] = (executor, max_workers)
+    else:
+      self.__dict__['__parallel_validation'] = None
+
+  def validator_timings(self):
+    """Returns the time taken by each validator checked in parallel.
+
+    Returns:
+      A dictionary: validators.Validator -> float, the number of seconds its
+      latest check took.
+    """
+    return dict(self.__dict__['__validator_timings'])
+
+  def set_profiler(self, profiler):
+    """Records the validators, parsers and flagfiles run while parsing.
+
+    Every validator check, from parsing or from assigning a flag value, every
+    ArgumentParser.parse call and every --flagfile expansion is timed and
+    recorded by the profiler.  Without a profiler, nothing is timed.
+
+    Args:
+      profiler: None to stop profiling, or a gflags.Profiler.
+    """
+    self.__dict__['__profiler'] = profiler
+
+  def get_profiler(self):
+    """Returns the gflags.Profiler installed by set_profiler(), or None."""
+    return self.__dict__['__profiler']
+
   def FlagDict(self):
     return self.__dict__['__flags']
 
@@ -195,7 +784,8 @@ class FlagValues(object):
       flag: A Flag object, a flag that is key to the module.
     """
     flags_by_module = self.FlagsByModuleDict()
-    flags_by_module.setdefault(module_name, []).append(flag)
+    _GetFlagList(flags_by_module, module_name).append(flag)
+    self.__dict__['__module_name_by_flag'].setdefault(flag, module_name)
 
   def _RegisterFlagByModuleId(self, module_id, flag):
     """Records the module that defines a specific flag.
@@ -205,7 +795,8 @@ class FlagValues(object):
       flag: A Flag object, a flag that is key to the module.
     """
     flags_by_module_id = self.FlagsByModuleIdDict()
-    flags_by_module_id.setdefault(module_id, []).append(flag)
+    _GetFlagList(flags_by_module_id, module_id).append(flag)
+    self.__dict__['__module_id_by_flag'].setdefault(flag, module_id)
 
   def _RegisterKeyFlagForModule(self, module_name, flag):
     """Specifies that a flag is a key flag for a module.
@@ -216,7 +807,7 @@ class FlagValues(object):
     """
     key_flags_by_module = self.KeyFlagsByModuleDict()
     # The list of key flags for the module named module_name.
-    key_flags = key_flags_by_module.setdefault(module_name, [])
+    key_flags = _GetFlagList(key_flags_by_module, module_name)
     # Add flag, but avoid duplicates.
     if flag not in key_flags:
       key_flags.append(flag)
@@ -253,14 +844,16 @@ class FlagValues(object):
     """
     if self._FlagIsRegistered(flag_obj):
       return
+    self.__dict__['__assignment_recorder'].forget(flag_obj)
+    self.__dict__['__module_name_by_flag'].pop(flag_obj, None)
+    self.__dict__['__module_id_by_flag'].pop(flag_obj, None)
     for flags_by_module_dict in (self.FlagsByModuleDict(),
                                  self.FlagsByModuleIdDict(),
                                  self.KeyFlagsByModuleDict()):
       for flags_in_module in six.itervalues(flags_by_module_dict):
-        # While (as opposed to if) takes care of multiple occurrences of a
-        # flag in the list for the same module.
-        while flag_obj in flags_in_module:
-          flags_in_module.remove(flag_obj)
+        # Takes care of multiple occurrences of a flag in the list for the
+        # same module.
+        flags_in_module.discard(flag_obj)
 
   def _GetFlagsDefinedByModule(self, module):
     """Returns the list of flags defined by a module.
@@ -298,8 +891,10 @@ class FlagValues(object):
     key_flags = self._GetFlagsDefinedByModule(module)
 
     # Take into account flags explicitly declared as key for a module.
+    seen_flags = set(key_flags)
     for flag in self.KeyFlagsByModuleDict().get(module, []):
-      if flag not in key_flags:
+      if flag not in seen_flags:
+        seen_flags.add(flag)
         key_flags.append(flag)
     return key_flags
 
@@ -319,15 +914,11 @@ class FlagValues(object):
     registered_flag = self.FlagDict().get(flagname)
     if registered_flag is None:
       return default
-    for module, flags in six.iteritems(self.FlagsByModuleDict()):
-      for flag in flags:
-        # It must compare the flag with the one in FlagDict. This is because a
-        # flag might be overridden only for its long name (or short name),
-        # and only its short name (or long name) is considered registered.
-        if (flag.name == registered_flag.name and
-            flag.short_name == registered_flag.short_name):
-          return module
-    return default
+    module = self.__dict__['__module_name_by_flag'].get(registered_flag)
+    if module is not None:
+      return module
+    return _FindModuleOfFlag(self.FlagsByModuleDict(), registered_flag,
+                             default)
 
   def FindModuleIdDefiningFlag(self, flagname, default=None):
     """Return the ID of the module defining this flag, or default.
@@ -345,15 +936,11 @@ class FlagValues(object):
     registered_flag = self.FlagDict().get(flagname)
     if registered_flag is None:
       return default
-    for module_id, flags in six.iteritems(self.FlagsByModuleIdDict()):
-      for flag in flags:
-        # It must compare the flag with the one in FlagDict. This is because a
-        # flag might be overridden only for its long name (or short name),
-        # and only its short name (or long name) is considered registered.
-        if (flag.name == registered_flag.name and
-            flag.short_name == registered_flag.short_name):
-          return module_id
-    return default
+    module_id = self.__dict__['__module_id_by_flag'].get(registered_flag)
+    if module_id is not None:
+      return module_id
+    return _FindModuleOfFlag(self.FlagsByModuleIdDict(), registered_flag,
+                             default)
 
   def _RegisterUnknownFlagSetter(self, setter):
     """Allow set default values for undefined flags.
@@ -420,45 +1007,64 @@ class FlagValues(object):
 
   def __setitem__(self, name, flag):
     """Registers a new flag variable."""
-    fl = self.FlagDict()
-    if not isinstance(flag, _flag.Flag):
-      raise exceptions.IllegalFlagValueError(flag)
-    if str is bytes and isinstance(name, unicode):
-      # When using Python 2 with unicode_literals, allow it but encode it
-      # into the bytes type we require.
-      name = name.encode('utf-8')
-    if not isinstance(name, type('')):
-      raise exceptions.Error('Flag name must be a string')
-    if not name:
-      raise exceptions.Error('Flag name cannot be empty')
-    if name in fl and not flag.allow_override and not fl[name].allow_override:
-      module, module_name = _helpers.GetCallingModuleObjectAndName()
-      if (self.FindModuleDefiningFlag(name) == module_name and
-          id(module) != self.FindModuleIdDefiningFlag(name)):
-        # If the flag has already been defined by a module with the same name,
-        # but a different ID, we can stop here because it indicates that the
-        # module is simply being imported a subsequent time.
-        return
-      raise exceptions.DuplicateFlagError.from_flag(name, self)
-    short_name = flag.short_name
-    # If a new flag overrides an old one, we need to cleanup the old flag's
-    # modules if it's not registered.
-    flags_to_cleanup = set()
-    if short_name is not None:
-      if (short_name in fl and not flag.allow_override and
-          not fl[short_name].allow_override):
-        raise exceptions.DuplicateFlagError.from_flag(short_name, self)
-      if short_name in fl and fl[short_name] != flag:
-        flags_to_cleanup.add(fl[short_name])
-      fl[short_name] = flag
-    if (name not in fl  # new flag
-        or fl[name].using_default_value
-        or not flag.using_default_value):
-      if name in fl and fl[name] != flag:
-        flags_to_cleanup.add(fl[name])
-      fl[name] = flag
-    for f in flags_to_cleanup:
-      self._CleanupUnregisteredFlagFromModuleDicts(f)
+    with self._writing():
+      fl = self.FlagDict()
+      if not isinstance(flag, _flag.Flag):
+        raise exceptions.IllegalFlagValueError(flag)
+      if str is bytes and isinstance(name, unicode):
+        # When using Python 2 with unicode_literals, allow it but encode it
+        # into the bytes type we require.
+        name = name.encode('utf-8')
+      if not isinstance(name, type('')):
+        raise exceptions.Error('Flag name must be a string')
+      if not name:
+        raise exceptions.Error('Flag name cannot be empty')
+      if name in _RESERVED_FLAG_NAMES:
+        warnings.warn(
+            'Flag name %s is deprecated: FLAGS.%s is a FlagValues method, '
+            'which hides the flag; read it with FLAGS[%r].value.' % (
+                name, name, name),
+            DeprecationWarning,
+            stacklevel=3)
+      if name in fl and not flag.allow_override and not fl[name].allow_override:
+        module, module_name = _helpers.GetCallingModuleObjectAndName()
+        if (self.FindModuleDefiningFlag(name) == module_name and
+            id(module) != self.FindModuleIdDefiningFlag(name)):
+          # If the flag has already been defined by a module with the same name,
+          # but a different ID, we can stop here because it indicates that the
+          # module is simply being imported a subsequent time.
+          return
+        raise exceptions.DuplicateFlagError.from_flag(name, self)
+      short_name = flag.short_name
+      # If a new flag overrides an old one, we need to cleanup the old flag's
+      # modules if it's not registered.
+      flags_to_cleanup = set()
+      if short_name is not None:
+        if (short_name in fl and not flag.allow_override and
+            not fl[short_name].allow_override):
+          raise exceptions.DuplicateFlagError.from_flag(short_name, self)
+        if short_name in fl and fl[short_name] != flag:
+          flags_to_cleanup.add(fl[short_name])
+          self.__DropCachedValue(short_name)
+        fl[short_name] = flag
+      if (name not in fl  # new flag
+          or fl[name].using_default_value
+          or not flag.using_default_value):
+        if name in fl and fl[name] != flag:
+          flags_to_cleanup.add(fl[name])
+          self.__DropCachedValue(name)
+        fl[name] = flag
+      self.__dict__['__dirty_flags'].add(flag)
+      if flag._default_pending:  # pylint: disable=protected-access
+        self.__dict__['__lazy_default_flags'].append(flag)
+      if (self.__dict__['__any_change_callbacks'] or
+          flag.name in self.__dict__['__change_callbacks']):
+        self.__dict__['__change_recorder'].watch(self.__WatchedFlag(flag))
+      self.__dict__['__validation_plan'] = None
+      self.__dict__['__parse_plan'] = None
+      self.__dict__['__suggestion_index'] = None
+      for f in flags_to_cleanup:
+        self._CleanupUnregisteredFlagFromModuleDicts(f)
 
   def __dir__(self):
     """Returns list of names of all defined flags.
@@ -485,14 +1091,42 @@ class FlagValues(object):
 
   def HideFlag(self, name):
     """Mark the flag --name as hidden."""
-    self.__dict__['__hiddenflags'].add(name)
+    with self._writing():
+      self.__dict__['__hiddenflags'].add(name)
+      self.__DropCachedValue(name)
+
+  def _IsHidden(self, name):
+    """Whether --name was marked as hidden by HideFlag()."""
+    return name in self.__dict__['__hiddenflags']
 
   def _IsUnparsedFlagAccessAllowed(self, name):
     """Determine whether to allow unparsed flag access or not."""
-    if _UNPARSED_FLAG_ACCESS_ENV_NAME in os.environ:
+    env_value = os.environ.get(_UNPARSED_FLAG_ACCESS_ENV_NAME)
+    decisions = self.__dict__['__unparsed_access_allowed']
+    if env_value != self.__dict__['__unparsed_access_env']:
+      self.__ClearUnparsedAccessState()
+      self.__dict__['__unparsed_access_env'] = env_value
+    allow_unparsed_flag_access = decisions.get(name)
+    if allow_unparsed_flag_access is None:
+      allow_unparsed_flag_access = self.__ComputeUnparsedFlagAccessPolicy(
+          name, env_value)
+      decisions[name] = allow_unparsed_flag_access
+    return allow_unparsed_flag_access
+
+  def __ComputeUnparsedFlagAccessPolicy(self, name, env_value):
+    """Determine whether to allow unparsed access to flag --name.
+
+    Args:
+      name: A string, the name of the flag.
+      env_value: None or a string, the value of the environment variable
+        controlling unparsed flag access.
+
+    Returns:
+      A bool, True if the flag may be read before flags are parsed.
+    """
+    if env_value is not None:
       # We've been told explicitly what to do.
-      allow_unparsed_flag_access = (
-          os.getenv(_UNPARSED_FLAG_ACCESS_ENV_NAME) == '1')
+      allow_unparsed_flag_access = (env_value == '1')
     elif self.__dict__['__reset_called']:
       # Raise exception if .Reset() was called. This mostly happens in tests.
       allow_unparsed_flag_access = False
@@ -510,73 +1144,357 @@ class FlagValues(object):
       allow_unparsed_flag_access = True
     return allow_unparsed_flag_access
 
+  def __ClearUnparsedAccessState(self):
+    """Drops the unparsed access decisions and the reported flags."""
+    self.__dict__['__unparsed_access_allowed'].clear()
+    self.__dict__['__unparsed_access_reported'].clear()
+
   def __getattr__(self, name):
     """Retrieves the 'value' attribute of the flag --name."""
-    fl = self.FlagDict()
-    if name not in fl:
-      raise AttributeError(name)
-    if name in self.__dict__['__hiddenflags']:
+    # This is the path of every flag read, so it looks the flag up once and
+    # leaves the unparsed case to __GetUnparsedFlagValue.
+    fields = self.__dict__
+    flag = fields['__flags'].get(name)
+    if flag is None or name in fields['__hiddenflags']:
       raise AttributeError(name)
+    override_counts = fields['__override_counts']
+    if override_counts:
+      overlay = fields['__overrides'].get()
+      if overlay is not None:
+        value = overlay.get(id(flag), _NOT_OVERRIDDEN)
+        if value is not _NOT_OVERRIDDEN:
+          return value
+    if fields['__flags_parsed']:
+      value = flag.value
+      if not name.startswith('__'):
+        # Later reads of the flag find its value in the instance dictionary,
+        # without calling __getattr__, until it changes.  Names starting
+        # with '__' are left to the fields of this class.
+        flag._cache_value(fields, name)  # pylint: disable=protected-access
+        if id(flag) in override_counts:
+          # Overridden meanwhile: its reads must keep reaching __getattr__.
+          self.__DropCachedValue(name)
+      return value
+    if flag.present:
+      return flag.value
+    return self.__GetUnparsedFlagValue(name, flag)
 
-    if self.__dict__['__flags_parsed'] or fl[name].present:
-      return fl[name].value
-    else:
-      error_message = (
-          'Trying to access flag %s before flags were parsed.' % name)
-      if self._IsUnparsedFlagAccessAllowed(name):
-        # Print warning to stderr. Messages in logs are often ignored/unnoticed.
+  def __DropCachedValue(self, name):
+    """Stops serving the value of flag --name from the instance dictionary."""
+    if not name.startswith('__'):
+      self.__dict__.pop(name, None)
+
+  def __GetUnparsedFlagValue(self, name, flag):
+    """Retrieves the value of a flag read before flags were parsed.
+
+    Args:
+      name: A string, the name the flag is read with.
+      flag: The Flag object registered under that name.
+
+    Returns:
+      The value of the flag, if unparsed flag access is allowed.
+
+    Raises:
+      UnparsedFlagAccessError: if unparsed flag access is not allowed.
+    """
+    error_message = (
+        'Trying to access flag %s before flags were parsed.' % name)
+    if self._IsUnparsedFlagAccessAllowed(name):
+      reported = self.__dict__['__unparsed_access_reported']
+      # Only the first read of each flag is reported, with its stack trace.
+      if name not in reported:
+        reported.add(name)
+        # Print warning to stderr. Messages in logs are often ignored or
+        # unnoticed.  The warning is attributed to the caller of __getattr__.
         warnings.warn(
             error_message + ' This will raise an exception in the future.',
             RuntimeWarning,
-            stacklevel=2)
-        # Force logging.exception() to behave realistically, but don't propagate
-        # exception up. Allow flag value to be returned (for now).
+            stacklevel=3)
+        # Force logging.exception() to behave realistically, but don't
+        # propagate exception up. Allow flag value to be returned (for now).
         try:
           raise exceptions.UnparsedFlagAccessError(error_message)
         except exceptions.UnparsedFlagAccessError:
-            logging.exception(error_message)
-        return fl[name].value
-      else:
-        raise exceptions.UnparsedFlagAccessError(error_message)
+          logging.exception(error_message)
+      return flag.value
+    else:
+      raise exceptions.UnparsedFlagAccessError(error_message)
 
   def __setattr__(self, name, value):
     """Sets the 'value' attribute of the flag --name."""
+    with self._writing():
+      fl = self.FlagDict()
+      if name in self.__dict__['__hiddenflags']:
+        raise AttributeError(name)
+      if name not in fl:
+        return self._SetUnknownFlag(name, value)
+      fl[name].value = value
+      self._AssertFlagValidators(fl[name])
+      fl[name].using_default_value = False
+      return value
+
+  def update(self, **values):
+    """Sets the values of several flags, then checks their validators once.
+
+    Equivalent to assigning every value as an attribute, except that the
+    validators are checked after all the values are assigned, each one only
+    once even if it checks several of the assigned flags.
+
+    Args:
+      **values: the new values, keyed by flag name.
+
+    Raises:
+      AttributeError: if a flag is hidden.
+      UnrecognizedFlagError: if a flag is not registered and there is no
+        setter for unknown flags.  No value is assigned in this case.
+      IllegalFlagValueError: if validation fails for at least one validator.
+    """
+    with self._writing():
+      fl = self.FlagDict()
+      for name in values:
+        if name in self.__dict__['__hiddenflags']:
+          raise AttributeError(name)
+        if name not in fl and self.__dict__['__set_unknown'] is None:
+          raise exceptions.UnrecognizedFlagError(name, values[name])
+      flags = []
+      for name, value in six.iteritems(values):
+        if name in fl:
+          fl[name].value = value
+          flags.append(fl[name])
+        else:
+          self._SetUnknownFlag(name, value)
+      try:
+        self._AssertValidators(
+            _MergeValidators([flag._validators for flag in flags]))  # pylint: disable=protected-access
+      except exceptions.IllegalFlagValueError:
+        self.__dict__['__validate_all'] = True
+        raise
+      for flag in flags:
+        flag.using_default_value = False
+
+  def override(self, **values):
+    """Overrides flags in the current context, for the duration of a block.
+
+      with FLAGS.override(verbose=True, retries=3):
+        ...  # FLAGS.verbose and FLAGS.retries return the overriding values.
+
+    The overrides are local to the current thread or asyncio task (the
+    current contextvars context), and do not change the Flag objects: the
+    other threads and tasks, and FLAGS['name'].value, see the flag values.
+    Attribute reads of flags resolve the innermost active override first.
+    Overrides nest, and an alias is overridden separately from its original
+    flag.
+
+    The overriding values are checked with the validators of the overridden
+    flags when the block is entered.
+
+    Args:
+      **values: the overriding values, keyed by flag name.
+
+    Returns:
+      A context manager applying the overrides; entering it returns this
+      FlagValues.
+
+    Raises:
+      AttributeError: if a flag is hidden.
+      UnrecognizedFlagError: if a flag is not registered.
+    """
+    if self.__dict__['__frozen']:
+      raise exceptions.Error('Cannot override flags after FlagValues.freeze().')
     fl = self.FlagDict()
-    if name in self.__dict__['__hiddenflags']:
-      raise AttributeError(name)
-    if name not in fl:
-      return self._SetUnknownFlag(name, value)
-    fl[name].value = value
-    self._AssertValidators(fl[name].validators)
-    fl[name].using_default_value = False
-    return value
+    overlay = {}
+    for name, value in six.iteritems(values):
+      if name in self.__dict__['__hiddenflags']:
+        raise AttributeError(name)
+      flag = fl.get(name)
+      if flag is None:
+        raise exceptions.UnrecognizedFlagError(name, value)
+      overlay[flag] = value
+    return _FlagOverride(self, overlay)
+
+  def _EnterOverride(self, overlay):
+    """Activates overrides in the current context, see override().
 
-  def _AssertAllValidators(self):
+    Args:
+      overlay: A dictionary, Flag object -> overriding value.
+
+    Returns:
+      A token to pass to _ExitOverride().
+
+    Raises:
+      IllegalFlagValueError: if validation fails for at least one validator.
+    """
+    current = self.__dict__['__overrides'].get()
+    merged = dict(current) if current else {}
+    for flag, value in six.iteritems(overlay):
+      merged[id(flag)] = value
+    self._AssertValidators(
+        _MergeValidators([flag._validators for flag in overlay]),  # pylint: disable=protected-access
+        _OverlaidFlagValues(self, merged))
+    with self.__dict__['__override_lock']:
+      counts = self.__dict__['__override_counts']
+      for flag in overlay:
+        counts[id(flag)] = counts.get(id(flag), 0) + 1
+    # The values cached in the instance dictionary would bypass __getattr__.
+    for flag in overlay:
+      flag._drop_cached_values()  # pylint: disable=protected-access
+    return self.__dict__['__overrides'].set(merged)
+
+  def _ExitOverride(self, overlay, token):
+    """Deactivates the overrides activated by _EnterOverride()."""
+    self.__dict__['__overrides'].reset(token)
+    with self.__dict__['__override_lock']:
+      counts = self.__dict__['__override_counts']
+      for flag in overlay:
+        counts[id(flag)] -= 1
+        if not counts[id(flag)]:
+          del counts[id(flag)]
+
+  def _AddValidator(self, validator):
+    """Registers a validator with the flags it checks.
+
+    The validators of each flag are kept in the order they were created, so
+    that they can be checked without sorting them first.
+
+    Args:
+      validator: validators.Validator
+    Raises:
+      KeyError: if the validator works with a non-existing flag.
+    """
+    fl = self.FlagDict()
+    for flag_name in validator.get_flags_names():
+      _InsertValidator(fl[flag_name].validators, validator)
+    _InsertValidator(self.__dict__['__pending_validators'], validator)
+    self.__dict__['__validation_plan'] = None
+
+  def _GetValidationPlan(self):
+    """Returns every validator of the registered flags in creation order."""
+    flags = six.itervalues(self.FlagDict())
+    # Flag.validators is a public list, so validators may also be added or
+    # removed without _AddValidator(); counting them catches that.
+    num_validators = sum(len(flag._validators) for flag in flags)  # pylint: disable=protected-access
+    cached = self.__dict__['__validation_plan']
+    if cached is not None and cached[0] == num_validators:
+      return cached[1]
     all_validators = set()
     for flag in six.itervalues(self.FlagDict()):
-      for validator in flag.validators:
-        all_validators.add(validator)
-    self._AssertValidators(all_validators)
+      all_validators.update(flag._validators)  # pylint: disable=protected-access
+    plan = tuple(sorted(
+        all_validators, key=lambda validator: validator.insertion_index))
+    self.__dict__['__validation_plan'] = (num_validators, plan)
+    return plan
+
+  def _AssertAllValidators(self):
+    self.__CheckValidators(self._GetValidationPlan())
+
+  def _AssertAffectedValidators(self):
+    """Asserts the validators affected since the last validation.
+
+    These are the validators of the flags parsed or registered since then,
+    and the validators registered since then.  Falls back to checking every
+    validator when a full validation is due.
 
-  def _AssertValidators(self, validators):
+    Raises:
+      AttributeError: if validators work with a non-existing flag.
+      IllegalFlagValueError: if validation fails for at least one validator
+    """
+    if (self.__dict__['__validate_all'] or
+        not self.__dict__['__incremental_validation']):
+      self._AssertAllValidators()
+      return
+    dirty_flags = self.__dict__['__dirty_flags']
+    dirty_flags.update(self.__dict__['__assignment_recorder'].untracked)
+    validator_lists = [flag._validators  # pylint: disable=protected-access
+                       for flag in dirty_flags]
+    validator_lists.append(self.__dict__['__pending_validators'])
+    self.__CheckValidators(_MergeValidators(validator_lists))
+
+  def _AssertFlagValidators(self, flag):
+    """Asserts the validators of a single flag whose value just changed."""
+    try:
+      self._AssertValidators(flag._validators)  # pylint: disable=protected-access
+    except exceptions.IllegalFlagValueError:
+      # The invalid value stays assigned; have the next parse catch it again.
+      self.__dict__['__validate_all'] = True
+      raise
+
+  def __CheckValidators(self, validators):
+    """Asserts validators and updates the incremental validation state."""
+    # Stays set if a validator fails, so the next parse checks everything.
+    self.__dict__['__validate_all'] = True
+    self._AssertValidators(validators)
+    self.__dict__['__validate_all'] = False
+    dirty_flags = self.__dict__['__dirty_flags']
+    flags = list(dirty_flags)
+    dirty_flags.clear()
+    # Cleared first: a flag whose default is still pending is dirty again
+    # right away.
+    recorder = self.__dict__['__assignment_recorder']
+    for flag in flags:
+      recorder.watch(flag)
+    del self.__dict__['__pending_validators'][:]
+
+  def _AssertValidators(self, validators, flag_values=None):
     """Assert if all validators in the list are satisfied.
 
-    Asserts validators in the order they were created.
     Args:
       validators: Iterable(validators.Validator), validators to be
-        verified
+        verified, in the order they were created.
+      flag_values: None, or the flag values to verify instead of this
+        FlagValues, e.g. an _OverlaidFlagValues.
     Raises:
       AttributeError: if validators work with a non-existing flag.
       IllegalFlagValueError: if validation fails for at least one validator
     """
-    for validator in sorted(
-        validators, key=lambda validator: validator.insertion_index):
+    if flag_values is None:
+      flag_values = self
+    if self.__dict__['__parallel_validation'] is not None and futures:
+      validators = list(validators)
+      if len(validators) > 1:
+        self.__AssertValidatorsInParallel(validators, flag_values)
+        return
+    profiler = self.__dict__['__profiler']
+    for validator in validators:
       try:
-        validator.verify(self)
+        if profiler is None:
+          validator.verify(flag_values)
+        else:
+          start = _profiling._clock()
+          try:
+            validator.verify(flag_values)
+          finally:
+            profiler.record(_profiling.VALIDATOR,
+                            _profiling.validator_name(validator),
+                            _profiling._clock() - start)
       except exceptions.ValidationError as e:
-        message = validator.print_flags_with_values(self)
+        message = validator.print_flags_with_values(flag_values)
         raise exceptions.IllegalFlagValueError('%s: %s' % (message, str(e)))
 
+  def __AssertValidatorsInParallel(self, validators, flag_values):
+    """Checks validators on a thread pool, see _AssertValidators()."""
+    executor, max_workers = self.__dict__['__parallel_validation']
+    if executor is not None:
+      self.__RunValidators(validators, flag_values, executor)
+      return
+    with futures.ThreadPoolExecutor(max_workers) as executor:
+      self.__RunValidators(validators, flag_values, executor)
+
+  def __RunValidators(self, validators, flag_values, executor):
+    """Submits validators and reports the first failure in creation order."""
+    verify_futures = [executor.submit(_TimedVerify, validator, flag_values)
+                      for validator in validators]
+    timings = self.__dict__['__validator_timings']
+    profiler = self.__dict__['__profiler']
+    for validator, future in zip(validators, verify_futures):
+      elapsed, error = future.result()
+      timings[validator] = elapsed
+      if profiler is not None:
+        profiler.record(_profiling.VALIDATOR,
+                        _profiling.validator_name(validator), elapsed)
+      if error is not None:
+        message = validator.print_flags_with_values(flag_values)
+        raise exceptions.IllegalFlagValueError('%s: %s' % (message, str(error)))
+
   def __delattr__(self, flag_name):
     """Deletes a previously-defined flag from a flag object.
 
@@ -598,14 +1516,19 @@ class FlagValues(object):
     Raises:
       AttributeError: When there is no registered flag named flag_name.
     """
-    fl = self.FlagDict()
-    if flag_name not in fl:
-      raise AttributeError(flag_name)
+    with self._writing():
+      fl = self.FlagDict()
+      if flag_name not in fl:
+        raise AttributeError(flag_name)
 
-    flag_obj = fl[flag_name]
-    del fl[flag_name]
+      flag_obj = fl[flag_name]
+      self.__DropCachedValue(flag_name)
+      del fl[flag_name]
+      self.__dict__['__validation_plan'] = None
+      self.__dict__['__parse_plan'] = None
+      self.__dict__['__suggestion_index'] = None
 
-    self._CleanupUnregisteredFlagFromModuleDicts(flag_obj)
+      self._CleanupUnregisteredFlagFromModuleDicts(flag_obj)
 
   def _RemoveAllFlagAppearances(self, name):
     """Removes flag with name for all appearances.
@@ -644,18 +1567,19 @@ class FlagValues(object):
       UnrecognizedFlagError: When there is no registered flag named name.
       IllegalFlagValueError: When value is not valid.
     """
-    fl = self.FlagDict()
-    if name not in fl:
-      self._SetUnknownFlag(name, value)
-      return
-    if self.IsParsed():
-      logging.warn(
-          'FLAGS.SetDefault called on flag "%s" after flag parsing. Call this '
-          'method at the top level of a module to avoid overwriting the value '
-          'passed at the command line.',
-          name)
-    fl[name]._set_default(value)  # pylint: disable=protected-access
-    self._AssertValidators(fl[name].validators)
+    with self._writing():
+      fl = self.FlagDict()
+      if name not in fl:
+        self._SetUnknownFlag(name, value)
+        return
+      if self.IsParsed():
+        logging.warn(
+            'FLAGS.SetDefault called on flag "%s" after flag parsing. Call '
+            'this method at the top level of a module to avoid overwriting '
+            'the value passed at the command line.',
+            name)
+      fl[name]._set_default(value)  # pylint: disable=protected-access
+      self._AssertFlagValidators(fl[name])
 
   def __contains__(self, name):
     """Returns True if name is a value (flag) in the dict."""
@@ -682,34 +1606,35 @@ class FlagValues(object):
        Error: on any parsing error.
        ValueError: on flag value parsing error.
     """
-    if not argv:
-      # Unfortunately, the old parser used to accept an empty argv, and some
-      # users rely on that behaviour. Allow it as a special case for now.
-      self.MarkAsParsed()
-      self._AssertAllValidators()
-      return []
-
-    # This pre parses the argv list for --flagfile=<> options.
-    program_name = argv[0]
-    args = self.ReadFlagsFromFiles(argv[1:], force_gnu=False)
-
-    # Parse the arguments.
-    unknown_flags, unparsed_args, undefok = self._ParseArgs(args, known_only)
-
-    # Handle unknown flags by raising UnrecognizedFlagError.
-    # Note some users depend on us raising this particular error.
-    for name, value in unknown_flags:
-      if name in undefok:
-        continue
+    with self._writing():
+      if not argv:
+        # Unfortunately, the old parser used to accept an empty argv, and some
+        # users rely on that behaviour. Allow it as a special case for now.
+        self.MarkAsParsed()
+        self._AssertAffectedValidators()
+        return []
+
+      # This expands the --flagfile=<> options.  All of them are read before
+      # any flag is changed, so that an unreadable flagfile changes nothing.
+      program_name = argv[0]
+      args = list(self._IterFlagsFromFiles(argv[1:], force_gnu=False))
+
+      # Parse the arguments.
+      unknown_flags, unparsed_args, undefok = self._ParseArgs(args, known_only)
+
+      # Handle unknown flags by raising UnrecognizedFlagError.
+      # Note some users depend on us raising this particular error.
+      for name, value in unknown_flags:
+        if name in undefok:
+          continue
 
-      suggestions = _helpers.GetFlagSuggestions(
-          name, self.RegisteredFlags())
-      raise exceptions.UnrecognizedFlagError(
-          name, value, suggestions=suggestions)
+        suggestions = self._GetSuggestionIndex().GetSuggestions(name)
+        raise exceptions.UnrecognizedFlagError(
+            name, value, suggestions=suggestions)
 
-    self.MarkAsParsed()
-    self._AssertAllValidators()
-    return [program_name] + unparsed_args
+      self.MarkAsParsed()
+      self._AssertAffectedValidators()
+      return [program_name] + unparsed_args
 
   def _ParseArgs(self, args, known_only):
     """Helper function to do the main argument parsing.
@@ -734,77 +1659,153 @@ class FlagValues(object):
     """
     unknown_flags, unparsed_args, undefok = [], [], set()
 
-    flag_dict = self.FlagDict()
+    plan = self._GetParsePlan()
+    dirty_flags = self.__dict__['__dirty_flags']
+    profiler = self.__dict__['__profiler']
+    use_gnu_getopt = self.IsGnuGetOpt()
+    converted_argument = _flagfile.ConvertedArgument
+    matching_converters = {}
     args = iter(args)
     for arg in args:
+      # Arguments of compiled flagfiles carry their converted value, which is
+      # used as long as the flag is converted the same way as when compiled.
+      if arg.__class__ is converted_argument:
+        spelling, action, converter, value = arg.conversion
+        entry = plan.get(spelling)
+        if (entry is not None and entry[1] == action and
+            _ConvertsAs(entry[0], converter, matching_converters)):
+          flag = entry[0]
+          if isinstance(value, list):
+            # The argument may be parsed again, e.g. from the flagfile cache.
+            value = list(value)
+          flag._parse_converted(value)  # pylint: disable=protected-access
+          flag.using_default_value = False
+          dirty_flags.add(flag)
+          continue
+
+      # Most arguments are spelled exactly as one of the plan entries, e.g.
+      # --name or --noname, so they are dispatched without any string work.
+      entry = plan.get(arg)
       value = None
+      if entry is None:
+        if not arg.startswith('-'):
+          # A non-argument: default is break, GNU is skip.
+          unparsed_args.append(arg)
+          if use_gnu_getopt:
+            continue
+          else:
+            break
 
-      def GetValue():
-        # pylint: disable=cell-var-from-loop
-        try:
-          return next(args) if value is None else value
-        except StopIteration:
-          raise exceptions.Error('Missing value for flag ' + arg)
-
-      if not arg.startswith('-'):
-        # A non-argument: default is break, GNU is skip.
-        unparsed_args.append(arg)
-        if self.IsGnuGetOpt():
-          continue
-        else:
+        if arg == '--':
+          if known_only:
+            unparsed_args.append(arg)
           break
 
-      if arg == '--':
-        if known_only:
-          unparsed_args.append(arg)
-        break
+        name, equals, value = arg.lstrip('-').partition('=')
+        if not equals:
+          value = None
 
-      if '=' in arg:
-        name, value = arg.lstrip('-').split('=', 1)
-      else:
-        name, value = arg.lstrip('-'), None
+        if not name:
+          # The argument is all dashes (including one dash).
+          unparsed_args.append(arg)
+          if use_gnu_getopt:
+            continue
+          else:
+            break
 
-      if not name:
-        # The argument is all dashes (including one dash).
-        unparsed_args.append(arg)
-        if self.IsGnuGetOpt():
+        entry = plan.get('--' + name)
+        if entry is None:
+          if known_only:
+            unparsed_args.append(arg)
+          else:
+            unknown_flags.append((name, arg))
           continue
-        else:
-          break
 
-      # --undefok is a special case.
-      if name == 'undefok':
+      flag, action = entry
+      if action == _PARSE_ACTION_UNDEFOK:
+        # --undefok is a special case.
         if known_only:
           unparsed_args.append(arg)
-        value = GetValue()
+        if value is None:
+          value = next(args, None)
+          if value is None:
+            raise exceptions.Error('Missing value for flag ' + arg)
         undefok.update(v.strip() for v in value.split(','))
         undefok.update('no' + v.strip() for v in value.split(','))
         continue
 
-      flag = flag_dict.get(name)
-      if flag:
-        value = (flag.boolean and value is None) or GetValue()
-      elif name.startswith('no') and len(name) > 2:
+      if action == _PARSE_ACTION_NEGATE:
         # Boolean flags can take the form of --noflag, with no value.
-        noflag = flag_dict.get(name[2:])
-        if noflag and noflag.boolean:
-          if value is not None:
-            raise ValueError(arg + ' does not take an argument')
-          flag = noflag
-          value = False
-
+        if value is not None:
+          raise ValueError(arg + ' does not take an argument')
+        value = False
+      elif value is None:
+        if action == _PARSE_ACTION_BOOLEAN:
+          value = True
+        else:
+          value = next(args, None)
+          if value is None:
+            raise exceptions.Error('Missing value for flag ' + arg)
 
-      if flag:
+      if profiler is None:
         flag.parse(value)
-        flag.using_default_value = False
-      elif known_only:
-        unparsed_args.append(arg)
       else:
-        unknown_flags.append((name, arg))
+        start = _profiling._clock()
+        try:
+          flag.parse(value)
+        finally:
+          profiler.record(_profiling.PARSER,
+                          _profiling.parser_name(flag.parser),
+                          _profiling._clock() - start)
+      flag.using_default_value = False
+      dirty_flags.add(flag)
 
     unparsed_args.extend(args)
     return unknown_flags, unparsed_args, undefok
 
+  def _GetParsePlan(self):
+    """Returns the parse plan used by _ParseArgs.
+
+    The plan maps every spelling of a registered flag that may appear on the
+    command line (--name, -name and, for boolean flags, --noname and -noname;
+    short names included) to a (Flag object, action) tuple.  It is built once
+    and reused until a flag is registered or deleted.
+
+    Returns:
+      A dictionary: argument spelling (string) -> (Flag, action).
+    """
+    plan = self.__dict__['__parse_plan']
+    if plan is not None:
+      return plan
+
+    plan = {}
+    flag_dict = self.FlagDict()
+    for name, flag in six.iteritems(flag_dict):
+      if flag.boolean:
+        action = _PARSE_ACTION_BOOLEAN
+        # A flag registered as 'noname' takes precedence over the negated
+        # form of 'name'.
+        if 'no' + name not in flag_dict:
+          plan['--no' + name] = plan['-no' + name] = (
+              flag, _PARSE_ACTION_NEGATE)
+      else:
+        action = _PARSE_ACTION_VALUE
+      plan['--' + name] = plan['-' + name] = (flag, action)
+    # --undefok is handled by the parser itself, even if a flag with that name
+    # is registered.
+    plan['--undefok'] = plan['-undefok'] = (None, _PARSE_ACTION_UNDEFOK)
+
+    self.__dict__['__parse_plan'] = plan
+    return plan
+
+  def _GetSuggestionIndex(self):
+    """Returns the index used to suggest flags for unknown flag names."""
+    index = self.__dict__['__suggestion_index']
+    if index is None:
+      index = _helpers.FlagSuggestionIndex(self.RegisteredFlags())
+      self.__dict__['__suggestion_index'] = index
+    return index
+
   def IsParsed(self):
     """Whether flags were parsed."""
     return self.__dict__['__flags_parsed']
@@ -815,18 +1816,35 @@ class FlagValues(object):
     Use this when the caller knows that this FlagValues has been parsed as if
     a __call__() invocation has happened.  This is only a public method for
     use by things like appcommands which do additional command like parsing.
+
+    Raises:
+      IllegalFlagValueError: if the default value of a flag, whose parsing was
+        deferred by lazy default parsing, is invalid.
     """
-    self.__dict__['__flags_parsed'] = True
+    with self._writing():
+      lazy_flags = self.__dict__['__lazy_default_flags']
+      if lazy_flags:
+        # Sorted by name, so that the same invalid default is reported first.
+        for flag in sorted(lazy_flags, key=lambda flag: flag.name):
+          if flag._default_pending:  # pylint: disable=protected-access
+            flag._parse_pending_default()  # pylint: disable=protected-access
+        del lazy_flags[:]
+      self.__dict__['__flags_parsed'] = True
 
   def Reset(self):
     """Resets the values to the point before FLAGS(argv) was called."""
-    for f in self.FlagDict().values():
-      f.unparse()
-    # We log this message before marking flags as unparsed to avoid a
-    # problem when the logging library causes flags access.
-    logging.info('Reset() called; flags access will now raise errors.')
-    self.__dict__['__flags_parsed'] = False
-    self.__dict__['__reset_called'] = True
+    with self._writing():
+      for f in self.FlagDict().values():
+        f.unparse()
+      # We log this message before marking flags as unparsed to avoid a
+      # problem when the logging library causes flags access.
+      logging.info('Reset() called; flags access will now raise errors.')
+      for name in self.FlagDict():
+        self.__DropCachedValue(name)
+      self.__ClearUnparsedAccessState()
+      self.__dict__['__flags_parsed'] = False
+      self.__dict__['__reset_called'] = True
+      self.__dict__['__validate_all'] = True
 
   def RegisteredFlags(self):
     """Returns: a list of the names and short names of all registered flags."""
@@ -842,6 +1860,199 @@ class FlagValues(object):
 
     return flag_values
 
+  def _writing(self):
+    """Returns the context manager held while changing flags.
+
+    Serializes the changes made through this FlagValues, and drops the
+    snapshot of current_snapshot() once the outermost change is complete.
+    """
+    return self.__dict__['__writer']
+
+  def freeze(self, gc_freeze=True):
+    """Makes this FlagValues read-only, e.g. before forking worker processes.
+
+    The value of every visible flag is stored in the instance dictionary, so
+    that reading a flag as an attribute no longer touches the Flag objects,
+    and current_snapshot() keeps returning the same FlagSnapshot.  The pages
+    holding the flags are then left alone by the reads, and stay shared with
+    the processes forked afterwards.  Any later change made through this
+    FlagValues raises Error, as do override() and defining flags.  Freezing
+    twice has no effect.
+
+    Args:
+      gc_freeze: bool, whether to also collect garbage and call gc.freeze()
+        (Python 3.7+), which moves every object of the process out of reach
+        of the garbage collector, so that collections in the forked
+        processes do not write to the pages holding them.
+
+    Raises:
+      Error: if flags were not parsed.
+    """
+    fields = self.__dict__
+    if fields['__frozen']:
+      return
+    with self._writing():
+      if not fields['__flags_parsed']:
+        raise exceptions.Error('Flags must be parsed before freeze().')
+      hidden = fields['__hiddenflags']
+      cls = type(self)
+      for name, flag in six.iteritems(self.FlagDict()):
+        # Flags named after a method are read with FLAGS[name].value, as the
+        # method hides them; storing them would hide the method instead.
+        if (name not in hidden and not name.startswith('__') and
+            not hasattr(cls, name)):
+          fields[six.moves.intern(name)] = flag.value
+      fields['__frozen'] = True
+    # Built once now, so that reading it does not write to the pages.
+    self.current_snapshot()
+    if gc_freeze and hasattr(gc, 'freeze'):
+      gc.collect()
+      gc.freeze()
+
+  def is_frozen(self):
+    """Whether freeze() was called."""
+    return self.__dict__['__frozen']
+
+  def on_change(self, name, callback):
+    """Calls callback(changes) after the value of the flag --name changes.
+
+    Callbacks are called once the change made through a method of this
+    FlagValues (parsing, attribute assignment, update(), SetDefault(),
+    Reset(), ...) is complete and valid, outside of any lock.  All the flag
+    changes made by one such call are delivered together: a callback is
+    called once, with a dictionary mapping the name of each changed flag it
+    watches to an (old value, new value) tuple.  A failed validation delays
+    the notification to the next successful change.  Values assigned
+    directly to Flag objects are delivered with the next change made through
+    this FlagValues.
+
+    Args:
+      name: A string, the name of the flag.  Flags are reported by their
+        name, also if watched through their short name or an alias.
+      callback: Function taking the dictionary of changes.
+
+    Raises:
+      UnrecognizedFlagError: if the flag is not registered.
+    """
+    flag = self.__WatchedFlag(self.GetFlag(name))
+    with self.__dict__['__writer'].lock:
+      self.__dict__['__change_callbacks'].setdefault(
+          flag.name, []).append(callback)
+      self.__dict__['__change_recorder'].watch(flag)
+
+  def on_any_change(self, callback):
+    """Calls callback(changes) after the value of any flag changes.
+
+    See on_change().
+
+    Args:
+      callback: Function taking the dictionary of changes.
+    """
+    with self.__dict__['__writer'].lock:
+      self.__dict__['__any_change_callbacks'].append(callback)
+      recorder = self.__dict__['__change_recorder']
+      for flag in six.itervalues(self.FlagDict()):
+        recorder.watch(self.__WatchedFlag(flag))
+
+  def remove_change_callback(self, callback):
+    """Unregisters a callback from all the flags it watches.
+
+    Args:
+      callback: Function registered with on_change() or on_any_change().
+    """
+    with self.__dict__['__writer'].lock:
+      callbacks_by_name = self.__dict__['__change_callbacks']
+      for name, callbacks in list(callbacks_by_name.items()):
+        callbacks[:] = [c for c in callbacks if c != callback]
+        if not callbacks:
+          del callbacks_by_name[name]
+      any_callbacks = self.__dict__['__any_change_callbacks']
+      any_callbacks[:] = [c for c in any_callbacks if c != callback]
+      if not any_callbacks:
+        recorder = self.__dict__['__change_recorder']
+        for name in list(recorder):
+          if name not in callbacks_by_name:
+            recorder.unwatch(name)
+
+  def __WatchedFlag(self, flag):
+    """Returns the flag to watch for the changes of flag: not an alias."""
+    return getattr(flag, '_original_flag', None) or flag
+
+  def __NotifyChanges(self):
+    """Calls the change callbacks with the changes recorded so far."""
+    with self.__dict__['__writer'].lock:
+      recorder = self.__dict__['__change_recorder']
+      callbacks_by_name = self.__dict__['__change_callbacks']
+      any_callbacks = self.__dict__['__any_change_callbacks']
+      fl = self.FlagDict()
+      changes = {}
+      for name, old_value in recorder.drain():
+        flag = fl.get(name)
+        if flag is None or name in changes:
+          continue
+        if name in callbacks_by_name or any_callbacks:
+          recorder.watch(flag)
+        new_value = flag.value
+        if new_value != old_value:
+          changes[name] = (old_value, _CopyValue(new_value))
+      if not changes:
+        return
+      # Each callback is called once, with the changes it watches.  Compared
+      # with ==, since bound methods are created again on each access.
+      calls = [(callback, dict(changes)) for callback in any_callbacks]
+      for name, change in six.iteritems(changes):
+        for callback in callbacks_by_name.get(name, ()):
+          for call in calls:
+            if call[0] == callback:
+              call[1][name] = change
+              break
+          else:
+            calls.append((callback, {name: change}))
+    for callback, callback_changes in calls:
+      try:
+        callback(callback_changes)
+      except Exception:  # pylint: disable=broad-except
+        logging.exception('Flag change callback %r failed.', callback)
+
+  def snapshot(self):
+    """Builds an immutable view of the current flag values.
+
+    The view is consistent: it is never built in the middle of a change made
+    through the methods of this FlagValues (parsing, assignment, update(),
+    SetDefault(), ...).  Values assigned directly to Flag objects are not
+    serialized with these changes.
+
+    Returns:
+      FlagSnapshot, mapping the names and short names of the visible flags
+      to their values.
+    """
+    with self.__dict__['__writer'].lock:
+      hidden = self.__dict__['__hiddenflags']
+      values = {name: _CopyValue(flag.value)
+                for name, flag in six.iteritems(self.FlagDict())
+                if name not in hidden}
+      return FlagSnapshot(values, self.__dict__['__version'])
+
+  def current_snapshot(self):
+    """Returns the latest snapshot of the flag values.
+
+    Unlike snapshot(), returns the same FlagSnapshot until the flags change,
+    without taking any lock.  Changes only drop the snapshot, so that they
+    cost the same whatever the number of flags; the first call after a
+    change builds the new snapshot, waiting for that change to complete.
+
+    Returns:
+      FlagSnapshot, see snapshot().
+    """
+    snapshot = self.__dict__['__snapshot']
+    if snapshot is None:
+      with self.__dict__['__writer'].lock:
+        snapshot = self.__dict__['__snapshot']
+        if snapshot is None:
+          snapshot = self.snapshot()
+          self.__dict__['__snapshot'] = snapshot
+    return snapshot
+
   def __str__(self):
     """Generates a help string for all known flags."""
     return self.GetHelp()
@@ -857,8 +2068,27 @@ class FlagValues(object):
     Returns:
       str, formatted help message.
     """
-    # TODO(vrusinov): this function needs a test.
-    helplist = []
+    return '\n'.join(self.iter_help(prefix, include_special_flags))
+
+  def iter_help(self, prefix='', include_special_flags=True):
+    """Generates the help string for all known flags, one module at a time.
+
+    Writing the sections as they are generated lets long help messages start
+    showing before all of them are formatted:
+
+      for section in FLAGS.iter_help():
+        print(section)
+
+    Args:
+      prefix: str, per-line output prefix.
+      include_special_flags: bool, whether to include description of
+        _SPECIAL_FLAGS, i.e. --flagfile and --undefok.
+
+    Yields:
+      str, the help of the flags of one module; joining the sections with
+      newlines gives the result of GetHelp().
+    """
+    width = _helpers.GetHelpWidth()
 
     flags_by_module = self.FlagsByModuleDict()
     if flags_by_module:
@@ -871,32 +2101,40 @@ class FlagValues(object):
         modules = [main_module] + modules
 
       for module in modules:
-        self.__RenderOurModuleFlags(module, helplist)
+        helplist = []
+        self.__RenderOurModuleFlags(module, helplist, width=width)
+        if helplist:
+          yield '\n'.join(helplist)
       if include_special_flags:
+        helplist = []
         self.__RenderModuleFlags('gflags',
                                  _helpers.SPECIAL_FLAGS.FlagDict().values(),
-                                 helplist)
+                                 helplist, width=width)
+        yield '\n'.join(helplist)
     else:
       # Just print one long list of flags.
-      values = self.FlagDict().values()
+      values = list(self.FlagDict().values())
       if include_special_flags:
-        values.append(_helpers.SPECIAL_FLAGS.FlagDict().values())
-      self.__RenderFlagList(values, helplist, prefix)
-
-    return '\n'.join(helplist)
-
-  def __RenderModuleFlags(self, module, flags, output_lines, prefix=''):
+        values.extend(_helpers.SPECIAL_FLAGS.FlagDict().values())
+      helplist = []
+      self.__RenderFlagList(values, helplist, prefix, width)
+      if helplist:
+        yield '\n'.join(helplist)
+
+  def __RenderModuleFlags(self, module, flags, output_lines, prefix='',
+                          width=None):
     """Generates a help string for a given module."""
     if not isinstance(module, str):
       module = module.__name__
     output_lines.append('\n%s%s:' % (prefix, module))
-    self.__RenderFlagList(flags, output_lines, prefix + '  ')
+    self.__RenderFlagList(flags, output_lines, prefix + '  ', width)
 
-  def __RenderOurModuleFlags(self, module, output_lines, prefix=''):
+  def __RenderOurModuleFlags(self, module, output_lines, prefix='',
+                             width=None):
     """Generates a help string for a given module."""
     flags = self._GetFlagsDefinedByModule(module)
     if flags:
-      self.__RenderModuleFlags(module, flags, output_lines, prefix)
+      self.__RenderModuleFlags(module, flags, output_lines, prefix, width)
 
   def __RenderOurModuleKeyFlags(self, module, output_lines, prefix=''):
     """Generates a help string for the key flags of a given module.
@@ -932,7 +2170,9 @@ class FlagValues(object):
     """
     return self.ModuleHelp(sys.argv[0])
 
-  def __RenderFlagList(self, flaglist, output_lines, prefix='  '):
+  def __RenderFlagList(self, flaglist, output_lines, prefix='  ', width=None):
+    if width is None:
+      width = _helpers.GetHelpWidth()
     fl = self.FlagDict()
     special_fl = _helpers.SPECIAL_FLAGS.FlagDict()
     flaglist = [(flag.name, flag) for flag in flaglist]
@@ -948,26 +2188,7 @@ class FlagValues(object):
       # only print help once
       if flag in flagset: continue
       flagset[flag] = 1
-      flaghelp = ''
-      if flag.short_name: flaghelp += '-%s,' % flag.short_name
-      if flag.boolean:
-        flaghelp += '--[no]%s:' % flag.name
-      else:
-        flaghelp += '--%s:' % flag.name
-      flaghelp += ' '
-      if flag.help:
-        flaghelp += flag.help
-      flaghelp = _helpers.TextWrap(
-          flaghelp, indent=prefix+'  ', firstline_indent=prefix)
-      if flag.default_as_str:
-        flaghelp += '\n'
-        flaghelp += _helpers.TextWrap(
-            '(default: %s)' % flag.default_as_str, indent=prefix+'  ')
-      if flag.parser.syntactic_help:
-        flaghelp += '\n'
-        flaghelp += _helpers.TextWrap(
-            '(%s)' % flag.parser.syntactic_help, indent=prefix+'  ')
-      output_lines.append(flaghelp)
+      output_lines.append(flag._get_help_text(prefix, width))  # pylint: disable=protected-access
 
   def get_flag_value(self, name, default):  # pylint: disable=invalid-name
     """Returns the value of a flag (if not None) or a default value.
@@ -1028,7 +2249,8 @@ class FlagValues(object):
       raise exceptions.Error(
           'Hit illegal --flagfile type: %s' % flagfile_str)
 
-  def __GetFlagFileLines(self, filename, parsed_file_stack=None):
+  def __GetFlagFileLines(self, filename, parsed_file_stack=None, record=None,
+                         prefetched=None):
     """Returns the useful (!=comments, etc) lines from a file with flags.
 
     Args:
@@ -1037,6 +2259,10 @@ class FlagValues(object):
         recursively encountered at the current depth. MUTATED BY THIS FUNCTION
         (but the original value is preserved upon successfully returning from
         function call).
+      record: None or an _flagfile.ExpansionRecord that the files read and
+        the circular dependencies hit are added to.
+      prefetched: None or a dictionary returned by
+        _flagfile.prefetch_flag_lines(), used instead of reading the files.
 
     Returns:
       List of strings. See the note below.
@@ -1048,26 +2274,43 @@ class FlagValues(object):
     with '#' or '//').
     """
     if parsed_file_stack is None:
+      cache = _flagfile.get_cache()
+      if cache is not None:
+        return self.__GetCachedFlagFileLines(cache, filename, prefetched)
       parsed_file_stack = []
     # We do a little safety check for reparsing a file we've already encountered
     # at a previous depth.
     if filename in parsed_file_stack:
-      sys.stderr.write('Warning: Hit circular flagfile dependency. Ignoring'
-                       ' flagfile: %s\n' % (filename,))
+      _WarnAboutCircularFlagFile(filename)
+      if record is not None:
+        record.circular_files.append(filename)
       return []
     else:
       parsed_file_stack.append(filename)
 
-    line_list = []  # All line from flagfile.
+    if record is not None:
+      # The signature is taken before reading, so that a concurrent change
+      # of the file makes the cache entry stale rather than wrong.
+      record.files.append((filename, _flagfile.get_file_signature(filename)))
+
     flag_line_list = []  # Subset of lines w/o comments, blanks, flagfile= tags.
     try:
-      file_obj = open(filename, 'r')
+      # The reader already drops the blank and comment lines.
+      if prefetched is not None and filename in prefetched:
+        line_list = prefetched[filename]
+        if isinstance(line_list, IOError):
+          raise line_list
+      else:
+        line_list = _flagfile.read_flag_lines(filename)
     except IOError as e_msg:
       raise exceptions.CantOpenFlagFileError(
           'ERROR:: Unable to open flagfile: %s' % e_msg)
 
-    with file_obj:
-      line_list = file_obj.readlines()
+    if isinstance(line_list, _flagfile.CompiledFlagFile):
+      flag_line_list = self.__GetCompiledFlagFileLines(
+          line_list, filename, parsed_file_stack, record, prefetched)
+      parsed_file_stack.pop()
+      return flag_line_list
 
     # This is where we check each line in the file we just read.
     for line in line_list:
@@ -1081,7 +2324,8 @@ class FlagValues(object):
       elif self.__IsFlagFileDirective(line):
         sub_filename = self.ExtractFilename(line)
         included_flags = self.__GetFlagFileLines(
-            sub_filename, parsed_file_stack=parsed_file_stack)
+            sub_filename, parsed_file_stack=parsed_file_stack, record=record,
+            prefetched=prefetched)
         flag_line_list.extend(included_flags)
       else:
         # Any line that's not a comment or a nested flagfile should get
@@ -1092,6 +2336,269 @@ class FlagValues(object):
     parsed_file_stack.pop()
     return flag_line_list
 
+  def __GetCompiledFlagFileLines(self, compiled, filename, parsed_file_stack,
+                                 record, prefetched):
+    """Same as __GetFlagFileLines, for a flagfile read as a CompiledFlagFile.
+
+    The arguments stored in the compiled flagfile are returned if it is up to
+    date, otherwise its source flagfile is read instead.
+    """
+    files = compiled.check_dependencies()
+    if files is None:
+      logging.info('Compiled flagfile %s is disabled or out of date, '
+                   'reading %s instead.', filename, compiled.source)
+      return self.__GetFlagFileLines(
+          compiled.source, parsed_file_stack=parsed_file_stack, record=record,
+          prefetched=prefetched)
+    for circular_filename in compiled.circular_files:
+      _WarnAboutCircularFlagFile(circular_filename)
+    if record is not None:
+      record.files.extend(files)
+      record.circular_files.extend(compiled.circular_files)
+    return compiled.get_arguments()
+
+  def __GetCachedFlagFileLines(self, cache, filename, prefetched):
+    """Same as __GetFlagFileLines, but served from cache when up to date."""
+    entry = cache.lookup(filename)
+    if entry is not None:
+      self.__dict__['__flagfile_cache_hits'] += 1
+      for circular_filename in entry.circular_files:
+        _WarnAboutCircularFlagFile(circular_filename)
+      return list(entry.lines)
+
+    self.__dict__['__flagfile_cache_misses'] += 1
+    record = _flagfile.ExpansionRecord()
+    flag_line_list = self.__GetFlagFileLines(filename, [], record, prefetched)
+    cache.store(record.files[0][1], flag_line_list, record)
+    return flag_line_list
+
+  def __GetIncludedFlagFileNames(self, line_list):
+    """Returns the names of the flagfiles included by lines of a flagfile."""
+    if isinstance(line_list, _flagfile.CompiledFlagFile):
+      # The included flagfiles are only read if it is out of date.
+      return []
+    return [self.ExtractFilename(line) for line in line_list
+            if self.__IsFlagFileDirective(line)]
+
+  def __PrefetchFlagFiles(self, argv, force_gnu):
+    """Reads the flagfiles named in argv, and the ones they include.
+
+    Flagfiles served by the flagfile cache are skipped.
+
+    Args:
+      argv: A sequence of strings, see ReadFlagsFromFiles.
+      force_gnu: A boolean, see ReadFlagsFromFiles.
+
+    Returns:
+      None if the prefetch stage is disabled or no flagfile needs to be read,
+      otherwise a dictionary returned by _flagfile.prefetch_flag_lines().
+    """
+    max_workers = self.__dict__['__flagfile_prefetch_workers']
+    if not max_workers:
+      return None
+    filenames = self._GetFlagFileNames(argv, force_gnu)
+    cache = _flagfile.get_cache()
+    if cache is not None:
+      filenames = [filename for filename in filenames
+                   if cache.lookup(filename) is None]
+    if not filenames:
+      return None
+    return _flagfile.prefetch_flag_lines(
+        filenames, self.__GetIncludedFlagFileNames, max_workers)
+
+  def _GetFlagFileNames(self, argv, force_gnu=False):
+    """Returns the names of the flagfiles named by --flagfile in argv.
+
+    Walks argv like _IterFlagsFromFiles, so that the flagfiles after '--',
+    or after the first non-flag argument without GNU getopt, are left out.
+
+    Args:
+      argv: A sequence of strings, see ReadFlagsFromFiles.
+      force_gnu: A boolean, see ReadFlagsFromFiles.
+
+    Returns:
+      A list of strings, the names of the top level flagfiles, in order.
+    """
+    use_gnu_getopt = force_gnu or self.__dict__['__use_gnu_getopt']
+    flag_dict = self.FlagDict()
+    filenames = []
+    num_args = len(argv)
+    i = 0
+    while i < num_args:
+      arg = argv[i]
+      i += 1
+      if self.__IsFlagFileDirective(arg):
+        if arg == '--flagfile' or arg == '-flagfile':
+          if i < num_args:
+            filenames.append(os.path.expanduser(argv[i]))
+            i += 1
+        else:
+          filenames.append(self.ExtractFilename(arg))
+      elif arg == '--':
+        break
+      elif not arg.startswith('-'):
+        if not use_gnu_getopt:
+          break
+      elif '=' not in arg and i < num_args and not argv[i].startswith('-'):
+        # Skips the value of --x y, which is not the first non-flag.
+        name = arg.lstrip('-')
+        if name in flag_dict and not flag_dict[name].boolean:
+          i += 1
+    return filenames
+
+  def _ExpandFlagFile(self, filename):
+    """Expands a flagfile, bypassing the flagfile cache.
+
+    Args:
+      filename: A string, the name of the flagfile.
+
+    Returns:
+      A (lines, record) tuple: the list of lines returned by
+      ReadFlagsFromFiles for --flagfile=filename, and the
+      _flagfile.ExpansionRecord of the files read.
+
+    Raises:
+      CantOpenFlagFileError: if a flagfile cannot be read.
+    """
+    record = _flagfile.ExpansionRecord()
+    return self.__GetFlagFileLines(filename, [], record), record
+
+  def compile_flagfile(self, filename, output_filename=None):
+    """Compiles a flagfile, with the flagfiles it includes, into one file.
+
+    The compiled file is passed to --flagfile like any flagfile, but loads
+    with a single read: the nested flagfiles are already expanded, and the
+    values of the flags registered in this FlagValues are stored already
+    converted by their parser, so that parsing them does not call the parser
+    again.  The other arguments, and the values the parser rejects, are
+    stored as text and parsed as usual.
+
+    Compiled files are only loaded once gflags.enable_compiled_flagfiles()
+    is called, as they are read with marshal, which is not safe on untrusted
+    data; until then, the source flagfile is read instead.
+
+    The compiled file records the signature and the SHA-256 digest of every
+    flagfile read.  When loading it, if one of them changed, or the Python
+    version recorded in its header differs, the source flagfile is read
+    instead.  A converted value is only used if its flag still has the same
+    type and parser.
+
+    Args:
+      filename: str, the name of the flagfile to compile.
+      output_filename: str, the name of the file to write, by default
+        filename followed by 'c'.  It is replaced atomically.
+
+    Returns:
+      str, the name of the file written.
+
+    Raises:
+      CantOpenFlagFileError: if a flagfile cannot be read.
+      Error: if a flagfile changed while being compiled.
+    """
+    if output_filename is None:
+      output_filename = filename + 'c'
+    source = os.path.abspath(os.path.expanduser(filename))
+    lines, record = self._ExpandFlagFile(source)
+    dependencies = collections.OrderedDict()
+    for name, signature in record.files:
+      if name in dependencies:
+        continue
+      try:
+        digest = _flagfile.get_file_digest(name)
+      except IOError as e_msg:
+        raise exceptions.CantOpenFlagFileError(
+            'ERROR:: Unable to open flagfile: %s' % e_msg)
+      if (signature is None or
+          _flagfile.get_file_signature(name) != signature):
+        raise exceptions.Error(
+            'Flagfile %s changed while being compiled.' % name)
+      dependencies[name] = (name, signature, digest)
+    plan = self._GetParsePlan()
+    converters = {}
+    entries = [self.__CompileFlagFileLine(plan, converters, line)
+               for line in lines]
+    _flagfile.write_compiled(output_filename, _flagfile.CompiledFlagFile(
+        source, dependencies.values(), record.circular_files, entries))
+    return output_filename
+
+  def __CompileFlagFileLine(self, plan, converters, line):
+    """Returns the entry of a CompiledFlagFile for a line of a flagfile.
+
+    Args:
+      plan: dict, the parse plan, see _GetParsePlan().
+      converters: dict, caches the results of _GetConverter() by flag class
+        and parser, and by value, so that the flags sharing a parser share
+        the same tuple, which marshal stores once.
+      line: str, an argument read from a flagfile.
+
+    Returns:
+      If the line sets a flag whose value can be converted ahead of time, an
+      (argument, conversion) tuple, the conversion being a (spelling, action,
+      converter, value) tuple: the key of the flag in the parse plan, often
+      the argument itself, the parse plan action, the description returned by
+      _GetConverter() and the converted value.  Otherwise line.
+    """
+    # Lines read from a compiled flagfile are turned back into plain strings.
+    line = str(line)
+    spelling = line
+    value = None
+    entry = plan.get(line)
+    if entry is None:
+      if not line.startswith('-'):
+        return line
+      name, equals, value = line.lstrip('-').partition('=')
+      if not name or not equals:
+        return line
+      spelling = '--' + name
+      entry = plan.get(spelling)
+      if entry is None:
+        return line
+    flag, action = entry
+    if flag is None:
+      # --undefok.
+      return line
+    if action == _PARSE_ACTION_NEGATE:
+      if value is not None:
+        return line
+      value = False
+    elif value is None:
+      if action != _PARSE_ACTION_BOOLEAN:
+        # The value is the next argument.
+        return line
+      value = True
+    converter = converters.get((type(flag), flag.parser), False)
+    if converter is False:
+      converter = _GetConverter(flag)
+      try:
+        # Equal converters, e.g. of enum flags with the same values but
+        # separate parsers, are shared as well.
+        converter = converters.setdefault(marshal.dumps(converter), converter)
+      except ValueError:
+        # The parser has attributes marshal cannot store.
+        converter = None
+      converters[type(flag), flag.parser] = converter
+    if converter is None:
+      return line
+    try:
+      value = flag.parser.parse(value)
+      marshal.dumps(value)
+    except ValueError:
+      # Rejected or not serializable: parsing the line reports the error.
+      return line
+    return (line, (spelling, action, converter, value))
+
+  def flagfile_cache_stats(self):
+    """Returns the flagfile cache counters of this FlagValues object.
+
+    The counters only move while the process-wide flagfile cache is enabled,
+    see gflags.enable_flagfile_cache().
+
+    Returns:
+      A CacheStats namedtuple with the hits and misses fields.
+    """
+    return _flagfile.CacheStats(self.__dict__['__flagfile_cache_hits'],
+                                self.__dict__['__flagfile_cache_misses'])
+
   def ReadFlagsFromFiles(self, argv, force_gnu=True):
     """Processes command line args, but also allow args to be read from file.
 
@@ -1131,49 +2638,93 @@ class FlagValues(object):
     --> In a flagfile, a line beginning with # or // is a comment.
     --> Entirely blank lines _should_ be ignored.
     """
-    rest_of_args = argv
-    new_argv = []
-    while rest_of_args:
-      current_arg = rest_of_args[0]
-      rest_of_args = rest_of_args[1:]
+    return list(self._IterFlagsFromFiles(argv, force_gnu))
+
+  def _IterFlagsFromFiles(self, argv, force_gnu, record=None):
+    """Yields the arguments of argv, with --flagfile directives expanded.
+
+    This is the expansion engine behind ReadFlagsFromFiles.  It walks argv by
+    index, so its cost is linear in the number of arguments, and it yields the
+    arguments one at a time.
+
+    Args:
+      argv: A sequence of strings, see ReadFlagsFromFiles.
+      force_gnu: A boolean, see ReadFlagsFromFiles.
+      record: None or an _flagfile.ExpansionRecord that the flagfiles read
+        and the circular dependencies hit are added to.  The flagfile cache
+        is not used in this case.
+
+    Yields:
+      Strings, the arguments and the lines read from any flagfile(s).
+
+    Raises:
+      IllegalFlagValueError: when --flagfile provided with no argument.
+    """
+    use_gnu_getopt = force_gnu or self.__dict__['__use_gnu_getopt']
+    flag_dict = self.FlagDict()
+    profiler = self.__dict__['__profiler']
+    if profiler is None:
+      prefetched = self.__PrefetchFlagFiles(argv, force_gnu)
+    else:
+      start = _profiling._clock()
+      prefetched = self.__PrefetchFlagFiles(argv, force_gnu)
+      if prefetched is not None:
+        profiler.record(_profiling.FLAGFILE, '<prefetch>',
+                        _profiling._clock() - start)
+    num_args = len(argv)
+    i = 0
+    while i < num_args:
+      current_arg = argv[i]
+      i += 1
       if self.__IsFlagFileDirective(current_arg):
         # This handles the case of -(-)flagfile foo.  In this case the
         # next arg really is part of this one.
         if current_arg == '--flagfile' or current_arg == '-flagfile':
-          if not rest_of_args:
+          if i == num_args:
             raise exceptions.IllegalFlagValueError(
                 '--flagfile with no argument')
-          flag_filename = os.path.expanduser(rest_of_args[0])
-          rest_of_args = rest_of_args[1:]
+          flag_filename = os.path.expanduser(argv[i])
+          i += 1
         else:
           # This handles the case of (-)-flagfile=foo.
           flag_filename = self.ExtractFilename(current_arg)
-        new_argv.extend(self.__GetFlagFileLines(flag_filename))
+        # An empty parsed_file_stack bypasses the cache, which does not
+        # record the files.
+        parsed_file_stack = None if record is None else []
+        if profiler is None:
+          flag_lines = self.__GetFlagFileLines(
+              flag_filename, parsed_file_stack, record, prefetched)
+        else:
+          start = _profiling._clock()
+          try:
+            flag_lines = self.__GetFlagFileLines(
+                flag_filename, parsed_file_stack, record, prefetched)
+          finally:
+            profiler.record(_profiling.FLAGFILE, flag_filename,
+                            _profiling._clock() - start)
+        for line in flag_lines:
+          yield line
       else:
-        new_argv.append(current_arg)
+        yield current_arg
         # Stop parsing after '--', like getopt and gnu_getopt.
         if current_arg == '--':
           break
         # Stop parsing after a non-flag, like getopt.
         if not current_arg.startswith('-'):
-          if not force_gnu and not self.__dict__['__use_gnu_getopt']:
+          if not use_gnu_getopt:
             break
-        else:
-          if ('=' not in current_arg and
-              rest_of_args and not rest_of_args[0].startswith('-')):
-            # If this is an occurence of a legitimate --x y, skip the value
-            # so that it won't be mistaken for a standalone arg.
-            fl = self.FlagDict()
-            name = current_arg.lstrip('-')
-            if name in fl and not fl[name].boolean:
-              current_arg = rest_of_args[0]
-              rest_of_args = rest_of_args[1:]
-              new_argv.append(current_arg)
-
-    if rest_of_args:
-      new_argv.extend(rest_of_args)
-
-    return new_argv
+        elif ('=' not in current_arg and
+              i < num_args and not argv[i].startswith('-')):
+          # If this is an occurence of a legitimate --x y, skip the value
+          # so that it won't be mistaken for a standalone arg.
+          name = current_arg.lstrip('-')
+          if name in flag_dict and not flag_dict[name].boolean:
+            yield argv[i]
+            i += 1
+
+    while i < num_args:
+      yield argv[i]
+      i += 1
 
   def FlagsIntoString(self):
     """Returns a string with the flags assignments from this FlagValues object.
@@ -1284,4 +2835,141 @@ class FlagValues(object):
   unparse_flags = Reset
 
 
+def _GetFlagList(flags_by_module, module):
+  """Returns the _FlagList of a module, adding an empty one if needed."""
+  flags = flags_by_module.get(module)
+  if flags is None:
+    flags = flags_by_module[module] = _FlagList()
+  return flags
+
+
+def _TimedVerify(validator, flag_values):
+  """Checks a validator, for parallel validation.
+
+  Args:
+    validator: validators.Validator
+    flag_values: FlagValues
+
+  Returns:
+    Tuple (elapsed, error): the number of seconds the check took, and the
+    exceptions.ValidationError it raised or None.
+  """
+  start = _profiling._clock()
+  try:
+    validator.verify(flag_values)
+  except exceptions.ValidationError as e:
+    return _profiling._clock() - start, e
+  return _profiling._clock() - start, None
+
+
+def _InsertValidator(validators, validator):
+  """Inserts a validator into a list of validators kept in creation order."""
+  index = len(validators)
+  # Validators are almost always registered right after they are created.
+  while (index and
+         validators[index - 1].insertion_index > validator.insertion_index):
+    index -= 1
+  validators.insert(index, validator)
+
+
+def _MergeValidators(validator_lists):
+  """Merges lists of validators kept in creation order.
+
+  Args:
+    validator_lists: list of lists of validators.Validator, each in the order
+      the validators were created.
+
+  Returns:
+    List of the distinct validators of all the lists, in the order they were
+    created.  A single list is returned as is.
+  """
+  if len(validator_lists) == 1:
+    return validator_lists[0]
+  # Validators are keyed by their unique creation index, so that they are
+  # ordered by comparing integers and never compared themselves.
+  by_index = {}
+  for validators in validator_lists:
+    for validator in validators:
+      by_index[validator.insertion_index] = validator
+  return [by_index[index] for index in sorted(by_index)]
+
+
+def _FindModuleOfFlag(flags_by_module, registered_flag, default):
+  """Scans a module -> [flags] dictionary for the module of a flag.
+
+  Only used for flags that were registered without a module, e.g. directly
+  through FlagValues.__setitem__; the modules of other flags are indexed.
+
+  Args:
+    flags_by_module: A dictionary, module name or id -> list of Flag objects.
+    registered_flag: A Flag object, the flag registered in a FlagValues.
+    default: Value to return if no module defines the flag.
+
+  Returns:
+    The first module whose flags include a flag with the same names as
+    registered_flag, or default.
+  """
+  for module, flags in six.iteritems(flags_by_module):
+    for flag in flags:
+      # It must compare the flag with the one in FlagDict. This is because a
+      # flag might be overridden only for its long name (or short name),
+      # and only its short name (or long name) is considered registered.
+      if (flag.name == registered_flag.name and
+          flag.short_name == registered_flag.short_name):
+        return module
+  return default
+
+
+def _GetConverter(flag):
+  """Returns what a value converted ahead of time for a flag depends on.
+
+  See FlagValues.compile_flagfile().
+
+  Args:
+    flag: Flag, the flag.
+
+  Returns:
+    A (flag class, parser class, parser attributes) tuple: the names of the
+    classes, and a dict.  None if the flag cannot take converted values,
+    because its class changes how it parses.
+  """
+  cls = type(flag)
+  parse = six.get_unbound_function(cls.parse)
+  if (parse is not six.get_unbound_function(_flag.Flag.parse) and
+      parse is not six.get_unbound_function(_flag.MultiFlag.parse)):
+    return None
+  parser = flag.parser
+  return ('%s.%s' % (cls.__module__, cls.__name__),
+          '%s.%s' % (type(parser).__module__, type(parser).__name__),
+          dict(getattr(parser, '__dict__', {})))
+
+
+def _ConvertsAs(flag, converter, matching_converters):
+  """Whether a flag still converts values as when a flagfile was compiled.
+
+  Args:
+    flag: Flag, the flag.
+    converter: tuple, returned by _GetConverter() when the flagfile was
+      compiled.
+    matching_converters: dict, caches the converters found to match, by flag
+      class and parser.  The flags sharing a parser share the same converter
+      object in the compiled flagfile, so it is usually compared once.
+
+  Returns:
+    bool, whether values converted by converter can be assigned to flag.
+  """
+  key = (type(flag), flag.parser)
+  if matching_converters.get(key) is converter:
+    return True
+  if _GetConverter(flag) != converter:
+    return False
+  matching_converters[key] = converter
+  return True
+
+
+def _WarnAboutCircularFlagFile(filename):
+  sys.stderr.write('Warning: Hit circular flagfile dependency. Ignoring'
+                   ' flagfile: %s\n' % (filename,))
+
+
 _helpers.SPECIAL_FLAGS = FlagValues()
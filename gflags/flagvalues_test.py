@@ -0,0 +1,1499 @@
+#!/usr/bin/env python
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are
+# met:
+#
+#     * Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+#     * Redistributions in binary form must reproduce the above
+# copyright notice, this list of conditions and the following disclaimer
+# in the documentation and/or other materials provided with the
+# distribution.
+#     * Neither the name of Google Inc. nor the names of its
+# contributors may be used to endorse or promote products derived from
+# this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Unittest for flagvalues module."""
+
+import copy
+import gc
+import json
+import operator
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+import warnings
+
+import gflags
+from gflags import _flagfile
+from gflags import _helpers
+from gflags import exceptions
+from gflags import flagvalues
+from gflags import validators as gflags_validators
+
+
+class ParseArgsTest(unittest.TestCase):
+  """Tests the parse plan based argument scanning of FlagValues."""
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_string('name', 'default', 'A string flag.',
+                         short_name='n', flag_values=self.flag_values)
+    gflags.DEFINE_boolean('verbose', False, 'A boolean flag.',
+                          short_name='v', flag_values=self.flag_values)
+    gflags.DEFINE_integer('count', 1, 'An integer flag.',
+                          flag_values=self.flag_values)
+
+  def testAllSpellings(self):
+    argv = self.flag_values(
+        ['prog', '--name=a', '-count', '3', '--verbose', 'rest'])
+    self.assertEqual(['prog', 'rest'], argv)
+    self.assertEqual('a', self.flag_values.name)
+    self.assertEqual(3, self.flag_values.count)
+    self.assertTrue(self.flag_values.verbose)
+
+    self.flag_values(['prog', '-n', 'b', '--nov', '---count=4'])
+    self.assertEqual('b', self.flag_values.name)
+    self.assertFalse(self.flag_values.verbose)
+    self.assertEqual(4, self.flag_values.count)
+
+  def testBooleanWithValue(self):
+    self.flag_values(['prog', '--verbose=false'])
+    self.assertFalse(self.flag_values.verbose)
+    self.assertRaises(ValueError, self.flag_values,
+                      ['prog', '--noverbose=true'])
+
+  def testMissingValue(self):
+    self.assertRaises(gflags.Error, self.flag_values, ['prog', '--name'])
+
+  def testUnknownFlag(self):
+    with self.assertRaises(gflags.UnrecognizedFlagError) as cm:
+      self.flag_values(['prog', '--nocount'])
+    self.assertEqual('nocount', cm.exception.flagname)
+
+  def testUnknownFlagSuggestions(self):
+    try:
+      self.flag_values(['prog', '--verbos'])
+    except gflags.UnrecognizedFlagError as e:
+      self.assertIn('Did you mean: verbose?', str(e))
+    else:
+      self.fail('UnrecognizedFlagError not raised')
+    gflags.DEFINE_boolean('verbosity', False, 'Another boolean flag.',
+                          flag_values=self.flag_values)
+    try:
+      self.flag_values(['prog', '--verbos'])
+    except gflags.UnrecognizedFlagError as e:
+      self.assertIn('Did you mean: verbose, verbosity?', str(e))
+    else:
+      self.fail('UnrecognizedFlagError not raised')
+
+  def testUndefok(self):
+    argv = self.flag_values(
+        ['prog', '--undefok=missing', '--missing=1', '--nomissing'])
+    self.assertEqual(['prog'], argv)
+
+  def testKnownOnly(self):
+    argv = self.flag_values(
+        ['prog', '--undefok', 'x', '--x=1', '--count=2', '--', '--name=a'],
+        known_only=True)
+    self.assertEqual(['prog', '--undefok', '--x=1', '--', '--name=a'], argv)
+    self.assertEqual(2, self.flag_values.count)
+    self.assertEqual('default', self.flag_values.name)
+
+  def testGnuGetOpt(self):
+    self.flag_values.UseGnuGetOpt(True)
+    argv = self.flag_values(['prog', 'a', '--count=5', '-', 'b', '-v'])
+    self.assertEqual(['prog', 'a', '-', 'b'], argv)
+    self.assertEqual(5, self.flag_values.count)
+    self.assertTrue(self.flag_values.verbose)
+
+  def testPlanFollowsRegistration(self):
+    self.flag_values(['prog', '--verbose'])
+    gflags.DEFINE_boolean('noverbose', True, 'Shadows --noverbose.',
+                          flag_values=self.flag_values)
+    self.flag_values(['prog', '--noverbose'])
+    self.assertTrue(self.flag_values.noverbose)
+    self.assertTrue(self.flag_values.verbose)
+
+    del self.flag_values.count
+    self.assertRaises(gflags.UnrecognizedFlagError, self.flag_values,
+                      ['prog', '--count=3'])
+
+
+class FlagListTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flags = [gflags.Flag(gflags.ArgumentParser(),
+                              gflags.ArgumentSerializer(),
+                              'flag_%d' % i, '', 'A flag.')
+                  for i in range(3)]
+
+  def testBehavesLikeList(self):
+    a, b, c = self.flags
+    flag_list = flagvalues._FlagList([b, a])
+    flag_list.append(c)
+    flag_list.append(b)
+    self.assertEqual([b, a, c, b], flag_list)
+    self.assertEqual(4, len(flag_list))
+    self.assertEqual(c, flag_list[2])
+    self.assertEqual([c, b], flag_list[2:])
+    self.assertEqual(2, flag_list.count(b))
+    self.assertIn(c, flag_list)
+    flag_list.remove(b)
+    self.assertEqual([a, c, b], flag_list)
+    self.assertRaises(ValueError, flag_list.remove,
+                      gflags.BooleanFlag('other', False, 'Other flag.'))
+    flag_list.remove(c)
+    flag_list.insert(0, c)
+    self.assertEqual([c, a, b], flag_list)
+    del flag_list[0]
+    self.assertEqual([a, b], flag_list)
+    self.assertNotIn(c, flag_list)
+    self.assertNotEqual([b, a], flag_list)
+
+  def testIsList(self):
+    a, b, c = self.flags
+    flag_list = flagvalues._FlagList([a, b, a])
+    self.assertIsInstance(flag_list, list)
+    self.assertEqual([a, b, a], list(flag_list))
+    self.assertEqual([a, b, a, c], flag_list + [c])
+    flag_list.sort(key=lambda flag: flag.name, reverse=True)
+    self.assertEqual([b, a, a], flag_list)
+    flag_list[0] = c
+    self.assertEqual([c, a, a], flag_list)
+    self.assertNotIn(b, flag_list)
+    flag_list[1:] = [b]
+    self.assertEqual([c, b], flag_list)
+    self.assertEqual((0, 1, 1), tuple(flag_list.count(f) for f in self.flags))
+    self.assertEqual(b, flag_list.pop())
+    flag_list += [a, a]
+    del flag_list[:2]
+    self.assertEqual([a], flag_list)
+    self.assertEqual((1, 0, 0), tuple(flag_list.count(f) for f in self.flags))
+    flag_list_copy = copy.deepcopy(flag_list)
+    self.assertIsInstance(flag_list_copy, flagvalues._FlagList)
+    self.assertEqual(1, flag_list_copy.count(flag_list_copy[0]))
+
+  def testDiscard(self):
+    a, b, c = self.flags
+    flag_list = flagvalues._FlagList([a, b, a, c])
+    flag_list.discard(a)
+    flag_list.discard(a)
+    self.assertEqual([b, c], flag_list)
+    self.assertEqual(2, len(flag_list))
+    self.assertNotIn(a, flag_list)
+
+
+class FindModuleDefiningFlagTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+
+  def _DefineFlag(self, module_name, **kwargs):
+    flag = gflags.Flag(gflags.ArgumentParser(), gflags.ArgumentSerializer(),
+                       'name', 'default', 'A flag.', **kwargs)
+    gflags.DEFINE_flag(flag, flag_values=self.flag_values,
+                       module_name=module_name)
+    return flag
+
+  def testRegisteredModule(self):
+    self._DefineFlag('gflags', short_name='n')
+    for name in ('name', 'n'):
+      self.assertEqual(
+          'gflags', self.flag_values.FindModuleDefiningFlag(name))
+      self.assertEqual(
+          id(gflags), self.flag_values.FindModuleIdDefiningFlag(name))
+    self.assertEqual(
+        'default', self.flag_values.FindModuleDefiningFlag('x', 'default'))
+
+  def testOverriddenFlag(self):
+    self._DefineFlag('gflags', allow_override=True)
+    self._DefineFlag('gflags.flagvalues', allow_override=True)
+    self.assertEqual('gflags.flagvalues',
+                     self.flag_values.FindModuleDefiningFlag('name'))
+    self.assertEqual(id(gflags.flagvalues),
+                     self.flag_values.FindModuleIdDefiningFlag('name'))
+    self.assertEqual(
+        [], self.flag_values._GetFlagsDefinedByModule('gflags'))
+
+  def testDeletedFlag(self):
+    self._DefineFlag('gflags')
+    delattr(self.flag_values, 'name')
+    self.assertIsNone(self.flag_values.FindModuleDefiningFlag('name'))
+    self.assertIsNone(self.flag_values.FindModuleIdDefiningFlag('name'))
+
+  def testFlagRegisteredWithoutModule(self):
+    flag = self._DefineFlag('gflags')
+    other_flag_values = gflags.FlagValues()
+    other_flag_values['name'] = flag
+    self.assertIsNone(other_flag_values.FindModuleDefiningFlag('name'))
+    self.assertIsNone(other_flag_values.FindModuleIdDefiningFlag('name'))
+
+
+class GetHelpTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_string('name', 'default', 'A string flag.',
+                         short_name='n', flag_values=self.flag_values)
+    gflags.DEFINE_boolean('verbose', False, 'A boolean flag.',
+                          flag_values=self.flag_values)
+
+  def testIterHelpMatchesGetHelp(self):
+    sections = list(self.flag_values.iter_help())
+    self.assertEqual(2, len(sections))
+    self.assertIn('--flagfile', sections[-1])
+    self.assertEqual('\n'.join(sections), self.flag_values.GetHelp())
+    self.assertEqual(
+        '\n'.join(self.flag_values.iter_help(include_special_flags=False)),
+        self.flag_values.GetHelp(include_special_flags=False))
+
+  def testHelpFollowsDefaultAndHelpChanges(self):
+    self.assertIn("(default: 'default')", self.flag_values.GetHelp())
+    self.flag_values.SetDefault('name', 'other')
+    help_text = self.flag_values.GetHelp()
+    self.assertIn("(default: 'other')", help_text)
+    self.assertNotIn("(default: 'default')", help_text)
+    self.flag_values['name'].help = 'A renamed string flag.'
+    self.assertIn('-n,--name: A renamed string flag.',
+                  self.flag_values.GetHelp())
+
+  def testFlagsWithoutModule(self):
+    flag_values = gflags.FlagValues()
+    flag_values['name'] = self.flag_values['name']
+    help_text = flag_values.GetHelp(prefix='  ')
+    self.assertIn('  -n,--name: A string flag.', help_text)
+    self.assertIn('  --flagfile:', help_text)
+    self.assertNotIn('--flagfile', flag_values.GetHelp(
+        include_special_flags=False))
+
+
+class _FlagFileTestCase(unittest.TestCase):
+  """Base class of the tests writing flagfiles to a temporary directory."""
+
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.tmpdir)
+
+  def _WriteFlagFile(self, name, lines):
+    path = os.path.join(self.tmpdir, name)
+    existed = os.path.exists(path)
+    with open(path, 'w') as f:
+      f.write('\n'.join(lines) + '\n')
+    if existed:
+      # Makes the change visible even with a coarse modification time.
+      mtime = os.stat(path).st_mtime + 10
+      os.utime(path, (mtime, mtime))
+    return path
+
+
+class ReadFlagsFromFilesTest(_FlagFileTestCase):
+
+  def setUp(self):
+    super(ReadFlagsFromFilesTest, self).setUp()
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_string('name', 'default', 'A string flag.',
+                         flag_values=self.flag_values)
+    gflags.DEFINE_integer('count', 1, 'An integer flag.',
+                          flag_values=self.flag_values)
+
+  def testExpandsInPlace(self):
+    nested = self._WriteFlagFile('nested.cfg', ['--count=3'])
+    flagfile = self._WriteFlagFile('main.cfg', [
+        '# A comment.', '', '--name=file', '--flagfile=' + nested])
+    argv = ['--count', '2', '--flagfile', flagfile, '--name=last', 'arg',
+            '--flagfile=' + flagfile]
+    self.assertEqual(
+        ['--count', '2', '--name=file', '--count=3', '--name=last', 'arg',
+         '--flagfile=' + flagfile],
+        self.flag_values.ReadFlagsFromFiles(argv, force_gnu=False))
+    self.assertEqual(
+        ['--count', '2', '--name=file', '--count=3', '--name=last', 'arg',
+         '--name=file', '--count=3'],
+        self.flag_values.ReadFlagsFromFiles(argv, force_gnu=True))
+
+  def testSkipsCommentsAndBlankLines(self):
+    path = os.path.join(self.tmpdir, 'crlf.cfg')
+    with open(path, 'wb') as f:
+      f.write(b'# comment\r\n// comment\r\n \t\r\n\r\n--name=a \r\n'
+              b'  # not a comment\r\n--count=2')
+    self.assertEqual(
+        ['--name=a', '# not a comment', '--count=2'],
+        self.flag_values.ReadFlagsFromFiles(['--flagfile=' + path]))
+    empty = self._WriteFlagFile('empty.cfg', [])
+    self.assertEqual([], self.flag_values.ReadFlagsFromFiles(
+        ['--flagfile=' + empty]))
+
+  def testLaterFlagsWin(self):
+    flagfile = self._WriteFlagFile('main.cfg', ['--name=file', '--count=3'])
+    self.flag_values(['prog', '--flagfile=' + flagfile, '--count=4'])
+    self.assertEqual('file', self.flag_values.name)
+    self.assertEqual(4, self.flag_values.count)
+
+  def testUnreadableFlagFileChangesNothing(self):
+    missing = os.path.join(self.tmpdir, 'missing.cfg')
+    self.assertRaises(gflags.CantOpenFlagFileError, self.flag_values,
+                      ['prog', '--count=5', '--flagfile=' + missing])
+    self.assertEqual(1, self.flag_values['count'].value)
+    self.assertFalse(self.flag_values['count'].present)
+
+  def testStopsAfterDoubleDash(self):
+    argv = ['--', '--flagfile=missing']
+    self.assertEqual(argv, self.flag_values.ReadFlagsFromFiles(argv))
+
+  def testFlagFileWithNoArgument(self):
+    self.assertRaises(gflags.IllegalFlagValueError,
+                      self.flag_values.ReadFlagsFromFiles, ['--flagfile'])
+
+
+class FlagFileCacheTest(_FlagFileTestCase):
+
+  def setUp(self):
+    super(FlagFileCacheTest, self).setUp()
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('count', 1, 'An integer flag.',
+                          flag_values=self.flag_values)
+    gflags.enable_flagfile_cache(max_entries=2)
+    self.addCleanup(gflags.disable_flagfile_cache)
+
+  def _Read(self, path):
+    return self.flag_values.ReadFlagsFromFiles(['--flagfile=' + path])
+
+  def testHitsAndMisses(self):
+    flagfile = self._WriteFlagFile('main.cfg', ['--count=2'])
+    self.assertEqual(['--count=2'], self._Read(flagfile))
+    self.assertEqual(['--count=2'], self._Read(flagfile))
+    self.assertEqual((1, 1), self.flag_values.flagfile_cache_stats())
+
+  def testNestedChangeInvalidatesParent(self):
+    nested = self._WriteFlagFile('nested.cfg', ['--count=2'])
+    flagfile = self._WriteFlagFile('main.cfg', ['--flagfile=' + nested])
+    self.assertEqual(['--count=2'], self._Read(flagfile))
+    self._WriteFlagFile('nested.cfg', ['--count=33'])
+    self.assertEqual(['--count=33'], self._Read(flagfile))
+    self.assertEqual((0, 2), self.flag_values.flagfile_cache_stats())
+
+  def testLeastRecentlyUsedEntryIsEvicted(self):
+    paths = [self._WriteFlagFile('%d.cfg' % i, ['--count=%d' % i])
+             for i in range(3)]
+    for path in paths:
+      self._Read(path)
+    self._Read(paths[2])
+    self._Read(paths[0])
+    self.assertEqual((1, 4), self.flag_values.flagfile_cache_stats())
+
+
+class FlagFilePrefetchTest(_FlagFileTestCase):
+
+  def setUp(self):
+    super(FlagFilePrefetchTest, self).setUp()
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('count', 1, 'An integer flag.',
+                          flag_values=self.flag_values)
+
+  def _ReadBothWays(self, argv):
+    sequential = self.flag_values.ReadFlagsFromFiles(argv)
+    self.flag_values.set_flagfile_prefetch(max_workers=4)
+    try:
+      prefetched = self.flag_values.ReadFlagsFromFiles(argv)
+    finally:
+      self.flag_values.set_flagfile_prefetch(0)
+    return sequential, prefetched
+
+  def testSameOrderAsSequentialExpansion(self):
+    leaves = [self._WriteFlagFile('%d.cfg' % i, ['--count=%d' % i])
+              for i in range(5)]
+    middle = self._WriteFlagFile(
+        'middle.cfg', ['--flagfile=' + path for path in leaves[2:]])
+    main_path = os.path.join(self.tmpdir, 'main.cfg')
+    self._WriteFlagFile('main.cfg', [
+        '--flagfile=' + leaves[0], '--flagfile=' + middle,
+        '--flagfile=' + main_path, '--flagfile=' + leaves[1]])
+    argv = ['--flagfile', main_path, 'arg', '--flagfile=' + middle]
+    sequential, prefetched = self._ReadBothWays(argv)
+    self.assertEqual(
+        ['--count=0', '--count=2', '--count=3', '--count=4', '--count=1',
+         'arg', '--count=2', '--count=3', '--count=4'], sequential)
+    self.assertEqual(sequential, prefetched)
+
+  def testFlagFilesNotParsedAreNotNamed(self):
+    argv = ['--count', '3', '--flagfile=a', 'arg',
+            '--flagfile', 'b', '--', '--flagfile=c']
+    self.assertEqual(['a', 'b'],
+                     self.flag_values._GetFlagFileNames(argv, force_gnu=True))
+    self.flag_values.UseGnuGetOpt(False)
+    self.assertEqual(['a'], self.flag_values._GetFlagFileNames(argv))
+
+  def testCachedFlagFilesAreNotPrefetched(self):
+    gflags.enable_flagfile_cache()
+    self.addCleanup(gflags.disable_flagfile_cache)
+    cached = self._WriteFlagFile('cached.cfg', ['--count=2'])
+    uncached = self._WriteFlagFile('uncached.cfg', ['--count=3'])
+    self.flag_values.ReadFlagsFromFiles(['--flagfile=' + cached])
+    prefetched = []
+    prefetch_flag_lines = _flagfile.prefetch_flag_lines
+
+    def RecordingPrefetch(filenames, *args):
+      prefetched.extend(filenames)
+      return prefetch_flag_lines(filenames, *args)
+
+    _flagfile.prefetch_flag_lines = RecordingPrefetch
+    self.addCleanup(setattr, _flagfile, 'prefetch_flag_lines',
+                    prefetch_flag_lines)
+    self.flag_values.set_flagfile_prefetch(max_workers=2)
+    self.assertEqual(['--count=2', '--count=3'],
+                     self.flag_values.ReadFlagsFromFiles(
+                         ['--flagfile=' + cached, '--flagfile=' + uncached]))
+    self.assertEqual([uncached], prefetched)
+
+  def testMissingFlagFile(self):
+    missing = os.path.join(self.tmpdir, 'missing.cfg')
+    flagfile = self._WriteFlagFile('main.cfg', ['--flagfile=' + missing])
+    self.flag_values.set_flagfile_prefetch(max_workers=2)
+    self.assertRaises(gflags.CantOpenFlagFileError,
+                      self.flag_values.ReadFlagsFromFiles,
+                      ['--flagfile=' + flagfile])
+
+
+class IncrementalValidationTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+    self.checked = []
+    for name in ('a', 'b', 'c'):
+      gflags.DEFINE_integer(name, 1, 'An integer flag.',
+                            flag_values=self.flag_values)
+      gflags.register_validator(name, self._Checker(name),
+                                flag_values=self.flag_values)
+
+  def _Checker(self, name):
+    def Checker(value):
+      self.checked.append(name)
+      return value > 0
+    return Checker
+
+  def testFirstParseChecksAllValidators(self):
+    self.flag_values(['prog', '--b=2'])
+    self.assertEqual(['a', 'b', 'c'], self.checked)
+
+  def testReparseChecksAffectedValidators(self):
+    self.flag_values(['prog'])
+    del self.checked[:]
+    self.flag_values(['prog', '--c=3', '--a=2'])
+    self.assertEqual(['a', 'c'], self.checked)
+    del self.checked[:]
+    self.flag_values(['prog'])
+    self.assertEqual([], self.checked)
+
+  def testMultiFlagValidator(self):
+    gflags.register_multi_flags_validator(
+        ['a', 'b'], lambda values: values['a'] <= values['b'],
+        flag_values=self.flag_values)
+    self.flag_values(['prog'])
+    self.flag_values(['prog', '--b=5'])
+    self.assertRaises(gflags.IllegalFlagValueError,
+                      self.flag_values, ['prog', '--a=6'])
+
+  def testNewValidatorIsChecked(self):
+    self.flag_values(['prog'])
+    gflags.register_validator('b', lambda value: value > 1,
+                              flag_values=self.flag_values)
+    self.assertRaises(gflags.IllegalFlagValueError, self.flag_values, ['prog'])
+
+  def testFailureTriggersFullValidation(self):
+    self.flag_values(['prog'])
+    self.assertRaises(gflags.IllegalFlagValueError,
+                      self.flag_values, ['prog', '--a=0'])
+    self.assertRaises(gflags.IllegalFlagValueError,
+                      self.flag_values, ['prog', '--b=2'])
+    self.assertRaises(gflags.IllegalFlagValueError,
+                      setattr, self.flag_values, 'b', 0)
+    self.flag_values.a = 1
+    self.assertRaises(gflags.IllegalFlagValueError,
+                      self.flag_values, ['prog', '--c=2'])
+
+  def testValueAssignedToFlagIsChecked(self):
+    self.flag_values(['prog'])
+    self.flag_values['a'].value = 0
+    self.assertRaises(gflags.IllegalFlagValueError, self.flag_values, ['prog'])
+    self.flag_values['a'].value = 2
+    self.flag_values(['prog'])
+    del self.checked[:]
+    self.flag_values['b'].value = 3
+    self.flag_values(['prog'])
+    self.assertEqual(['b'], self.checked)
+
+  def testResetAndDisabledModeCheckAllValidators(self):
+    self.flag_values(['prog'])
+    self.flag_values.Reset()
+    del self.checked[:]
+    self.flag_values(['prog'])
+    self.assertEqual(['a', 'b', 'c'], self.checked)
+    self.flag_values.set_incremental_validation(False)
+    del self.checked[:]
+    self.flag_values(['prog'])
+    self.assertEqual(['a', 'b', 'c'], self.checked)
+
+
+class UpdateTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('low', 1, 'Lower bound.',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_integer('high', 2, 'Upper bound.',
+                          flag_values=self.flag_values)
+    self.checked = []
+
+    def Checker(values):
+      self.checked.append(values)
+      return values['low'] <= values['high']
+    gflags.register_multi_flags_validator(
+        ['low', 'high'], Checker, flag_values=self.flag_values)
+
+  def testValidatesOnceAfterAssigningAllValues(self):
+    self.flag_values.update(low=5, high=6)
+    self.assertEqual([{'low': 5, 'high': 6}], self.checked)
+    self.assertEqual(5, self.flag_values['low'].value)
+    self.assertFalse(self.flag_values['high'].using_default_value)
+
+  def testValidationError(self):
+    self.assertRaises(gflags.IllegalFlagValueError,
+                      self.flag_values.update, low=5, high=4)
+    self.assertTrue(self.flag_values['low'].using_default_value)
+
+  def testUnknownFlagAssignsNothing(self):
+    self.assertRaises(gflags.UnrecognizedFlagError,
+                      self.flag_values.update, low=0, unknown=1)
+    self.assertEqual(1, self.flag_values['low'].value)
+    self.assertEqual([], self.checked)
+
+
+class ValidatorOrderTest(unittest.TestCase):
+
+  def testValidatorsCheckedInCreationOrder(self):
+    flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('a', 0, 'A flag.', flag_values=flag_values)
+    gflags.DEFINE_integer('b', 0, 'A flag.', flag_values=flag_values)
+    checked = []
+
+    def Validator(name, flag_names):
+      return gflags_validators.MultiFlagsValidator(
+          flag_names, lambda _: checked.append(name) or True, 'Invalid.')
+    first = Validator('first', ['a', 'b'])
+    second = Validator('second', ['b'])
+    third = Validator('third', ['a'])
+    for validator in (third, second, first):
+      flag_values._AddValidator(validator)
+    self.assertEqual([first, third], flag_values['a'].validators)
+    self.assertEqual([first, second], flag_values['b'].validators)
+    flag_values(['prog'])
+    self.assertEqual(['first', 'second', 'third'], checked)
+    del checked[:]
+    flag_values.update(a=1, b=1)
+    self.assertEqual(['first', 'second', 'third'], checked)
+
+  def testValidatorsAppendedToTheFlag(self):
+    flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('a', 0, 'A flag.', flag_values=flag_values)
+    flag_values(['prog'])
+    flag_values['a'].validators.append(
+        gflags_validators.SingleFlagValidator('a', _IsPositive, 'Invalid.'))
+    self.assertRaises(exceptions.IllegalFlagValueError,
+                      flag_values._AssertAllValidators)
+
+  def testMergeValidators(self):
+    validators = [
+        gflags_validators.SingleFlagValidator('a', bool, 'Invalid.')
+        for _ in range(4)]
+    v0, v1, v2, v3 = validators
+    self.assertEqual(validators, flagvalues._MergeValidators(
+        [[v1, v3], [v0, v1, v1, v2], [], [v3]]))
+
+
+@unittest.skipIf(flagvalues.futures is None, 'concurrent.futures is missing')
+class ParallelValidationTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('a', 1, 'A flag.', flag_values=self.flag_values)
+    gflags.DEFINE_integer('b', 1, 'A flag.', flag_values=self.flag_values)
+    self.flag_values.set_parallel_validation(max_workers=4)
+
+  def testValidatorsRunConcurrently(self):
+    b_checked = threading.Event()
+    gflags.register_validator(
+        'a', lambda value: b_checked.wait(5) and value > 0,
+        flag_values=self.flag_values)
+    gflags.register_validator(
+        'b', lambda value: b_checked.set() or True,
+        flag_values=self.flag_values)
+    self.flag_values(['prog'])
+    timings = self.flag_values.validator_timings()
+    self.assertEqual(2, len(timings))
+    self.assertTrue(all(elapsed >= 0 for elapsed in timings.values()))
+
+  def testFirstFailureInCreationOrder(self):
+    b_failed = threading.Event()
+
+    def CheckA(value):
+      b_failed.wait(5)
+      return value > 1
+    gflags.register_validator('a', CheckA, message='a is invalid',
+                              flag_values=self.flag_values)
+    gflags.register_validator('b', lambda _: b_failed.set(),
+                              message='b is invalid',
+                              flag_values=self.flag_values)
+    with self.assertRaises(gflags.IllegalFlagValueError) as context:
+      self.flag_values(['prog'])
+    self.assertEqual('flag --a=1: a is invalid', str(context.exception))
+
+  def testInjectedExecutor(self):
+    gflags.register_multi_flags_validator(
+        ['a', 'b'], lambda values: values['a'] == values['b'],
+        flag_values=self.flag_values)
+    gflags.register_validator('a', lambda value: value > 0,
+                              flag_values=self.flag_values)
+    with flagvalues.futures.ThreadPoolExecutor(2) as executor:
+      self.flag_values.set_parallel_validation(executor=executor)
+      self.assertRaises(gflags.IllegalFlagValueError,
+                        self.flag_values.update, a=2)
+      self.flag_values.update(a=2, b=2)
+    self.flag_values.set_parallel_validation(False)
+    self.flag_values.update(a=3, b=3)
+
+
+class ProfilerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('count', 1, 'An integer flag.',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_string('name', 'default', 'A string flag.',
+                         flag_values=self.flag_values)
+    gflags.register_validator('count', _IsPositive,
+                              flag_values=self.flag_values)
+    self.profiler = gflags.Profiler()
+    self.flag_values.set_profiler(self.profiler)
+
+  def _Stats(self):
+    return dict(((row['kind'], row['name']), row)
+                for row in self.profiler.stats())
+
+  def testRecordsValidatorsAndParsers(self):
+    self.flag_values(['prog', '--count=2', '--count=3', '--name=x'])
+    self.flag_values.count = 4
+    stats = self._Stats()
+    validator = stats[('validator', '--count: %s._IsPositive' % __name__)]
+    self.assertEqual(2, validator['count'])
+    self.assertGreaterEqual(validator['total'], validator['worst'])
+    self.assertEqual(2, stats[('parser', 'IntegerParser.parse')]['count'])
+    self.assertEqual(1, stats[('parser', 'ArgumentParser.parse')]['count'])
+
+  def testRecordsFlagFiles(self):
+    tmpdir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, tmpdir)
+    flagfile = os.path.join(tmpdir, 'flags.cfg')
+    with open(flagfile, 'w') as f:
+      f.write('--count=5\n')
+    self.flag_values(['prog', '--flagfile=' + flagfile])
+    self.assertEqual(1, self._Stats()[('flagfile', flagfile)]['count'])
+
+  def testDumps(self):
+    self.flag_values(['prog', '--count=2'])
+    rows = json.loads(self.profiler.to_json())
+    self.assertEqual(self.profiler.stats(), rows)
+    self.assertEqual(
+        sorted(rows[0]), ['count', 'kind', 'name', 'total', 'worst'])
+    table = self.profiler.format_table().splitlines()
+    self.assertEqual(len(rows) + 1, len(table))
+    self.assertTrue(table[0].startswith('kind'))
+
+  def testDisabled(self):
+    self.flag_values.set_profiler(None)
+    self.flag_values(['prog', '--count=2'])
+    self.assertEqual([], self.profiler.stats())
+    self.assertIsNone(self.flag_values.get_profiler())
+
+
+class DefinitionTracerTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+    self.tracer = gflags.enable_definition_tracing()
+    self.addCleanup(gflags.disable_definition_tracing)
+
+  def testRecordsDefinitions(self):
+    gflags.DEFINE_integer('count', 1, 'An integer flag.',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_boolean('verbose', False, 'A boolean flag.',
+                          flag_values=self.flag_values, module_name='other')
+    flag = gflags.Flag(gflags.ArgumentParser(), gflags.ArgumentSerializer(),
+                       'name', 'default', 'A flag.')
+    gflags.DEFINE_flag(flag, flag_values=self.flag_values)
+    module_name = self.flag_values.FindModuleDefiningFlag('count')
+    self.assertIn(module_name, (__name__, sys.argv[0]))
+    count, verbose, name = self.tracer.definitions()
+    self.assertEqual((module_name, 'count'),
+                     (count.module_name, count.flag_name))
+    self.assertEqual('other', verbose.module_name)
+    self.assertIsNotNone(count.construct)
+    self.assertIsNone(name.construct)
+    self.assertLessEqual(count.construct[1], count.register[0])
+    self.assertLessEqual(count.register[1], count.attribute[0])
+
+    summary = dict((row['module'], row) for row in self.tracer.summary())
+    self.assertEqual(2, summary[module_name]['count'])
+    self.assertIn(module_name, self.tracer.format_summary())
+    events = self.tracer.chrome_trace()['traceEvents']
+    self.assertEqual(8, len(events))
+    self.assertEqual(
+        {'name': 'count', 'cat': 'construct', 'ph': 'X'},
+        dict((key, events[0][key]) for key in ('name', 'cat', 'ph')))
+
+  def testDisabled(self):
+    gflags.disable_definition_tracing()
+    gflags.DEFINE_integer('count', 1, 'An integer flag.',
+                          flag_values=self.flag_values)
+    self.assertEqual([], self.tracer.definitions())
+    self.assertIsNone(gflags.get_definition_tracer())
+
+  def testEnvironmentVariable(self):
+    tmpdir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, tmpdir)
+    trace_file = os.path.join(tmpdir, 'trace.json')
+    env = dict(os.environ, GFLAGS_TRACE_DEFINITIONS=trace_file,
+               PYTHONPATH=os.pathsep.join(sys.path))
+    subprocess.check_call(
+        [sys.executable, '-c',
+         'import gflags; gflags.DEFINE_string("traced", "", "A flag.")'],
+        env=env, stderr=subprocess.PIPE)
+    with open(trace_file) as f:
+      events = json.load(f)['traceEvents']
+    self.assertIn('traced', [event['name'] for event in events])
+
+
+class LazyDefaultParsingTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+    gflags.set_lazy_default_parsing()
+    self.addCleanup(gflags.set_lazy_default_parsing, False)
+
+  def testDefaultParsedOnFirstUse(self):
+    gflags.DEFINE_integer('count', '5', 'An integer flag.',
+                          flag_values=self.flag_values)
+    flag = self.flag_values['count']
+    self.assertTrue(flag._default_pending)
+    self.assertEqual(5, flag.value)
+    self.assertFalse(flag._default_pending)
+    self.assertEqual("'5'", flag.default_as_str)
+
+  def testCommandLineValue(self):
+    gflags.DEFINE_integer('count', 1, 'An integer flag.',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_multi_string('name', ['a', 'b'], 'A multi flag.',
+                               flag_values=self.flag_values)
+    self.flag_values(['prog', '--count=3', '--name=c', '--name=d'])
+    self.assertEqual(3, self.flag_values.count)
+    self.assertEqual(['c', 'd'], self.flag_values.name)
+    self.assertEqual("'1'", self.flag_values['count'].default_as_str)
+    name_flag = self.flag_values['name']
+    self.assertEqual(name_flag._get_parsed_value_as_string(['a', 'b']),
+                     name_flag.default_as_str)
+    self.assertIn('(default: \'1\')', self.flag_values.GetHelp())
+    self.flag_values.Reset()
+    self.assertEqual(['a', 'b'], self.flag_values['name'].value)
+
+  def testInvalidDefaultRaisedWhenMarkedParsed(self):
+    gflags.DEFINE_integer('count', 'many', 'An integer flag.',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_integer('bound', 'few', 'An integer flag.',
+                          flag_values=self.flag_values)
+    for _ in range(2):
+      with self.assertRaises(gflags.IllegalFlagValueError) as context:
+        self.flag_values(['prog'])
+      self.assertIn('--bound=few', str(context.exception))
+    self.assertFalse(self.flag_values.IsParsed())
+    # Setting the flag parses the default first.
+    with self.assertRaises(gflags.IllegalFlagValueError) as context:
+      self.flag_values(['prog', '--count=2'])
+    self.assertIn('--count=many', str(context.exception))
+
+  def testAliasParsesDefaultEagerly(self):
+    gflags.DEFINE_integer('count', 1, 'An integer flag.',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_alias('number', 'count', flag_values=self.flag_values)
+    self.assertFalse(self.flag_values['number']._default_pending)
+    self.flag_values(['prog', '--number=4'])
+    self.assertEqual(4, self.flag_values.count)
+
+  def testSetDefaultIsEager(self):
+    gflags.DEFINE_integer('count', 1, 'An integer flag.',
+                          flag_values=self.flag_values)
+    self.assertRaises(gflags.IllegalFlagValueError,
+                      self.flag_values.SetDefault, 'count', 'many')
+
+
+class FlagReadTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('count', 1, 'An integer flag.', short_name='c',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_alias('number', 'count', flag_values=self.flag_values)
+    self.flag_values(['prog'])
+
+  def _IsCached(self, name):
+    return name in vars(self.flag_values)
+
+  def testValueChanges(self):
+    self.assertEqual(1, self.flag_values.count)
+    self.assertEqual(1, self.flag_values.c)
+    self.assertTrue(self._IsCached('count'))
+    self.flag_values.count = 2
+    self.assertFalse(self._IsCached('count'))
+    self.assertEqual(2, self.flag_values.c)
+    self.assertEqual(2, self.flag_values.count)
+    self.flag_values(['prog', '--c=3'])
+    self.assertEqual(3, self.flag_values.count)
+    self.flag_values['count'].value = 4
+    self.assertEqual(4, self.flag_values.count)
+    self.flag_values.SetDefault('count', 5)
+    self.assertEqual(5, self.flag_values.count)
+
+  def testAlias(self):
+    self.assertEqual(1, self.flag_values.number)
+    self.assertFalse(self._IsCached('number'))
+    self.flag_values.count = 2
+    self.assertEqual(2, self.flag_values.number)
+    self.flag_values.number = 3
+    self.assertEqual(3, self.flag_values.count)
+
+  def testHiddenFlag(self):
+    self.assertEqual(1, self.flag_values.count)
+    self.flag_values.HideFlag('count')
+    self.assertRaises(AttributeError, getattr, self.flag_values, 'count')
+    self.assertEqual(1, self.flag_values.c)
+
+  def testUnparsedAccessAfterReset(self):
+    # Without the alias, whose default parsing marks --count as present.
+    flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('count', 1, 'An integer flag.',
+                          flag_values=flag_values)
+    flag_values(['prog'])
+    self.assertEqual(1, flag_values.count)
+    flag_values.Reset()
+    self.assertRaises(exceptions.UnparsedFlagAccessError,
+                      getattr, flag_values, 'count')
+
+  def testDeletedAndRedefinedFlag(self):
+    self.assertEqual(1, self.flag_values.count)
+    delattr(self.flag_values, 'count')
+    self.assertRaises(AttributeError, getattr, self.flag_values, 'count')
+    gflags.DEFINE_integer('count', 6, 'An integer flag.',
+                          flag_values=self.flag_values)
+    self.assertEqual(6, self.flag_values.count)
+    gflags.DEFINE_integer('count', 7, 'An integer flag.', allow_override=True,
+                          flag_values=self.flag_values)
+    self.assertEqual(7, self.flag_values.count)
+    self.assertEqual(1, self.flag_values.c)
+
+
+class UnparsedAccessTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('count', 1, 'An integer flag.',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_string('name', 'x', 'A string flag.',
+                         flag_values=self.flag_values)
+    self.env_name = flagvalues._UNPARSED_FLAG_ACCESS_ENV_NAME
+    self.old_env_value = os.environ.get(self.env_name)
+    os.environ[self.env_name] = '1'
+
+  def tearDown(self):
+    if self.old_env_value is None:
+      os.environ.pop(self.env_name, None)
+    else:
+      os.environ[self.env_name] = self.old_env_value
+
+  def _CountWarnings(self, *names):
+    with warnings.catch_warnings(record=True) as caught:
+      warnings.simplefilter('always')
+      for name in names:
+        getattr(self.flag_values, name)
+    return len(caught)
+
+  def testWarnsOncePerFlag(self):
+    self.assertEqual(2, self._CountWarnings('count', 'count', 'name', 'name'))
+    self.assertEqual(0, self._CountWarnings('count', 'name'))
+
+  def testEnvironmentChangeInvalidatesDecisions(self):
+    self.assertEqual(1, self.flag_values.count)
+    os.environ[self.env_name] = '0'
+    self.assertRaises(exceptions.UnparsedFlagAccessError,
+                      getattr, self.flag_values, 'count')
+    os.environ[self.env_name] = '1'
+    self.assertEqual(1, self._CountWarnings('count', 'count'))
+
+  def testResetReportsAgain(self):
+    self.assertEqual(1, self._CountWarnings('count', 'count'))
+    self.flag_values(['prog'])
+    self.flag_values.Reset()
+    self.assertEqual(1, self._CountWarnings('count', 'count'))
+    del os.environ[self.env_name]
+    self.assertRaises(exceptions.UnparsedFlagAccessError,
+                      getattr, self.flag_values, 'count')
+
+
+class SnapshotTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('low', 1, 'Lower bound.', short_name='l',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_integer('high', 2, 'Upper bound.',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_string('secret', 'x', 'A hidden flag.',
+                         flag_values=self.flag_values)
+    self.flag_values.HideFlag('secret')
+    self.flag_values(['prog', '--low=3'])
+
+  def testSnapshotValues(self):
+    snapshot = self.flag_values.snapshot()
+    self.assertIsInstance(snapshot, gflags.FlagSnapshot)
+    self.assertEqual({'low': 3, 'l': 3, 'high': 2}, dict(snapshot))
+    self.assertEqual(3, snapshot.low)
+    self.assertEqual(3, snapshot['l'])
+    self.assertNotIn('secret', snapshot)
+    self.assertRaises(AttributeError, getattr, snapshot, 'secret')
+
+  def testSnapshotIsImmutable(self):
+    snapshot = self.flag_values.snapshot()
+    self.assertRaises(AttributeError, setattr, snapshot, 'low', 4)
+    self.assertRaises(TypeError, operator.setitem, snapshot, 'low', 4)
+    self.flag_values.low = 4
+    self.assertEqual(3, snapshot.low)
+
+  def testSnapshotCanBePickled(self):
+    snapshot = self.flag_values.snapshot()
+    for snapshot_copy in (copy.deepcopy(snapshot),
+                          pickle.loads(pickle.dumps(snapshot))):
+      self.assertEqual(dict(snapshot), dict(snapshot_copy))
+      self.assertEqual(snapshot.version, snapshot_copy.version)
+
+  def testCurrentSnapshotIsPublishedByChanges(self):
+    snapshot = self.flag_values.current_snapshot()
+    self.assertIs(snapshot, self.flag_values.current_snapshot())
+    self.flag_values.low = 0
+    new_snapshot = self.flag_values.current_snapshot()
+    self.assertEqual(0, new_snapshot.low)
+    self.assertGreater(new_snapshot.version, snapshot.version)
+    self.flag_values.update(low=1, high=5)
+    self.assertEqual((1, 5), (self.flag_values.current_snapshot().low,
+                              self.flag_values.current_snapshot().high))
+    self.flag_values.SetDefault('high', 6)
+    self.assertEqual(6, self.flag_values.current_snapshot().high)
+    self.flag_values(['prog', '--high=7'])
+    self.assertEqual(7, self.flag_values.current_snapshot().high)
+
+  def testListValuesAreCopied(self):
+    gflags.DEFINE_multistring('m', [], 'A multi flag.',
+                              flag_values=self.flag_values)
+    self.flag_values(['prog', '--m=a'])
+    snapshot = self.flag_values.snapshot()
+    current_snapshot = self.flag_values.current_snapshot()
+    self.flag_values(['prog', '--m=b'])
+    self.assertEqual(['a'], snapshot.m)
+    self.assertEqual(['a'], current_snapshot.m)
+    self.assertEqual(['a', 'b'], self.flag_values.current_snapshot().m)
+
+  def testCurrentSnapshotBeforeParsing(self):
+    flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('low', 1, 'Lower bound.', flag_values=flag_values)
+    self.assertEqual(1, flag_values.current_snapshot().low)
+
+  def testConcurrentReadsAreNotTorn(self):
+    # Writers keep high == low + 1; readers must never see anything else.
+    stop = threading.Event()
+    torn = []
+
+    def Write():
+      for i in range(2000):
+        self.flag_values.update(low=i, high=i + 1)
+        self.flag_values(['prog', '--low=%d' % -i, '--high=%d' % (1 - i)])
+      stop.set()
+
+    def Read():
+      while not stop.is_set():
+        for snapshot in (self.flag_values.current_snapshot(),
+                         self.flag_values.snapshot()):
+          if snapshot.high != snapshot.low + 1:
+            torn.append((snapshot.low, snapshot.high))
+
+    threads = [threading.Thread(target=Write)]
+    threads.extend(threading.Thread(target=Read) for _ in range(4))
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual([], torn)
+
+
+class OverrideTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('low', 1, 'Lower bound.', short_name='l',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_integer('high', 5, 'Upper bound.',
+                          flag_values=self.flag_values)
+    gflags.register_multi_flags_validator(
+        ['low', 'high'], lambda values: values['low'] < values['high'],
+        flag_values=self.flag_values)
+
+  def testOverrideAndRestore(self):
+    self.flag_values(['prog'])
+    self.assertEqual(1, self.flag_values.low)
+    with self.flag_values.override(low=2) as flag_values:
+      self.assertIs(self.flag_values, flag_values)
+      self.assertEqual(2, self.flag_values.low)
+      self.assertEqual(2, self.flag_values.l)
+      self.assertEqual(1, self.flag_values['low'].value)
+      self.assertNotIn('low', self.flag_values.__dict__)
+    self.assertEqual(1, self.flag_values.low)
+    self.assertIn('low', self.flag_values.__dict__)
+
+  def testOverrideBeforeParsing(self):
+    with warnings.catch_warnings(record=True) as caught:
+      warnings.simplefilter('always')
+      with self.flag_values.override(low=2):
+        self.assertEqual(2, self.flag_values.low)
+    self.assertEqual([], caught)
+
+  def testNestedOverrides(self):
+    self.flag_values(['prog'])
+    with self.flag_values.override(low=2):
+      with self.flag_values.override(low=3, high=4):
+        self.assertEqual((3, 4), (self.flag_values.low, self.flag_values.high))
+      self.assertEqual((2, 5), (self.flag_values.low, self.flag_values.high))
+    self.assertEqual((1, 5), (self.flag_values.low, self.flag_values.high))
+
+  def testOverridesAreValidated(self):
+    self.flag_values(['prog'])
+    override = self.flag_values.override(low=5)
+    self.assertRaises(exceptions.IllegalFlagValueError, override.__enter__)
+    self.assertEqual(1, self.flag_values.low)
+    with self.flag_values.override(high=10):
+      # Validated together with the enclosing override.
+      with self.flag_values.override(low=7):
+        self.assertEqual(7, self.flag_values.low)
+
+  def testUnknownAndHiddenFlags(self):
+    self.assertRaises(exceptions.UnrecognizedFlagError,
+                      self.flag_values.override, nonexistent=1)
+    self.flag_values.HideFlag('high')
+    self.assertRaises(AttributeError, self.flag_values.override, high=1)
+
+  def testOverridesAreThreadLocal(self):
+    self.flag_values(['prog'])
+    entered = threading.Event()
+    read = threading.Event()
+    values = []
+
+    def Read():
+      entered.wait(5)
+      values.append(self.flag_values.low)
+      read.set()
+
+    thread = threading.Thread(target=Read)
+    thread.start()
+    with self.flag_values.override(low=2):
+      entered.set()
+      read.wait(5)
+      self.assertEqual(2, self.flag_values.low)
+    thread.join()
+    self.assertEqual([1], values)
+
+  @unittest.skipIf(_helpers.contextvars is None, 'contextvars not available')
+  def testOverridesAreContextLocal(self):
+    # Each asyncio task runs in its own context.
+    self.flag_values(['prog'])
+    context = _helpers.contextvars.copy_context()
+    override = self.flag_values.override(low=3)
+    context.run(override.__enter__)
+    self.assertEqual(1, self.flag_values.low)
+    self.assertEqual(3, context.run(getattr, self.flag_values, 'low'))
+    context.run(override.__exit__, None, None, None)
+    self.assertEqual(1, context.run(getattr, self.flag_values, 'low'))
+
+
+class ChangeCallbackTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('low', 1, 'Lower bound.', short_name='l',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_integer('high', 5, 'Upper bound.',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_string('name', 'x', 'A string flag.',
+                         flag_values=self.flag_values)
+    gflags.register_multi_flags_validator(
+        ['low', 'high'], lambda values: values['low'] < values['high'],
+        flag_values=self.flag_values)
+    self.flag_values(['prog'])
+    self.calls = []
+
+  def _Record(self, changes):
+    self.calls.append(changes)
+
+  def testOnChange(self):
+    self.flag_values.on_change('l', self._Record)
+    self.flag_values.low = 2
+    self.flag_values.name = 'y'
+    self.flag_values.SetDefault('low', 3)
+    self.assertEqual([{'low': (1, 2)}, {'low': (2, 3)}], self.calls)
+
+  def testChangesAreCoalesced(self):
+    self.flag_values.on_change('low', self._Record)
+    self.flag_values.on_change('high', self._Record)
+    self.flag_values.update(low=6, high=10)
+    self.flag_values(['prog', '--low=7', '--high=8', '--name=z'])
+    self.assertEqual([{'low': (1, 6), 'high': (5, 10)},
+                      {'low': (6, 7), 'high': (10, 8)}], self.calls)
+
+  def testOnAnyChange(self):
+    self.flag_values.on_any_change(self._Record)
+    self.flag_values(['prog', '--low=2', '--name=y'])
+    gflags.DEFINE_integer('later', 0, 'Defined later.',
+                          flag_values=self.flag_values)
+    self.flag_values.later = 1
+    self.flag_values.Reset()
+    self.assertEqual([{'low': (1, 2), 'name': ('x', 'y')},
+                      {'later': (0, 1)},
+                      {'low': (2, 1), 'name': ('y', 'x'), 'later': (1, 0)}],
+                     self.calls)
+
+  def testUnchangedValuesAreNotReported(self):
+    self.flag_values.on_any_change(self._Record)
+    self.flag_values.low = 1
+    self.flag_values(['prog', '--name=x'])
+    self.assertEqual([], self.calls)
+
+  def testFailedValidationDelaysNotification(self):
+    self.flag_values.on_change('low', self._Record)
+    with self.assertRaises(exceptions.IllegalFlagValueError):
+      self.flag_values.low = 9
+    self.assertEqual([], self.calls)
+    self.flag_values.high = 10
+    self.assertEqual([{'low': (1, 9)}], self.calls)
+
+  def testDirectFlagChangesAreDeliveredWithTheNextChange(self):
+    self.flag_values.on_change('low', self._Record)
+    self.flag_values['low'].value = 2
+    self.assertEqual([], self.calls)
+    self.flag_values.name = 'y'
+    self.assertEqual([{'low': (1, 2)}], self.calls)
+
+  def testCallbacksRunOutsideTheLock(self):
+    lock_held = []
+
+    def Check(unused_changes):
+      # Acquiring the lock from another thread only succeeds if it is free.
+      thread = threading.Thread(target=lambda: lock_held.append(
+          not self.flag_values._writing().lock.acquire(False) or
+          self.flag_values._writing().lock.release()))
+      thread.start()
+      thread.join()
+
+    self.flag_values.on_change('low', Check)
+    self.flag_values.low = 2
+    self.assertEqual([None], lock_held)
+
+  def testRemoveChangeCallback(self):
+    self.flag_values.on_change('low', self._Record)
+    self.flag_values.on_any_change(self._Record)
+    self.flag_values.remove_change_callback(self._Record)
+    self.flag_values.low = 2
+    self.assertEqual([], self.calls)
+    self.assertRaises(exceptions.UnrecognizedFlagError,
+                      self.flag_values.on_change, 'nonexistent', self._Record)
+
+  def testMultiFlagAppendsAreChanges(self):
+    gflags.DEFINE_multistring('multi', [], 'A multi flag.',
+                              flag_values=self.flag_values)
+    self.flag_values.on_change('multi', self._Record)
+    self.flag_values(['prog', '--multi=a'])
+    self.flag_values(['prog', '--multi=b'])
+    self.assertEqual([{'multi': ([], ['a'])}, {'multi': (['a'], ['a', 'b'])}],
+                     self.calls)
+
+  def testFlagOverridingValueIsCompared(self):
+    gflags.DEFINE_flag(_UpperCaseFlag(gflags.ArgumentParser(),
+                                      gflags.ArgumentSerializer(), 'word', 'a',
+                                      'A flag.'),
+                       flag_values=self.flag_values)
+    self.flag_values.on_change('word', self._Record)
+    self.flag_values(['prog', '--word=b', '--low=2'])
+    self.flag_values.low = 3
+    self.flag_values.word = 'c'
+    self.assertEqual([{'word': ('A', 'B')}, {'word': ('B', 'C')}], self.calls)
+
+  def testFailingCallbackDoesNotStopTheOthers(self):
+    self.flag_values.on_change('low', lambda changes: 1 / 0)
+    self.flag_values.on_change('low', self._Record)
+    self.flag_values.low = 2
+    self.assertEqual([{'low': (1, 2)}], self.calls)
+
+
+class CompiledFlagFileTest(_FlagFileTestCase):
+
+  def setUp(self):
+    super(CompiledFlagFileTest, self).setUp()
+    gflags.enable_compiled_flagfiles()
+    self.addCleanup(gflags.disable_compiled_flagfiles)
+    self.nested = self._WriteFlagFile(
+        'nested.cfg', ['# Comment.', '--count=1', '--rate=0.5'])
+    self.main = self._WriteFlagFile('main.cfg', [
+        '--flagfile=' + self.nested, '--count=3', '--names=a,b', '--verbose',
+        '--nodebug', '--multi=x', '--multi=y', '--mode=high', '--unknown=5',
+        '--level', '7'])
+
+  def _MakeFlagValues(self):
+    flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('count', 0, 'An integer flag.',
+                          flag_values=flag_values)
+    gflags.DEFINE_integer('level', 0, 'An integer flag.',
+                          flag_values=flag_values)
+    gflags.DEFINE_float('rate', 0.0, 'A float flag.', flag_values=flag_values)
+    gflags.DEFINE_list('names', [], 'A list flag.', flag_values=flag_values)
+    gflags.DEFINE_boolean('verbose', False, 'A boolean flag.',
+                          flag_values=flag_values)
+    gflags.DEFINE_boolean('debug', True, 'A boolean flag.',
+                          flag_values=flag_values)
+    gflags.DEFINE_multistring('multi', [], 'A multi flag.',
+                              flag_values=flag_values)
+    gflags.DEFINE_enum('mode', 'low', ['low', 'high'], 'An enum flag.',
+                       flag_values=flag_values)
+    return flag_values
+
+  def _Parse(self, filename, flag_values=None):
+    if flag_values is None:
+      flag_values = self._MakeFlagValues()
+    flag_values(['prog', '--flagfile=' + filename, '--undefok=unknown'])
+    return flag_values.FlagValuesDict()
+
+  def _ConvertedArguments(self, filename):
+    return [arg for arg in self._MakeFlagValues().ReadFlagsFromFiles(
+        ['--flagfile=' + filename])
+            if isinstance(arg, _flagfile.ConvertedArgument)]
+
+  def testSameValuesAsText(self):
+    compiled = self._MakeFlagValues().compile_flagfile(self.main)
+    self.assertEqual(self.main + 'c', compiled)
+    self.assertEqual(self._Parse(self.main), self._Parse(compiled))
+    self.assertEqual(
+        self._MakeFlagValues().ReadFlagsFromFiles(['--flagfile=' + self.main]),
+        self._MakeFlagValues().ReadFlagsFromFiles(['--flagfile=' + compiled]))
+
+  def testOnlyKnownFlagsWithValuesAreConverted(self):
+    compiled = self._MakeFlagValues().compile_flagfile(
+        self.main, os.path.join(self.tmpdir, 'out'))
+    self.assertEqual(['--count=1', '--rate=0.5', '--count=3', '--names=a,b',
+                      '--verbose', '--nodebug', '--multi=x', '--multi=y',
+                      '--mode=high'],
+                     self._ConvertedArguments(compiled))
+
+  def testChangedFlagFileIsReadAsText(self):
+    compiled = self._MakeFlagValues().compile_flagfile(self.main)
+    self._WriteFlagFile('nested.cfg', ['# Comment.', '--count=1', '--rate=0.5'])
+    self.assertEqual(9, len(self._ConvertedArguments(compiled)))
+    self._WriteFlagFile('nested.cfg', ['--rate=0.25'])
+    self.assertEqual([], self._ConvertedArguments(compiled))
+    self.assertEqual(0.25, self._Parse(compiled)['rate'])
+
+  def testRedefinedFlagIsParsedAsText(self):
+    argv = ['prog', '--flagfile=' + self._MakeFlagValues().compile_flagfile(
+        self.main)]
+    flag_values = gflags.FlagValues()
+    gflags.DEFINE_string('count', '', 'A string flag.',
+                         flag_values=flag_values)
+    flag_values(argv, known_only=True)
+    self.assertEqual('3', flag_values.count)
+    flag_values = gflags.FlagValues()
+    gflags.DEFINE_enum('mode', 'low', ['low'], 'An enum flag.',
+                       flag_values=flag_values)
+    self.assertRaises(exceptions.IllegalFlagValueError, flag_values, argv,
+                      known_only=True)
+
+  def testOtherPythonVersionIsReadAsText(self):
+    compiled = self._MakeFlagValues().compile_flagfile(self.main)
+    original_tag = _flagfile._COMPILED_PYTHON_TAG
+    _flagfile._COMPILED_PYTHON_TAG = b'other'
+    self.addCleanup(setattr, _flagfile, '_COMPILED_PYTHON_TAG', original_tag)
+    self.assertEqual([], self._ConvertedArguments(compiled))
+    self.assertEqual(self._Parse(self.main), self._Parse(compiled))
+
+  def testDisabledCompiledFlagFileIsReadAsText(self):
+    compiled = self._MakeFlagValues().compile_flagfile(self.main)
+    gflags.disable_compiled_flagfiles()
+    marshal_loads = _flagfile.marshal.loads
+
+    def FailingLoads(unused_data):
+      self.fail('marshal.loads() called on a disabled compiled flagfile.')
+
+    _flagfile.marshal.loads = FailingLoads
+    self.addCleanup(setattr, _flagfile.marshal, 'loads', marshal_loads)
+    self.assertEqual([], self._ConvertedArguments(compiled))
+    self.assertEqual(self._Parse(self.main), self._Parse(compiled))
+
+  def testInvalidValuesAreStoredAsText(self):
+    self._WriteFlagFile('main.cfg', ['--count=x'])
+    compiled = self._MakeFlagValues().compile_flagfile(self.main)
+    self.assertEqual([], self._ConvertedArguments(compiled))
+    self.assertRaises(exceptions.IllegalFlagValueError, self._Parse, compiled)
+
+  def testListValuesAreNotShared(self):
+    compiled = self._MakeFlagValues().compile_flagfile(self.main)
+    gflags.enable_flagfile_cache()
+    self.addCleanup(gflags.disable_flagfile_cache)
+    first = self._Parse(compiled)
+    first['names'].append('c')
+    first['multi'].append('z')
+    second = self._Parse(compiled)
+    self.assertEqual(['a', 'b'], second['names'])
+    self.assertEqual(['x', 'y'], second['multi'])
+
+  def testSourcesAreDependencies(self):
+    compiled = self._MakeFlagValues().compile_flagfile(self.main)
+    _, record = self._MakeFlagValues()._ExpandFlagFile(compiled)
+    self.assertEqual([compiled, self.main, self.nested],
+                     [filename for filename, _ in record.files])
+
+
+class ReservedFlagNameTest(unittest.TestCase):
+
+  def testFlagsNamedAfterNewMethodsWarn(self):
+    flag_values = gflags.FlagValues()
+    for name in flagvalues._RESERVED_FLAG_NAMES:
+      with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        gflags.DEFINE_string(name, 'x', 'A flag.', flag_values=flag_values)
+      self.assertEqual([DeprecationWarning],
+                       [warning.category for warning in caught], name)
+    flag_values(['prog', '--update=y'])
+    self.assertTrue(callable(flag_values.update))
+    self.assertEqual('y', flag_values['update'].value)
+    self.assertEqual(sorted(flagvalues._RESERVED_FLAG_NAMES),
+                     sorted(flag_values))
+
+
+class FreezeTest(unittest.TestCase):
+
+  def setUp(self):
+    self.flag_values = gflags.FlagValues()
+    gflags.DEFINE_integer('low', 1, 'Lower bound.', short_name='l',
+                          flag_values=self.flag_values)
+    gflags.DEFINE_list('names', 'a,b', 'A list flag.',
+                       flag_values=self.flag_values)
+    gflags.DEFINE_string('secret', 'x', 'A hidden flag.',
+                         flag_values=self.flag_values)
+    self.flag_values.HideFlag('secret')
+    self.flag_values(['prog', '--low=2'])
+
+  def testReadsDoNotTouchTheFlags(self):
+    self.flag_values.freeze(gc_freeze=False)
+    self.assertTrue(self.flag_values.is_frozen())
+    self.assertEqual(2, vars(self.flag_values)['low'])
+    self.assertEqual(2, vars(self.flag_values)['l'])
+    self.assertEqual(['a', 'b'], vars(self.flag_values)['names'])
+    self.assertNotIn('secret', vars(self.flag_values))
+    self.flag_values['low'].value = 3
+    self.assertEqual(2, self.flag_values.low)
+
+  def testSnapshotIsKept(self):
+    self.flag_values.freeze(gc_freeze=False)
+    snapshot = self.flag_values.current_snapshot()
+    self.assertIs(snapshot, self.flag_values.current_snapshot())
+    self.assertEqual({'low': 2, 'l': 2, 'names': ['a', 'b']}, dict(snapshot))
+
+  def testChangesAreRejected(self):
+    self.flag_values.freeze(gc_freeze=False)
+    self.flag_values.freeze(gc_freeze=False)
+    fv = self.flag_values
+    for change in (lambda: setattr(fv, 'low', 3),
+                   lambda: delattr(fv, 'low'),
+                   lambda: fv.update(low=3),
+                   lambda: fv.SetDefault('low', 3),
+                   lambda: fv(['prog', '--low=3']),
+                   lambda: fv.Reset(),
+                   lambda: fv.override(low=3),
+                   lambda: gflags.DEFINE_integer('later', 0, 'Defined later.',
+                                                 flag_values=fv)):
+      self.assertRaises(exceptions.Error, change)
+    self.assertEqual(2, fv.low)
+    self.assertEqual(2, fv['low'].value)
+
+  def testFlagsNamedAfterMethodsDoNotHideThem(self):
+    gflags.DEFINE_string('get', 'x', 'A flag named after a method.',
+                         flag_values=self.flag_values)
+    self.flag_values.freeze(gc_freeze=False)
+    self.assertNotIn('get', vars(self.flag_values))
+    self.assertEqual(2, self.flag_values.get('low', None))
+    self.assertEqual('x', self.flag_values['get'].value)
+    self.assertEqual('x', self.flag_values.current_snapshot()['get'])
+
+  def testUnparsedFlagsCannotBeFrozen(self):
+    self.flag_values.Reset()
+    self.assertRaises(exceptions.Error, self.flag_values.freeze)
+    self.assertFalse(self.flag_values.is_frozen())
+
+  @unittest.skipUnless(hasattr(gc, 'freeze'), 'gc.freeze() is not available')
+  def testGcFreeze(self):
+    self.addCleanup(gc.unfreeze)
+    self.flag_values.freeze()
+    self.assertGreater(gc.get_freeze_count(), 0)
+
+
+class _UpperCaseFlag(gflags.Flag):
+  """A flag whose class overrides the value property."""
+
+  @property
+  def value(self):
+    return self._upper_value
+
+  @value.setter
+  def value(self, value):
+    self._upper_value = value.upper()
+
+
+def _IsPositive(value):
+  return value > 0
+
+
+def main():
+  unittest.main()
+
+
+if __name__ == '__main__':
+  main()